@@ -0,0 +1,39 @@
+"""Benchmark the time to import lcapy.
+
+Usage: python importbench.py [number of runs] [budget in seconds]
+
+Each import is timed in a new Python process.  The exit status is 1
+if the median time for 'import lcapy' exceeds the budget.  Note, the
+time for 'from lcapy import Circuit' is dominated by importing
+SymPy."""
+
+from __future__ import print_function
+from subprocess import check_output
+import sys
+
+runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+budget = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+
+code = ('from time import time\n'
+        'start = time()\n'
+        '%s\n'
+        'print(time() - start)\n')
+
+
+def median_time(statement):
+
+    times = []
+    for m in range(runs):
+        output = check_output([sys.executable, '-c', code % statement])
+        times.append(float(output))
+    return sorted(times)[runs // 2]
+
+
+import_time = median_time('import lcapy')
+print('import lcapy %.3f s' % import_time)
+print('from lcapy import Circuit %.3f s' %
+      median_time('from lcapy import Circuit'))
+
+if import_time > budget:
+    print('Exceeded budget of %.3f s' % budget)
+    sys.exit(1)
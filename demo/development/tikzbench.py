@@ -0,0 +1,39 @@
+"""Benchmark TikZ generation for a large synthetic schematic.
+
+Usage: python tikzbench.py [number of components]
+
+The schematic is an RC ladder.  The layout time and the time to write
+the TikZ code to memory and to a file are printed."""
+
+from __future__ import print_function
+from io import StringIO
+from os import devnull
+from time import time
+import sys
+from lcapy import Circuit
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+cct = Circuit()
+for m in range(1, N // 3 + 1):
+    cct.add('R%d %d %d; right' % (m, m, m + 1))
+    cct.add('C%d %d 0_%d; down' % (m, m + 1, m + 1))
+    cct.add('W 0_%d 0_%d; right' % (m, m + 1))
+
+sch = cct.sch
+# Do not require LaTeX to find the circuitikz version.
+sch.circuitikz_version = '2017/05/28'
+
+start = time()
+sch._positions_calculate()
+print('%d components, layout %.2f s' % (len(sch.elements), time() - start))
+
+start = time()
+out = StringIO()
+sch._tikz_write(out)
+print('StringIO %.2f s, %d characters' % (time() - start, len(out.getvalue())))
+
+start = time()
+with open(devnull, 'w') as out:
+    sch._tikz_write(out)
+print('file %.2f s' % (time() - start))
@@ -12,9 +12,9 @@ Copyright 2014--2017 Michael Hayes, UCECE
 """
 
 from __future__ import absolute_import, print_function
-from pkg_resources import get_distribution
-
-__version__ = get_distribution('lcapy').version
+from importlib import import_module
+from threading import RLock
+import types
 
 import sys
 if sys.version_info[0] == 2 and sys.version_info[1] < 6:
@@ -23,42 +23,126 @@ else:  # Python 3
     pass
     # Here we can also check for specific Python 3 versions, if needed
 
-del sys
 
-from sympy import init_printing
-init_printing()
+# Add the modules that get searched to allow 'from lcapy import V'
+# rather then having to specify module, 'from lcapy.oneport import V'.
+# Importing these modules, and thus SymPy, takes seconds so they are
+# only imported when one of their names is first used.
+_modules = ('core', 'oneport', 'twoport', 'circuit', 'schematic')
 
+_loaded = False
+_lock = RLock()
 
-# List of symbols that get imported with 'from lcapy import *'
-__all__ = []
 
-# Add the modules that get searched to allow 'from lcapy import V'
-# rather then having to specify module, 'from lcapy.oneport import V'
-from . import core
-__all__.extend(core.__all__)
-from .core import *
+def _load():
+    """Import the modules and add their names to the package namespace.
+    SymPy printing is also set up since results are about to be
+    displayed."""
+
+    global _loaded, __all__
+
+    with _lock:
+        if _loaded:
+            return
+
+        from sympy import init_printing
+        init_printing()
+
+        # List of symbols that get imported with 'from lcapy import *'
+        names = []
+        namespace = globals()
+        for name in _modules:
+            module = import_module('.' + name, __name__)
+            names.extend(module.__all__)
+            for attr in module.__all__:
+                namespace[attr] = getattr(module, attr)
+
+        names.extend(('show_version', ))
+        __all__ = names
+        _loaded = True
+
+
+def _version():
+
+    try:
+        from importlib.metadata import version
+    except ImportError:
+        try:
+            # Backport for Python < 3.8
+            from importlib_metadata import version
+        except ImportError:
+            from pkg_resources import get_distribution
+            return get_distribution('lcapy').version
+    return version('lcapy')
+
+
+def _importing():
+    """Return True if a submodule is partly initialised.  The modules
+    are not loaded then since this would import the submodule again
+    before it has defined its names."""
+
+    import sys
 
-from . import oneport
-__all__.extend(oneport.__all__)
-from .oneport import *
+    for name, module in list(sys.modules.items()):
+        if not name.startswith(__name__ + '.'):
+            continue
+        spec = getattr(module, '__spec__', None)
+        if getattr(spec, '_initializing', False):
+            return True
+    return False
 
-from . import twoport
-__all__.extend(twoport.__all__)
-from .twoport import *
 
-#from . import threeport
-#__all__.extend(threeport.__all__)
-#from .threeport import *
+def __getattr__(name):
+    """Import the modules when a name is first used (PEP 562)."""
 
-from . import circuit
-__all__.extend(circuit.__all__)
-from .circuit import *
+    global __version__
 
-from . import schematic
-__all__.extend(schematic.__all__)
-from .schematic import *
+    if name == '__version__':
+        __version__ = _version()
+        return __version__
+
+    import sys
+
+    # A submodule that is being imported is not an attribute of the
+    # package until its import has finished.
+    submodule = sys.modules.get(__name__ + '.' + name)
+    if submodule is not None:
+        return submodule
+
+    if ((name.startswith('__') and name != '__all__') or _loaded or
+        _importing()):
+        raise AttributeError("module %r has no attribute %r" %
+                             (__name__, name))
+
+    # Note, 'from lcapy import *' uses __all__.
+    _load()
+    try:
+        return globals()[name]
+    except KeyError:
+        raise AttributeError("module %r has no attribute %r" %
+                             (__name__, name))
+
+
+def __dir__():
+
+    _load()
+    return sorted(set(globals()) | set(__all__))
+
+
+if sys.version_info < (3, 7):
+    # Module __getattr__ is not supported so use a module subclass.
+    class _LazyModule(types.ModuleType):
+
+        def __getattr__(self, name):
+            return __getattr__(name)
+
+        def __dir__(self):
+            return __dir__()
+
+    sys.modules[__name__].__class__ = _LazyModule
+
+del sys
 
-__all__.extend(('show_version', ))
 
 def show_version():
     
@@ -68,4 +152,3 @@ def show_version():
 
     print('Python: %s\nSymPy: %s\nNumPy: %s' % 
           (python_version, sympy_version, numpy_version))
-
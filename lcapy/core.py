@@ -14,17 +14,42 @@ from __future__ import division
 from lcapy.latex import latex_str
 from lcapy.acdc import is_dc, is_ac, is_causal, ACChecker
 from lcapy.sympify import canonical_name, sympify1, symbols_find
-from lcapy.ratfun import Ratfun, _zp2tf
+from lcapy.ratfun import Ratfun, PolyRatfun, _zp2tf, cancel
 from lcapy.laplace import laplace_transform, inverse_laplace_transform
 from lcapy.fourier import fourier_transform, inverse_fourier_transform
 import numpy as np
-from sympy.assumptions.assume import global_assumptions
 import sympy as sym
 import re
 from sympy.utilities.lambdify import lambdify
 import sys
 from copy import copy
+from contextlib import contextmanager
+from threading import Lock
 import six
+try:
+    from contextvars import ContextVar
+except ImportError:
+    # Python < 3.7; the current context is then local to a thread
+    # rather than to an asyncio task.
+    from threading import local
+
+    class ContextVar(object):
+
+        def __init__(self, name, default=None):
+            self.name = name
+            self.default = default
+            self.local = local()
+
+        def get(self):
+            return getattr(self.local, 'value', self.default)
+
+        def set(self, value):
+            token = self.get()
+            self.local.value = value
+            return token
+
+        def reset(self, token):
+            self.local.value = token
 
 
 # Note imports at bottom to avoid circular dependencies
@@ -34,7 +59,7 @@ import six
 # performed.
 
 __all__ = ('pprint', 'pretty', 'latex', 'DeltaWye', 'WyeDelta', 'tf',
-           'symbol', 'sympify',
+           'symbol', 'sympify', 'set_simplify_level',
            'zp2tf', 'Expr', 's', 'sExpr', 't', 'tExpr', 'f', 'fExpr', 'cExpr',
            'omega', 'omegaExpr', 'Phasor',
            'pi', 'cos', 'sin', 'tan', 'atan', 'atan2',
@@ -103,38 +128,83 @@ def uppercase_name(name):
     return name[0].upper() + name[1:]
 
 
-class Context(object):
+# Levels of simplification of results, in order of increasing cost.
+# 'none' leaves the results as found, 'cancel' and 'together' apply
+# the sympy functions of the same name, 'canonical' converts rational
+# functions to canonical form after cancelling common factors, and
+# 'full' applies sympy simplify.
+simplify_levels = ('none', 'cancel', 'together', 'canonical', 'full')
+
+
+class Symbols(dict):
+    """Dictionary of symbols keyed by name.  New symbols are also added
+    to the parent dictionary, if it does not have a symbol of the same
+    name, so that the symbols of a netlist are used for expressions
+    created outside the netlist, say for comparison with its
+    results."""
 
-    def __init__(self):
-        self.symbols = {}
-        self.assumptions = {}
-        self.previous = None
+    def __init__(self, parent=None):
+
+        super(Symbols, self).__init__()
+        self.parent = parent
+
+    def __setitem__(self, name, symbol):
+
+        super(Symbols, self).__setitem__(name, symbol)
+        if self.parent is not None:
+            self.parent.setdefault(name, symbol)
+
+
+class Context(object):
+    """Symbols and options used for parsing the component values of a
+    netlist and analysing it.  Each netlist has its own context,
+    which is activated when the component values are parsed or
+    the netlist is solved.  The active context is stored in a context
+    variable rather than a global so that circuits can be analysed
+    concurrently by different threads or asyncio tasks."""
+
+    def __init__(self, parent=None):
+        self.symbols = Symbols(None if parent is None else parent.symbols)
         self.nid = 0
+        # If None, use simplify_level of global_context.
+        self.simplify_level = None
+        # If not None, floats are kept as sympy Floats with this
+        # number of significant digits rather than being converted to
+        # rationals.
+        self.float_digits = None
 
     def new(self):
 
-        new_context = Context()
+        new_context = Context(self)
         new_context.symbols.update(self.symbols)
-        new_context.assumptions.update(self.assumptions)
+        new_context.simplify_level = self.simplify_level
+        new_context.float_digits = self.float_digits
         return new_context
 
-    def switch(self):
+    @contextmanager
+    def activate(self):
+        """Context manager that makes this the current context; the
+        previous context is restored on exit."""
 
-        global context
+        token = _current_context.set(self)
+        try:
+            yield self
+        finally:
+            _current_context.reset(token)
 
-        self.previous = context
-        context = self
-        global_assumptions.clear()
-        global_assumptions.update(self.assumptions)
+    def new_nid(self):
+        """Return new noise identifier."""
 
-    def restore(self):
+        with _nid_lock:
+            self.nid += 1
+            return 'n%d' % self.nid
 
-        if self.previous is None:
-            return
 
-        self.assumptions.update(global_assumptions)
-        global_assumptions.clear()
-        global_assumptions.update(self.previous.assumptions)
+def current_context():
+    """Return the current context.  This is the global context unless
+    a netlist is being parsed or solved."""
+
+    return _current_context.get()
 
 
 def sympify(expr, evaluate=True, **assumptions):
@@ -144,6 +214,9 @@ def sympify(expr, evaluate=True, **assumptions):
     # real is defined.
     if 'real' not in assumptions:
         assumptions['positive'] = True
+    context = current_context()
+    if context.float_digits is not None:
+        assumptions['digits'] = context.float_digits
     return sympify1(expr, context.symbols,
                     evaluate, **assumptions)
 
@@ -153,7 +226,26 @@ def symbol(name, **assumptions):
 
 
 global_context = Context()
-context = global_context
+global_context.simplify_level = 'canonical'
+_current_context = ContextVar('lcapy_context', default=global_context)
+_nid_lock = Lock()
+
+
+def check_simplify_level(level):
+
+    if level not in simplify_levels:
+        raise ValueError('Unknown simplify level %s, expecting one of %s'
+                         % (level, ', '.join(simplify_levels)))
+    return level
+
+
+def set_simplify_level(level):
+    """Set the default level of simplification of circuit analysis
+    results, one of 'none', 'cancel', 'together', 'canonical' (the
+    default), or 'full'.  This can be overridden for a circuit with
+    its simplify_level attribute."""
+
+    global_context.simplify_level = check_simplify_level(level)
 
 ssym = symbol('s', real=False)
 tsym = symbol('t', real=True)
@@ -273,6 +365,29 @@ class Expr(object):
         # say for subs.
         return hash(self.expr)
 
+    def __getstate__(self):
+        """Return state for pickling.  Only the sympy expression and the
+        assumptions are required; cached values are recreated on
+        demand."""
+
+        state = self.__dict__.copy()
+        if state.get('_polyratfun') is not None:
+            state.pop('_expr', None)
+        return state
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        # Add the symbols to the global context so that expressions
+        # subsequently created from strings refer to the same symbols.
+        expr = state.get('_polyratfun')
+        if expr is None:
+            expr = self.expr
+        symbols = global_context.symbols
+        for symbol in expr.free_symbols:
+            if symbol.name not in symbols:
+                symbols[symbol.name] = symbol
+
 # This will allow sym.sympify to magically extract the sympy expression
 # but it will also bypass our __rmul__, __radd__, etc. methods that get called
 # when sympy punts.
@@ -291,6 +406,13 @@ class Expr(object):
         # FIXME.  This propagates the assumptions.  There is a
         # possibility that the operation may violate them.
 
+        # Special attributes, such as __getstate__ that is looked up
+        # for pickling, are not forwarded.  Nor is expr, since this
+        # is not defined until the instance is initialised.
+        if attr.startswith('__') or attr == 'expr':
+            raise AttributeError(
+                "%s has no attribute %s." % (self.__class__.__name__, attr))
+
         expr = self.expr
         if hasattr(expr, attr):
             a = getattr(expr, attr)
@@ -1013,10 +1135,18 @@ class Expr(object):
             name = str(name)
 
         # Replace symbol names with symbol definitions to
-        # avoid problems with real or positive attributes.
-        if name not in context.symbols:
-            raise ValueError('Unknown symbol %s' % old)
-        old = context.symbols[name]
+        # avoid problems with real or positive attributes.  The
+        # symbol may have been defined in the context of a netlist.
+        symbols = current_context().symbols
+        if name in symbols:
+            old = symbols[name]
+        else:
+            for symbol in self.expr.free_symbols:
+                if symbol.name == name:
+                    old = symbol
+                    break
+            else:
+                raise ValueError('Unknown symbol %s' % old)
 
         result = self.expr.subs(old, expr)
 
@@ -1118,6 +1248,30 @@ class Expr(object):
     def canonical(self):
         return self.__class__(self)
 
+    def simplify_to(self, level=None):
+        """Simplify expression to the specified level, one of 'none',
+        'cancel', 'together', 'canonical', or 'full'.  If level is
+        None, the default level is used; see set_simplify_level."""
+
+        if level is None:
+            level = global_context.simplify_level
+        level = check_simplify_level(level)
+
+        if level == 'none':
+            return self
+        # Common factors are only cancelled to within rounding error
+        # for expressions with floating point numbers.
+        var = getattr(self, 'var', None)
+        if level == 'cancel':
+            return self.__class__(cancel(self.expr, var), **self.assumptions)
+        elif level == 'together':
+            return self.__class__(sym.together(self.expr), **self.assumptions)
+        elif level == 'canonical':
+            # The canonical form does not cancel common factors.
+            new = self.__class__(cancel(self.expr, var), **self.assumptions)
+            return new.canonical()
+        return self.simplify()
+
 
 class sfwExpr(Expr):
 
@@ -1181,19 +1335,209 @@ class sfwExpr(Expr):
 
 
 class sExpr(sfwExpr):
-    """s-domain expression or symbol."""
+    """s-domain expression or symbol.
+
+    The expression can optionally be stored as a pair of polynomials
+    in s and a delay, see as_polyratfun.  In this case the sympy
+    expression is only created when required."""
 
     var = ssym
+    _polyratfun = None
+    _expr = None
 
     def __init__(self, val, **assumptions):
 
-        super(sExpr, self).__init__(val, **assumptions)
+        if isinstance(val, sExpr) and val._polyratfun is not None:
+            if assumptions == {}:
+                assumptions = val.assumptions.copy()
+            val = val._polyratfun
+
+        if isinstance(val, PolyRatfun):
+            if val.is_zero:
+                assumptions['causal'] = True
+            self.assumptions = assumptions.copy()
+            self._polyratfun = val
+        else:
+            super(sExpr, self).__init__(val, **assumptions)
         self._laplace_conjugate_class = tExpr
 
-        if self.expr.find(tsym) != set():
+        if self._polyratfun is not None:
+            if tsym in self._polyratfun.free_symbols:
+                raise ValueError(
+                    's-domain expression %s cannot depend on t' % val)
+        elif self.expr.find(tsym) != set():
             raise ValueError(
                 's-domain expression %s cannot depend on t' % self.expr)
 
+    @property
+    def expr(self):
+        """Return sympy expression."""
+
+        if self._expr is None:
+            # Convert polynomial representation on demand.
+            self._expr = self._polyratfun.expr
+        return self._expr
+
+    @expr.setter
+    def expr(self, expr):
+
+        self._expr = expr
+
+    @property
+    def polyratfun(self):
+        """Return expression as PolyRatfun object, i.e., as a pair of
+        polynomials in s and a delay."""
+
+        if self._polyratfun is not None:
+            return self._polyratfun
+        return PolyRatfun.from_expr(self.expr, self.var)
+
+    def as_polyratfun(self):
+        """Return copy of expression stored as a pair of polynomials in s and
+        a delay.  Arithmetic with these expressions uses polynomial
+        arithmetic with common factors cancelled; the sympy expression
+        is only created when required.  This is useful when combining
+        many rational functions, say when chaining two-ports."""
+
+        return self.__class__(self.polyratfun, **self.assumptions)
+
+    @property
+    def _ratfun(self):
+
+        if self._polyratfun is None:
+            return Ratfun(self.expr, self.var)
+        return Ratfun(self.expr, self.var,
+                      self._polyratfun.as_ratfun_delay())
+
+    def _to_polyratfun(self, x):
+        """Convert x to PolyRatfun; return None if this is not possible."""
+
+        if isinstance(x, sExpr):
+            if x._polyratfun is not None:
+                return x._polyratfun
+            x = x.expr
+        elif isinstance(x, Expr):
+            if not isinstance(x, cExpr):
+                return None
+            x = x.expr
+        elif not isinstance(x, (int, float, sym.Expr)):
+            return None
+
+        try:
+            return PolyRatfun.from_expr(sympify(x), self.var)
+        except (ValueError, sym.PolynomialError):
+            return None
+
+    def _polyratfun_op(self, x, op, reverse=False):
+        """Perform arithmetic operation op using the polynomial
+        representation.  None is returned if either operand cannot be
+        represented or neither operand is stored in this form."""
+
+        if (self._polyratfun is None and
+            not (isinstance(x, sExpr) and x._polyratfun is not None)):
+            return None
+
+        a = self._to_polyratfun(self)
+        b = self._to_polyratfun(x)
+        if a is None or b is None:
+            return None
+        if reverse:
+            a, b = b, a
+
+        if op in ('+', '-'):
+            cls, self, x, assumptions = self.__compat_add__(x, op)
+        else:
+            cls, self, x, assumptions = self.__compat_mul__(x, op)
+
+        try:
+            if op == '+':
+                result = a + b
+            elif op == '-':
+                result = a - b
+            elif op == '*':
+                result = a * b
+            else:
+                result = a / b
+        except ValueError:
+            # Have different delays.
+            return None
+
+        return cls(result, **assumptions)
+
+    def __neg__(self):
+        """Negation."""
+
+        if self._polyratfun is not None:
+            return self.__class__(-self._polyratfun, **self.assumptions)
+        return super(sExpr, self).__neg__()
+
+    def __add__(self, x):
+        """Add"""
+
+        result = self._polyratfun_op(x, '+')
+        if result is None:
+            return super(sExpr, self).__add__(x)
+        return result
+
+    def __radd__(self, x):
+        """Reverse add"""
+
+        result = self._polyratfun_op(x, '+', True)
+        if result is None:
+            return super(sExpr, self).__radd__(x)
+        return result
+
+    def __sub__(self, x):
+        """Subtract"""
+
+        result = self._polyratfun_op(x, '-')
+        if result is None:
+            return super(sExpr, self).__sub__(x)
+        return result
+
+    def __rsub__(self, x):
+        """Reverse subtract"""
+
+        result = self._polyratfun_op(x, '-', True)
+        if result is None:
+            return super(sExpr, self).__rsub__(x)
+        return result
+
+    def __mul__(self, x):
+        """Multiply"""
+
+        result = self._polyratfun_op(x, '*')
+        if result is None:
+            return super(sExpr, self).__mul__(x)
+        return result
+
+    def __rmul__(self, x):
+        """Reverse multiply"""
+
+        result = self._polyratfun_op(x, '*', True)
+        if result is None:
+            return super(sExpr, self).__rmul__(x)
+        return result
+
+    def __truediv__(self, x):
+        """True divide"""
+
+        result = self._polyratfun_op(x, '/')
+        if result is None:
+            return super(sExpr, self).__truediv__(x)
+        return result
+
+    def __rtruediv__(self, x):
+        """Reverse true divide"""
+
+        result = self._polyratfun_op(x, '/', True)
+        if result is None:
+            return super(sExpr, self).__rtruediv__(x)
+        return result
+
+    __div__ = __truediv__
+    __rdiv__ = __rtruediv__
+
     def differentiate(self):
         """Differentiate (multiply by s)."""
 
@@ -1327,7 +1671,7 @@ class sExpr(sfwExpr):
         if not np.allclose(np.diff(t), np.ones(len(t) - 1) * dt):
             raise (ValueError, 't values not equally spaced')
 
-        N, D, delay = self._as_ratfun_delay()
+        N, D, delay = self._ratfun.as_ratfun_delay()
 
         Q, M = N.div(D)
         expr = M / D
@@ -1364,7 +1708,7 @@ class sExpr(sfwExpr):
 
     def decompose(self):
 
-        N, D, delay = self._as_ratfun_delay()
+        N, D, delay = self._ratfun.as_ratfun_delay()
 
         return N, D, delay
 
@@ -1687,6 +2031,7 @@ class Vphasor(Phasor):
         self._laplace_conjugate_class = Vt
 
     def cpt(self):
+        from lcapy.oneport import Vac, V
 
         v = self
         if v.is_number or self.is_ac:
@@ -1703,6 +2048,7 @@ class Iphasor(Phasor):
         self._laplace_conjugate_class = It
 
     def cpt(self):
+        from lcapy.oneport import Iac, I
 
         i = self
         if i.is_number or self.is_ac:
@@ -1719,6 +2065,8 @@ class Vconst(cExpr):
         self._laplace_conjugate_class = Vt
 
     def cpt(self):
+        from lcapy.oneport import Vdc
+
         return Vdc(self)
 
     def time(self, **assumptions):
@@ -1733,6 +2081,8 @@ class Iconst(cExpr):
         self._laplace_conjugate_class = It
 
     def cpt(self):
+        from lcapy.oneport import Idc
+
         return Idc(self)
 
     def time(self, **assumptions):
@@ -1916,6 +2266,7 @@ class Zs(sExpr):
         return cls(Rval)
 
     def cpt(self):
+        from lcapy.oneport import L, C, R, Z
 
         if self.is_number or self.is_dc:
             return R(self.expr)
@@ -1966,6 +2317,7 @@ class Ys(sExpr):
         return cls(1 / Rval)
 
     def cpt(self):
+        from lcapy.oneport import L, C, G, Y
 
         if self.is_number or self.is_dc:
             return G(self.expr)
@@ -1996,6 +2348,8 @@ class Vs(sExpr):
         self._laplace_conjugate_class = Vt
 
     def cpt(self):
+        from lcapy.oneport import V
+
         return V(self)
 
 
@@ -2012,6 +2366,8 @@ class Is(sExpr):
         self._laplace_conjugate_class = It
 
     def cpt(self):
+        from lcapy.oneport import I
+
         return I(self)
 
 
@@ -2196,8 +2552,7 @@ class noiseExpr(omegaExpr):
     one_sided = True
 
     def _new_nid(self):
-        context.nid += 1
-        return 'n%d' % context.nid
+        return current_context().new_nid()
 
     def __init__(self, val, **assumptions):
         if 'nid' not in assumptions or assumptions['nid'] is None:
@@ -2379,6 +2734,7 @@ class Yomega(omegaExpr):
         self._fourier_conjugate_class = Yt
 
     def cpt(self):
+        from lcapy.oneport import L, C, G, Y
 
         if self.is_number:
             return G(self.expr)
@@ -2409,6 +2765,7 @@ class Zomega(omegaExpr):
         self._fourier_conjugate_class = Zt
 
     def cpt(self):
+        from lcapy.oneport import L, C, R, Z
 
         if self.is_number:
             return R(self.expr)
@@ -2485,6 +2842,16 @@ class ZsVector(Vector):
     _typewrap = Zs
 
 
+class YsMatrix(Matrix):
+
+    _typewrap = Ys
+
+
+class ZsMatrix(Matrix):
+
+    _typewrap = Zs
+
+
 def _funcwrap(func, *args):
 
     cls = args[0].__class__
@@ -2616,6 +2983,12 @@ class Super(Exprdict):
             for arg in args:
                 self.add(arg)
 
+    def __getstate__(self):
+        # The cached transform domain representation is not pickled.
+        state = self.__dict__.copy()
+        state.pop('_transform', None)
+        return state
+
     def _representation(self):
         if not any(self):
             return 0
@@ -3092,6 +3465,16 @@ class Super(Exprdict):
 
         return new
 
+    def simplify_to(self, level=None):
+        """Simplify each component to the specified level; see
+        Expr.simplify_to."""
+
+        new = self.__class__()
+        for kind, value in self.items():
+            new[kind] = value.simplify_to(level)
+
+        return new
+
 
 class Vsuper(Super):
 
@@ -3154,6 +3537,8 @@ class Vsuper(Super):
         return self.__div__(x)
 
     def cpt(self):
+        from lcapy.oneport import V
+
         return V(self.time())
 
 class Isuper(Super):
@@ -3216,6 +3601,8 @@ class Isuper(Super):
         return self.__div__(x)
 
     def cpt(self):
+        from lcapy.oneport import I
+
         return I(self.time())
     
     
@@ -3238,4 +3625,3 @@ def itype_select(kind):
     except KeyError:
         return Iphasor
 
-from lcapy.oneport import L, C, R, G, Idc, Vdc, Iac, Vac, I, V, Z, Y
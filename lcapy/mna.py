@@ -7,7 +7,10 @@ Copyright 2014--2017 Michael Hayes, UCECE
 from __future__ import division
 from lcapy.core import cExpr, s, sqrt, Exprdict, vtype_select, itype_select
 from lcapy.core import Matrix, Vector, Expr, Vphasor
+from lcapy.ratfun import cancel
 import sympy as sym
+import numpy as np
+import mpmath
 from copy import copy
 
 # Note, all the maths is performed using sympy expressions and the
@@ -15,6 +18,436 @@ from copy import copy
 # efficient and, more importantly, overcomes some of the wrapping
 # problems which casues the is_real attribute to be dropped.
 
+def _sparsity_graph(A):
+    """Return list of adjacency sets for the symmetrized sparsity pattern
+    of the square matrix A."""
+
+    N = A.rows
+    rows = A.tolist()
+    adj = [set() for m in range(N)]
+    for m in range(N):
+        for n in range(N):
+            if m != n and rows[m][n] != 0:
+                adj[m].add(n)
+                adj[n].add(m)
+    return adj
+
+
+def _eliminate(adj, v):
+    """Eliminate vertex v from the graph adj; its neighbours become a
+    clique.  Return the number of fill-in entries created."""
+
+    fill = 0
+    nbrs = adj[v]
+    for a in nbrs:
+        adj[a].discard(v)
+        new = nbrs - adj[a]
+        new.discard(a)
+        fill += len(new)
+        adj[a] |= new
+    adj[v] = set()
+    return fill
+
+
+def _fill_in(adj, order):
+    """Return number of fill-in entries in the LU factors when
+    eliminating the unknowns in the specified order."""
+
+    adj = [set(a) for a in adj]
+    return sum([_eliminate(adj, v) for v in order])
+
+
+def _min_degree_ordering(adj):
+    """Return fill-reducing ordering of the unknowns using the minimum
+    degree algorithm.  Ties are broken by the original index so the
+    ordering is deterministic."""
+
+    adj = [set(a) for a in adj]
+    remaining = set(range(len(adj)))
+    order = []
+    while remaining:
+        v = min(remaining, key=lambda m: (len(adj[m]), m))
+        _eliminate(adj, v)
+        remaining.remove(v)
+        order.append(v)
+    return order
+
+
+def _row_structure(A):
+    """Return list of the column indexes of the non-zero entries for each
+    row of A."""
+
+    return [[n for n, x in enumerate(row) if x != 0] for row in A.tolist()]
+
+
+def _maximum_matching(structure, N):
+    """Return list mapping each column to its matched row (or None) for a
+    maximum matching of the bipartite graph of the rows and columns
+    of a N x N matrix with the specified row structure."""
+
+    col_match = [None] * N
+
+    def augment(root):
+        # Iterative depth first search for an augmenting path to avoid
+        # the recursion limit.  rows is the path of rows from root,
+        # cols[m] is the column that connects rows[m] to rows[m + 1],
+        # and positions[m] is the next column of rows[m] to try.
+        visited = set()
+        rows = [root]
+        cols = []
+        positions = [0]
+        while rows:
+            row = structure[rows[-1]]
+            m = positions[-1]
+            while m < len(row) and row[m] in visited:
+                m += 1
+            if m == len(row):
+                # Dead end, backtrack.
+                rows.pop()
+                positions.pop()
+                if cols:
+                    cols.pop()
+                continue
+            positions[-1] = m + 1
+            c = row[m]
+            visited.add(c)
+            cols.append(c)
+            if col_match[c] is None:
+                # Match each row on the path with its next column.
+                for r, c in zip(rows, cols):
+                    col_match[c] = r
+                return True
+            rows.append(col_match[c])
+            positions.append(0)
+        return False
+
+    for r in range(N):
+        augment(r)
+    return col_match
+
+
+def _strong_components(graph):
+    """Return strongly connected components of the directed graph, a list
+    of successor lists, using Tarjan's algorithm.  A component is
+    only returned after the components reachable from it."""
+
+    index = {}
+    lowlink = {}
+    stack = []
+    onstack = set()
+    components = []
+
+    for root in range(len(graph)):
+        if root in index:
+            continue
+
+        # Iterative depth first search to avoid the recursion limit.
+        work = [(root, 0)]
+        while work:
+            v, i = work.pop()
+            if i == 0:
+                index[v] = lowlink[v] = len(index)
+                stack.append(v)
+                onstack.add(v)
+            for j in range(i, len(graph[v])):
+                w = graph[v][j]
+                if w not in index:
+                    work.append((v, j + 1))
+                    work.append((w, 0))
+                    break
+                elif w in onstack:
+                    lowlink[v] = min(lowlink[v], index[w])
+            else:
+                if lowlink[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        onstack.remove(w)
+                        component.append(w)
+                        if w == v:
+                            break
+                    components.append(sorted(component))
+                if work:
+                    u = work[-1][0]
+                    lowlink[u] = min(lowlink[u], lowlink[v])
+    return components
+
+
+def _block_triangular(A):
+    """Return the diagonal blocks of the block triangular form of the
+    square matrix A as a list of (rows, cols) pairs in the order that
+    they can be solved.  Each row is listed in the same position as its
+    matched column so the diagonal of each block is non-zero.  A
+    ValueError is raised if A is structurally singular."""
+
+    N = A.rows
+    structure = _row_structure(A)
+    col_match = _maximum_matching(structure, N)
+    if None in col_match:
+        raise ValueError('The MNA A matrix is structurally singular')
+
+    # The equation for column c (its matched row) depends on the other
+    # columns in that row.
+    graph = [[n for n in structure[col_match[c]] if n != c]
+             for c in range(N)]
+    return [([col_match[c] for c in cols], cols)
+            for cols in _strong_components(graph)]
+
+
+class _DisjointSets(object):
+    """Disjoint sets of nodes (union-find)."""
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, node):
+        parent = self.parent
+        if node not in parent:
+            parent[node] = node
+            self.size[node] = 1
+            return node
+        # Path halving; this is iterative so long chains of nodes do
+        # not exceed the recursion limit.
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def union(self, node1, node2):
+        """Join the sets containing node1 and node2; return False if they
+        are already in the same set."""
+
+        root1, root2 = self.find(node1), self.find(node2)
+        if root1 == root2:
+            return False
+        # Union by size keeps the trees shallow.
+        if self.size[root1] > self.size[root2]:
+            root1, root2 = root2, root1
+        self.parent[root1] = root2
+        self.size[root2] += self.size[root1]
+        return True
+
+
+def _tree_path(tree, node1, node2):
+    """Return list of the edge names on the path between node1 and node2
+    of a forest specified by a dictionary of lists of (node, name)
+    pairs."""
+
+    previous = {node1: None}
+    stack = [node1]
+    while stack:
+        node = stack.pop()
+        if node == node2:
+            break
+        for neighbour, name in tree.get(node, ()):
+            if neighbour not in previous:
+                previous[neighbour] = (node, name)
+                stack.append(neighbour)
+
+    path = []
+    node = node2
+    while previous.get(node) is not None:
+        node, name = previous[node]
+        path.append(name)
+    return path
+
+
+def _coefficient_arrays(A, var):
+    """Return list of numpy arrays of the coefficients of each power of
+    var for the square matrix A or None if its entries are not
+    polynomials of var with numerical coefficients."""
+
+    N = A.rows
+    polys = []
+    degree = 0
+    for m in range(N):
+        row = []
+        for n in range(N):
+            try:
+                poly = sym.Poly(A[m, n], var)
+            except sym.PolynomialError:
+                return None
+            if poly.free_symbols - set((var, )) != set():
+                return None
+            if not poly.is_zero:
+                degree = max(degree, poly.degree())
+            row.append(poly.all_coeffs()[::-1])
+        polys.append(row)
+
+    arrays = [np.zeros((N, N), dtype=complex) for k in range(degree + 1)]
+    for m in range(N):
+        for n in range(N):
+            for k, c in enumerate(polys[m][n]):
+                arrays[k][m, n] = complex(c)
+    return arrays
+
+
+def _column_degree_sum(arrays):
+    """Return bound of the degree of the determinant of the polynomial
+    matrix with the specified coefficient arrays."""
+
+    N = arrays[0].shape[0]
+    degree = 0
+    for n in range(N):
+        column = [k for k, Ak in enumerate(arrays) if Ak[:, n].any()]
+        if column != []:
+            degree += max(column)
+    return degree
+
+
+def _balancing_radius(arrays):
+    """Return geometric mean of the ratios of the norms of the constant
+    and highest power coefficients of the columns of a polynomial
+    matrix with the specified coefficient arrays.  For an RLC network
+    this is an estimate of the magnitude of the natural frequencies."""
+
+    logs = []
+    N = arrays[0].shape[0]
+    for n in range(N):
+        norms = [np.linalg.norm(Ak[:, n]) for Ak in arrays]
+        top = max([k for k, norm in enumerate(norms) if norm > 0] + [0])
+        if top > 0 and norms[0] > 0:
+            logs.append(np.log(norms[0] / norms[top]) / top)
+    if logs == []:
+        return 1.0
+    return float(np.exp(np.mean(logs)))
+
+
+def _interpolate_adjugate(arrays, M, radius, digits):
+    """Return the coefficients of the determinant and adjugate of the
+    polynomial matrix with the specified coefficient arrays found by
+    interpolation from M points on a circle of the specified radius.
+    The points are offset by a quarter of their spacing so that none
+    lie on the real axis."""
+
+    N = arrays[0].shape[0]
+    tol = 10.0 ** (2 - digits)
+    singular = ValueError('The MNA A matrix is singular or ill-conditioned')
+
+    if digits <= 15:
+        dets = np.empty(M, dtype=complex)
+        adjs = np.empty((M, N, N), dtype=complex)
+        for j in range(M):
+            z = radius * np.exp(2j * np.pi * (j + 0.25) / M)
+            Az = sum([Ak * z ** k for k, Ak in enumerate(arrays)])
+            dets[j] = np.linalg.det(Az)
+            if abs(dets[j]) <= tol * np.prod(np.linalg.norm(Az, axis=0)):
+                raise singular
+            adjs[j] = dets[j] * np.linalg.inv(Az)
+
+        k = np.arange(M)
+        scale = M * radius ** k * np.exp(0.5j * np.pi * k / M)
+        dcoeffs = np.fft.fft(dets) / scale
+        acoeffs = np.fft.fft(adjs, axis=0) / scale[:, None, None]
+        return dcoeffs, acoeffs
+
+    with mpmath.workdps(digits + 5):
+        radius = mpmath.mpf(radius)
+        mats = [mpmath.matrix(Ak.tolist()) for Ak in arrays]
+        dets = []
+        adjs = []
+        for j in range(M):
+            z = radius * mpmath.expjpi(mpmath.mpf(4 * j + 1) / (2 * M))
+            Az = mats[0].copy()
+            for k in range(1, len(mats)):
+                Az += mats[k] * z ** k
+            det = mpmath.det(Az)
+            bound = 1
+            for n in range(N):
+                bound *= mpmath.norm(Az[:, n])
+            if abs(det) <= tol * bound:
+                raise singular
+            dets.append(det)
+            adjs.append(det * mpmath.inverse(Az))
+
+        dcoeffs = []
+        acoeffs = []
+        for k in range(M):
+            w = [mpmath.expjpi(-mpmath.mpf(k * (4 * j + 1)) / (2 * M)) /
+                 (M * radius ** k) for j in range(M)]
+            dcoeffs.append(sum([w[j] * dets[j] for j in range(M)]))
+            acoeffs.append([[sum([w[j] * adjs[j][m, n] for j in range(M)])
+                             for n in range(N)] for m in range(N)])
+    return np.array(dcoeffs, dtype=object), np.array(acoeffs, dtype=object)
+
+
+def _numeric_adjugate(A, var, digits=15):
+    """Return determinant and adjugate of the square matrix A, whose
+    entries are polynomials of var with numerical coefficients, as
+    polynomials of var with floating point coefficients with the
+    specified number of significant digits.  These are interpolated
+    from their values at points on a circle about the origin, so no
+    symbolic manipulation is required.  The radius of the circle is
+    refined so that it is the geometric mean of the magnitudes of the
+    roots of the determinant.  Coefficients smaller than the rounding
+    error are zeroed.  None is returned if A is not of this form; a
+    ValueError is raised if it is singular to within rounding error."""
+
+    arrays = _coefficient_arrays(A, var)
+    if arrays is None:
+        return None
+    N = A.rows
+    M = _column_degree_sum(arrays) + 1
+    real = all([not np.iscomplex(Ak).any() for Ak in arrays])
+    tol = 10.0 ** (2 - digits)
+
+    radius = _balancing_radius(arrays)
+    for attempt in range(2):
+        dcoeffs, acoeffs = _interpolate_adjugate(arrays, M, radius, digits)
+        size = max([abs(c) * radius ** k for k, c in enumerate(dcoeffs)])
+        powers = [k for k, c in enumerate(dcoeffs)
+                  if abs(c) * radius ** k > tol * size]
+        low, high = min(powers), max(powers)
+        if high == low:
+            break
+        new = float(abs(dcoeffs[low] / dcoeffs[high])) ** (1.0 / (high - low))
+        if abs(np.log10(new / radius)) < 1:
+            break
+        radius = new
+
+    if digits <= 15:
+        tofloat = lambda x: sym.Float(float(x), digits)
+    else:
+        tofloat = lambda x: sym.Float(mpmath.nstr(x, digits + 2), digits)
+
+    def polynomial(coeffs):
+        """Convert coefficients to sympy polynomial, zeroing those
+        smaller than the rounding error."""
+
+        size = max([abs(c) * radius ** k for k, c in enumerate(coeffs)])
+        terms = []
+        for k, c in enumerate(coeffs):
+            if abs(c) * radius ** k <= tol * size:
+                continue
+            if real:
+                c = tofloat(c.real)
+            else:
+                c = tofloat(c.real) + sym.I * tofloat(c.imag)
+            terms.append(c * var ** k)
+        return sym.Add(*terms)
+
+    det = polynomial(dcoeffs)
+    adj = sym.zeros(N, N)
+    for m in range(N):
+        for n in range(N):
+            adj[m, n] = polynomial(acoeffs[:, m, n])
+    return det, adj
+
+
+def _permute_rows(M, order):
+
+    return M.extract(order, list(range(M.cols)))
+
+
+def _unpermute_rows(M, order):
+
+    X = sym.zeros(M.rows, M.cols)
+    for m, row in enumerate(order):
+        X[row, :] = M[m, :]
+    return X
+
+
 class Nodedict(Exprdict):
 
     def __getitem__(self, name):
@@ -30,6 +463,52 @@ class Branchdict(Exprdict):
     pass
     
 
+class Solution(object):
+    """Solution of the MNA equations where each unknown is represented by
+    a numerator over the shared denominator, the determinant of the A
+    matrix.  The denominator is only stored and simplified once;
+    differences and ratios of the unknowns are found from the
+    numerators."""
+
+    def __init__(self, voltages, currents, denominator):
+
+        self.voltages = voltages
+        self.currents = currents
+        self.denominator = denominator
+
+    def V(self, node):
+        """Return node voltage as a sympy expression."""
+
+        return self.voltages[node] / self.denominator
+
+    def I(self, name):
+        """Return branch current as a sympy expression."""
+
+        return self.currents[name] / self.denominator
+
+    def Vd(self, Np, Nm):
+        """Return voltage drop between nodes Np and Nm as a sympy
+        expression."""
+
+        N = self.voltages[Np] - self.voltages[Nm]
+        return N / self.denominator
+
+    def ratio(self, N1p, N1m, N2p, N2m):
+        """Return ratio of the voltage drops V[N2p] - V[N2m] and V[N1p] -
+        V[N1m]; the denominators cancel."""
+
+        N1 = self.voltages[N1p] - self.voltages[N1m]
+        N2 = self.voltages[N2p] - self.voltages[N2m]
+        return N2 / N1
+
+    def poles(self, var):
+        """Return dictionary of the roots of the denominator with respect to
+        var and their multiplicities.  These are the natural
+        frequencies of the network."""
+
+        return sym.roots(sym.Poly(self.denominator, var))
+
+
 class MNA(object):
     """This class performs modified nodal analysis (MNA) on a netlist of
     components.  There are several variants:
@@ -56,7 +535,9 @@ class MNA(object):
     """
 
     def _invalidate(self):
-        for attr in ('_A', '_Vdict', '_Idict', '_node_list'):
+        for attr in ('_A', '_Vdict', '_Idict', '_solution', '_node_list',
+                     '_LU',
+                     '_port_columns', '_killed_sub', '_ordering', '_blocks'):
             if hasattr(self, attr):
                 delattr(self, attr)
 
@@ -127,8 +608,11 @@ class MNA(object):
         self._Is = sym.zeros(num_nodes, 1)
         self._Es = sym.zeros(num_branches, 1)
 
-        for elt in self.elements.values():
-            elt.stamp(self)
+        # The component values are parsed in the context of the
+        # netlist, say for numeric mode.
+        with self.context.activate():
+            for elt in self.elements.values():
+                elt.stamp(self)
 
         # Augment the admittance matrix to form A matrix.
         self._A = self._G.row_join(self._B).col_join(self._C.row_join(self._D))
@@ -136,6 +620,317 @@ class MNA(object):
         # to form Z vector.
         self._Z = self._Is.col_join(self._Es)
 
+    @property
+    def ordering(self):
+        """Fill-reducing (minimum degree) ordering of the unknowns of the
+        MNA equations.  The solvers eliminate the unknowns in this
+        order to reduce the growth of the symbolic expressions."""
+
+        if hasattr(self, '_ordering'):
+            return self._ordering
+        self._analyse()
+
+        self._ordering = _min_degree_ordering(_sparsity_graph(self._A))
+        return self._ordering
+
+    def fill_report(self):
+        """Return dictionary with the number of non-zero entries of the A
+        matrix ('nnz') and the number of fill-in entries of its LU
+        factors for the original ordering of the unknowns ('natural')
+        and the fill-reducing ordering ('ordered')."""
+
+        self._analyse()
+
+        adj = _sparsity_graph(self._A)
+        nnz = len([x for x in self._A if x != 0])
+        return {'nnz': nnz,
+                'natural': _fill_in(adj, range(len(adj))),
+                'ordered': _fill_in(adj, self.ordering)}
+
+    @property
+    def blocks(self):
+        """Diagonal blocks of the block triangular form of the A matrix as
+        a list of (rows, cols) pairs in the order they are solved.
+        Sections of a network that are only coupled through controlled
+        sources, or not at all, form separate blocks."""
+
+        if hasattr(self, '_blocks'):
+            return self._blocks
+        self._analyse()
+
+        self._blocks = _block_triangular(self._A)
+        return self._blocks
+
+    def _block_solve(self, Z):
+        """Solve A X = Z by solving the diagonal blocks of the block
+        triangular form of A in turn, substituting the solutions of the
+        previous blocks.  The unknowns of each block are eliminated in
+        a fill-reducing order.  Return X and the determinant of A, the
+        product of the determinants of the blocks.  A ValueError is
+        raised if A is singular."""
+
+        A = self._A
+        blocks = self.blocks
+
+        X = sym.zeros(A.rows, Z.cols)
+        allcols = list(range(Z.cols))
+        solved = []
+        det = 1
+        for rows, cols in blocks:
+            R = Z.extract(rows, allcols)
+            if solved != []:
+                R -= A.extract(rows, solved) * X.extract(solved, allcols)
+
+            Ab = A.extract(rows, cols)
+            order = _min_degree_ordering(_sparsity_graph(Ab))
+            L, U, perm = Ab.extract(order, order).LUdecomposition()
+            R = _permute_rows(R, order).as_mutable()
+            for m, n in perm:
+                R.row_swap(m, n)
+                det = -det
+            for m in range(U.rows):
+                det *= U[m, m]
+            Xb = U.upper_triangular_solve(L.lower_triangular_solve(R))
+            Xb = _unpermute_rows(Xb, order)
+            if len(blocks) > 1:
+                # Stop the expressions swelling in the substitutions.
+                Xb = Xb.applyfunc(sym.cancel)
+
+            for m, col in enumerate(cols):
+                X[col, :] = Xb[m, :]
+            solved.extend(cols)
+        return X, det
+
+    def _structural_problems(self):
+        """Return list of descriptions of the structural defects of the
+        network that make the A matrix singular, whatever the
+        component values.  These are found from the connectivity of
+        the network and a matching of the unknowns to the equations,
+        without any symbolic manipulation.
+
+        A set of nodes without a path to ground through components
+        other than current sources (and capacitors for DC analysis)
+        has linearly dependent KCL equations.  A loop of voltage
+        sources (and inductors for DC analysis) has linearly dependent
+        branch current columns."""
+
+        self._analyse()
+
+        node_map = self.node_map
+        control_currents = set()
+        for elt in self.elements.values():
+            if elt.need_control_current:
+                control_currents.add(elt.args[0])
+
+        # Each edge joins the nodes of a pair of opposite KCL stamps;
+        # the open edges do not stamp the A matrix.
+        edges = []
+        open_edges = []
+        for elt in self.elements.values():
+            if elt.type == 'K':
+                # The nodes are the names of the coupled inductors.
+                continue
+            nodes = [node_map[node] for node in elt.nodes]
+            if elt.type in ('I', 'O', 'P'):
+                open_edges.append((elt, nodes[0:2]))
+            elif elt.type == 'C' and self.kind == 'dc':
+                open_edges.append((elt, nodes[0:2]))
+            elif elt.type in ('R', 'C', 'L', 'V', 'W', 'Y', 'Z',
+                              'E', 'F', 'G', 'H'):
+                edges.append((elt, nodes[0:2]))
+            elif elt.type == 'TF':
+                edges.append((elt, nodes[0:2]))
+                edges.append((elt, nodes[2:4]))
+            else:
+                # Summing points, transfer functions, etc. stamp KCL
+                # equations referenced to ground.
+                for node in nodes:
+                    edges.append((elt, [node, '0']))
+
+        problems = []
+
+        sets = _DisjointSets()
+        for node in self.node_list:
+            sets.find(node)
+        for elt, (node1, node2) in edges:
+            sets.union(node1, node2)
+
+        islands = {}
+        for node in self.node_list:
+            root = sets.find(node)
+            if root != sets.find('0'):
+                islands.setdefault(root, []).append(node)
+
+        for root, nodes in islands.items():
+            names = sorted(set([elt.name for elt, pair in open_edges
+                                if (sets.find(pair[0]) == root) !=
+                                (sets.find(pair[1]) == root)]))
+            nodes = ', '.join(sorted(nodes))
+            if names == []:
+                problems.append('Nodes %s are floating' % nodes)
+            elif self.kind == 'dc':
+                problems.append('Nodes %s have no DC path to ground; they'
+                                ' only connect through %s'
+                                % (nodes, ', '.join(names)))
+            else:
+                problems.append('Nodes %s only connect to ground through'
+                                ' current sources %s'
+                                % (nodes, ', '.join(names)))
+
+        # Components whose branch currents are controlling currents
+        # have other entries in their columns so are ignored.
+        sets = _DisjointSets()
+        tree = {}
+        for elt, (node1, node2) in edges:
+            if elt.name in control_currents:
+                continue
+            if not (elt.type in ('V', 'E', 'H') or
+                    (elt.type == 'L' and self.kind == 'dc')):
+                continue
+            if sets.union(node1, node2):
+                tree.setdefault(node1, []).append((node2, elt.name))
+                tree.setdefault(node2, []).append((node1, elt.name))
+            elif node1 == node2:
+                problems.append('%s is short-circuited' % elt.name)
+            else:
+                names = [elt.name] + _tree_path(tree, node1, node2)
+                problems.append('%s form a loop'
+                                % ', '.join(sorted(names)))
+
+        if problems != []:
+            return problems
+
+        # Catch anything else, say a dependent source controlled by
+        # its own output, with a maximum matching of the unknowns.
+        N = self._A.rows
+        col_match = _maximum_matching(_row_structure(self._A), N)
+        num_nodes = len(self.node_list) - 1
+        for col, row in enumerate(col_match):
+            if row is not None:
+                continue
+            if col < num_nodes:
+                unknown = 'the voltage at node %s' % self.node_list[col + 1]
+            else:
+                unknown = ('the current through %s' %
+                           self.unknown_branch_currents[col - num_nodes])
+            problems.append('There is no equation to determine %s' % unknown)
+        return problems
+
+    def _check_structure(self):
+        """Raise a ValueError naming the offending components if the A
+        matrix is structurally singular."""
+
+        problems = self._structural_problems()
+        if problems != []:
+            raise ValueError('The MNA A matrix is singular: %s.'
+                             % '; '.join(problems))
+
+    def _factor(self):
+        """LU factorize the A matrix with its rows and columns permuted by
+        the fill-reducing ordering.  The factors are cached so that
+        the network can be solved for many right hand sides."""
+
+        if hasattr(self, '_LU'):
+            return self._LU
+        self._analyse()
+
+        self._check_structure()
+        order = self.ordering
+        L, U, perm = self._A.extract(order, order).LUdecomposition()
+        # Cancel the factors to stop the expressions swelling in the
+        # substitutions.
+        L = L.applyfunc(sym.cancel)
+        U = U.applyfunc(sym.cancel)
+        for m in range(U.rows):
+            if sym.simplify(U[m, m]) == 0:
+                raise ValueError('The MNA A matrix is not invertible')
+
+        self._LU = L, U, perm
+        return self._LU
+
+    def _solve_rhs(self, R):
+        """Solve A X = R using the LU factorization of the A matrix.  R can
+        have multiple columns; each column is a different excitation."""
+
+        L, U, perm = self._factor()
+
+        R = _permute_rows(R, self.ordering).as_mutable()
+        for m, n in perm:
+            R.row_swap(m, n)
+
+        X = U.upper_triangular_solve(L.lower_triangular_solve(R))
+        return _unpermute_rows(X, self.ordering).applyfunc(sym.cancel)
+
+    def _port_rhs(self, ports):
+        """Return right hand side matrix with a column for each port
+        (Np, Nm) injecting a unit current into Np and out of Nm."""
+
+        self._analyse()
+
+        R = sym.zeros(self._A.rows, len(ports))
+        for m, (Np, Nm) in enumerate(ports):
+            n1, n2 = self._node_index(Np), self._node_index(Nm)
+            if n1 >= 0:
+                R[n1, m] += 1
+            if n2 >= 0:
+                R[n2, m] -= 1
+        return R
+
+    def _numeric_GC(self):
+        """Return numpy arrays G and C where the s-domain A matrix is
+        G + s C.  The branch equations are negated so that for an RLC
+        network G + G^T and C are positive semi-definite as required
+        for passive model order reduction."""
+
+        self._analyse()
+
+        A = self._A
+        if A.free_symbols - set((s.expr, )) != set():
+            raise ValueError('Cannot create numeric MNA matrices with symbols %s'
+                             % (A.free_symbols - set((s.expr, ))))
+
+        G = A.subs(s.expr, 0)
+        C = A.diff(s.expr)
+        if C.diff(s.expr) != sym.zeros(*A.shape):
+            raise ValueError('The MNA A matrix is not linear in s')
+
+        G = np.array(G.tolist(), dtype=float)
+        C = np.array(C.tolist(), dtype=float)
+
+        num_nodes = len(self.node_list) - 1
+        G[num_nodes:, :] *= -1
+        C[num_nodes:, :] *= -1
+        return G, C
+
+    def _port_voltages(self, X, Np, Nm):
+        """Return row vector of the voltage drops between nodes Np and Nm for
+        each column of the solution X."""
+
+        n1, n2 = self._node_index(Np), self._node_index(Nm)
+        V = sym.zeros(1, X.cols)
+        if n1 >= 0:
+            V += X[n1, :]
+        if n2 >= 0:
+            V -= X[n2, :]
+        return V
+
+    def _port_solve(self, ports):
+        """Return the solutions for a unit current injected in turn into
+        each port (Np, Nm).  Only the ports that have not been solved
+        previously are solved for; this uses a single factorization."""
+
+        if not hasattr(self, '_port_columns'):
+            self._port_columns = {}
+        cache = self._port_columns
+
+        new = [port for port in ports if port not in cache]
+        if new != []:
+            X = self._solve_rhs(self._port_rhs(new))
+            for m, port in enumerate(new):
+                cache[port] = X[:, m]
+
+        return sym.Matrix.hstack(*[cache[port] for port in ports])
+
     def _solve(self):
         """Solve network."""
 
@@ -143,10 +938,36 @@ class MNA(object):
             return
         self._analyse()
 
-        # Solve for the nodal voltages
+        self._check_structure()
+
+        # In numeric mode, the determinant and adjugate of the A matrix
+        # are found numerically if its entries are polynomials of s.
+        digits = self.context.float_digits
+        numeric = None
         try:
-            Ainv = self._A.inv()
+            if digits is not None:
+                numeric = _numeric_adjugate(self._A, s.expr, digits)
+            if numeric is not None:
+                denominator, adj = numeric
+                # Z is sparse; sympy is slow for the products with zero.
+                Z = self._Z
+                sources = [n for n in range(Z.rows) if Z[n] != 0]
+                numerators = sym.zeros(Z.rows, 1)
+                for m in range(Z.rows):
+                    numerators[m] = sym.Add(*[adj[m, n] * Z[n]
+                                              for n in sources])
+            else:
+                # Solve for the nodal voltages block by block.
+                results, det = self._block_solve(self._Z)
+                # The denominator of the determinant is a common
+                # factor of the numerators so only its numerator
+                # need be kept.
+                denominator = sym.fraction(cancel(det, s.expr))[0]
+                numerators = (results * denominator).applyfunc(
+                    lambda expr: cancel(expr, s.expr))
         except ValueError:
+            denominator = 0
+        if denominator == 0:
             comment = ''
             if self.kind == 'dc':
                 comment = '  Check there is a DC path between all nodes.'
@@ -157,62 +978,73 @@ class MNA(object):
                 ' open-circuited.%s' % comment)
 
         # Bug in sympy DiracDelta.simplify where it has different API.
-        #results = sym.simplify(Ainv * self._Z)
-        results = Ainv * self._Z
+        #results = sym.simplify(results)
 
-        results = results.subs(self.context.symbols)
+        # Only the symbols in the solution need replacing; the context
+        # may have many others.
+        names = set([symbol.name for symbol in
+                     numerators.free_symbols | denominator.free_symbols])
+        symbols = dict([(name, self.context.symbols[name]) for name in names
+                        if name in self.context.symbols])
+        numerators = numerators.subs(symbols)
+        denominator = denominator.subs(symbols)
 
-        branchdict = {}
-        for elt in self.elements.values():
-            if elt.type == 'K':
-                continue
-            n1, n2 = self.node_map[elt.nodes[0]], self.node_map[elt.nodes[1]]
-            branchdict[elt.name] = (n1, n2)
-
-        self.context.switch()
-
-        vtype = vtype_select(self.kind)
-        itype = itype_select(self.kind)
-        assumptions = {}
-        if vtype == Vphasor:
-            assumptions['omega'] = self.kind
-        elif self.kind in ('s', 'ivp'):
-            assumptions = {'ac' : self.is_ac,
-                           'dc' : self.is_dc,
-                           'causal' : self.is_causal}
-        elif isinstance(self.kind, str) and self.kind[0] == 'n':
-            assumptions = {'nid' : self.kind}
-       
-        # Create dictionary of node voltages
-        self._Vdict = Nodedict()
-        self._Vdict['0'] = vtype(0, **assumptions)
+        num_nodes = len(self.node_list) - 1
+
+        voltages = {'0': 0}
         for n in self.nodes:
             index = self._node_index(n)
-            if index >= 0:
-                self._Vdict[n] = vtype(results[index], **assumptions).simplify()
-            else:
-                self._Vdict[n] = vtype(0, **assumptions)
-
-        num_nodes = len(self.node_list) - 1
+            voltages[n] = numerators[index] if index >= 0 else 0
 
-        # Create dictionary of branch currents through elements
-        self._Idict = Branchdict()
+        currents = {}
         for m, key in enumerate(self.unknown_branch_currents):
-            self._Idict[key] = itype(results[m + num_nodes], **assumptions).simplify()
+            currents[key] = numerators[m + num_nodes]
 
-        # Calculate the branch currents.  These should be lazily
-        # evaluated as required.
         for elt in self.elements.values():
             if elt.type in ('R', 'C'):
                 n1 = self.node_map[elt.nodes[0]]
-                n2 = self.node_map[elt.nodes[1]]                
-                V1, V2 = self._Vdict[n1], self._Vdict[n2]
-                I = (V1.expr - V2.expr) / elt.Z.expr
-                self._Idict[elt.name] = itype(I, **assumptions).simplify()
-            elif elt.type in ('I', ):
-                self._Idict[elt.name] = elt.Isc
+                n2 = self.node_map[elt.nodes[1]]
+                N = (voltages[n1] - voltages[n2]) / elt.Z.expr
+                currents[elt.name] = N
+
+        self._solution = Solution(voltages, currents, denominator)
+
+        with self.context.activate():
+            vtype = vtype_select(self.kind)
+            itype = itype_select(self.kind)
+            assumptions = {}
+            if vtype == Vphasor:
+                assumptions['omega'] = self.kind
+            elif self.kind in ('s', 'ivp'):
+                assumptions = {'ac' : self.is_ac,
+                               'dc' : self.is_dc,
+                               'causal' : self.is_causal}
+            elif isinstance(self.kind, str) and self.kind[0] == 'n':
+                assumptions = {'nid' : self.kind}
 
-        self.context.restore()
+            solution = self._solution
+
+            # Create dictionary of node voltages.  These are not
+            # simplified until they are accessed.
+            self._Vdict = Nodedict()
+            for n in voltages:
+                self._Vdict[n] = vtype(solution.V(n), **assumptions)
+
+            # Create dictionary of branch currents through elements
+            self._Idict = Branchdict()
+            for key in currents:
+                self._Idict[key] = itype(solution.I(key), **assumptions)
+            for elt in self.elements.values():
+                if elt.type in ('I', ):
+                    self._Idict[elt.name] = elt.Isc
+
+    @property
+    def solution(self):
+        """Solution of the MNA equations with the unknowns represented by
+        numerators over a shared denominator; see Solution."""
+
+        self._solve()
+        return self._solution
 
     @property
     def A(self):
@@ -238,12 +1070,22 @@ class MNA(object):
         I = ['I_' + branch for branch in self.unknown_branch_currents]
         return Vector(V + I)
 
+    def _simplified(self, values):
+        """Return copy of dictionary of results simplified to the
+        simplify level."""
+
+        level = self.simplify_level
+        result = values.__class__()
+        for key, value in values.items():
+            result[key] = value.simplify_to(level)
+        return result
+
     @property
     def Vdict(self):
         """Return dictionary of s-domain node voltages indexed by node name"""
 
         self._solve()
-        return self._Vdict
+        return self._simplified(self._Vdict)
 
     @property
     def Idict(self):
@@ -251,4 +1093,4 @@ class MNA(object):
         by component name"""
 
         self._solve()
-        return self._Idict
+        return self._simplified(self._Idict)
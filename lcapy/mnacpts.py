@@ -10,7 +10,6 @@ from __future__ import print_function
 from lcapy.core import cExpr, s, sqrt, uppercase_name
 from lcapy.grammar import delimiters
 from copy import copy
-import lcapy
 import inspect
 import sys
 
@@ -67,6 +66,11 @@ class Cpt(object):
             args += (value, )
             self.args = args
 
+        # These modules are imported here since they indirectly
+        # import this module.
+        import lcapy.oneport
+        import lcapy.twoport
+
         try:
             newclass = getattr(lcapy.oneport, self.classname)
         except:
@@ -86,6 +90,11 @@ class Cpt(object):
             return self.net
         return self.net + '; ' + str(self.opts)
 
+    def __reduce__(self):
+        # The component is pickled as its netlist and its name rather
+        # than as its parsed values.
+        return (_cpt_load, (self.cct, self.name))
+
     def stamp(self, cct):
         raise NotImplementedError('stamp method not implemented for %s' % self)
 
@@ -993,19 +1002,21 @@ def make(classname, parent, name, cpt_type, cpt_id,
     # Create instance of component object
     newclass = classes[classname]
 
-    # Switch context
-    parent.context.switch()
-
-    cpt = newclass(parent, name, cpt_type, cpt_id, string, opts_string, 
-                   nodes, *args)
+    # Parse the component values in the context of the netlist.
+    with parent.context.activate():
+        cpt = newclass(parent, name, cpt_type, cpt_id, string, opts_string, 
+                       nodes, *args)
     # Add named attributes for the args?   Lname1, etc.
-
-    # Restore context
-    parent.context.restore()
         
     return cpt
 
 
+def _cpt_load(cct, name):
+    """Return component when unpickling, see Cpt.__reduce__."""
+
+    return cct._elements[name]
+
+
 # Dynamically create classes.
 defcpt('AM', W, 'Ammeter')
 
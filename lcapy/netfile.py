@@ -1,5 +1,47 @@
 import lcapy.grammar as grammar
 from lcapy.parser import Parser
+import hashlib
+
+
+# Macromodels of included netlist files keyed by the hash of the file
+# contents.  Each macromodel is a list of netlist lines.
+macromodels = {}
+
+
+def macromodel(filename):
+    """Return macromodel for the netlist file filename as a list of
+    netlist lines.  The ports of the netlist are specified with P
+    components.  The netlist is reduced to an admittance between each
+    pair of port nodes (and ground) with Norton current sources for
+    any independent sources, see Netlist.reduce.  The macromodel is
+    cached so that the reduction is only performed once for each
+    distinct file."""
+
+    with open(filename, 'rb') as f:
+        key = hashlib.sha1(f.read()).hexdigest()
+
+    if key in macromodels:
+        return macromodels[key]
+
+    from lcapy.netlist import Netlist
+
+    cct = Netlist()
+    cct._netfile_add(filename)
+
+    ports = [cpt for cpt in cct.elements.values() if cpt.type == 'P']
+    if ports == []:
+        raise ValueError('No ports (P components) defined in %s' % filename)
+
+    nodes = []
+    for port in ports:
+        nodes.extend([node for node in port.nodes if node not in nodes])
+
+    reduced = cct.reduce(nodes)
+    lines = [str(cpt) for cpt in reduced.elements.values()]
+    lines += [str(port) for port in ports]
+
+    macromodels[key] = lines
+    return lines
 
 
 class NetfileMixin(object):
@@ -26,12 +68,21 @@ class NetfileMixin(object):
         if len(parts) == 2:
             return self._netfile_add(filename, self.namespace)
         
-        if len(parts) != 4 and parts[2] != 'as':
+        if len(parts) not in (4, 5) or parts[2] != 'as':
             raise ValueError('Expecting include filename as name in %s' % string)
+        if len(parts) == 5 and parts[4] != 'macromodel':
+            raise ValueError('Expecting include filename as name macromodel'
+                             ' in %s' % string)
         name = parts[3]
         namespace = self.namespace
         self.namespace = name + '.' + namespace
-        ret = self._netfile_add(filename, self.namespace)        
+        # Schematics always need the components.
+        if len(parts) == 5 and hasattr(self, 'reduce'):
+            for line in macromodel(filename):
+                self._add(line, self.namespace)
+            ret = None
+        else:
+            ret = self._netfile_add(filename, self.namespace)        
         self.namespace = namespace
         return ret
 
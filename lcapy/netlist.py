@@ -10,13 +10,16 @@ Copyright 2014--2017 Michael Hayes, UCECE
 # numerical quantisation.
 
 from __future__ import division
-from lcapy.core import pprint, Hs, Vs, Zs, Ys, Expr, tsym, Vt, It
+from lcapy.core import pprint, Hs, Vs, Is, Zs, Ys, Expr, tsym, Vt, It
 from lcapy.core import s, j, omega, uppercase_name, global_context
-from lcapy.core import Vsuper, Isuper
+from lcapy.core import check_simplify_level
+from lcapy.core import Vsuper, Isuper, YsMatrix, ZsMatrix
 from lcapy.schematic import Schematic, Opts, SchematicOpts
 from lcapy.mna import MNA, Nodedict, Branchdict
 from lcapy.netfile import NetfileMixin
 import lcapy.mnacpts as cpts
+import sympy as sym
+import numpy as np
 import re
 from copy import copy
 from collections import OrderedDict
@@ -73,6 +76,60 @@ class NetlistMixin(object):
         if filename is not None:
             self.netfile_add(filename)
 
+    @property
+    def simplify_level(self):
+        """Level of simplification of the analysis results, one of 'none',
+        'cancel', 'together', 'canonical', or 'full'.  Unless set,
+        the default level is used; see set_simplify_level.  The level
+        is shared with the netlists derived from this netlist."""
+
+        level = self.context.simplify_level
+        if level is None:
+            level = global_context.simplify_level
+        return level
+
+    @simplify_level.setter
+    def simplify_level(self, level):
+
+        self.context.simplify_level = check_simplify_level(level)
+        self._invalidate()
+
+    @property
+    def numeric(self):
+        """Number of significant digits of the floating point numbers in the
+        component values or False if these are converted to exact
+        rationals (the default).  Setting this to True keeps the
+        numbers as floats with 15 significant digits (machine
+        precision); setting it to an integer keeps them as arbitrary
+        precision floats with that number of digits.  This is shared
+        with the netlists derived from this netlist."""
+
+        digits = self.context.float_digits
+        if digits is None:
+            return False
+        return digits
+
+    @numeric.setter
+    def numeric(self, numeric):
+
+        if numeric is True:
+            digits = 15
+        elif numeric is False or numeric is None:
+            digits = None
+        else:
+            digits = int(numeric)
+            if digits < 1:
+                raise ValueError('Need at least one digit')
+        self.context.float_digits = digits
+
+        # Reparse the component values.
+        self._invalidate()
+        elements = list(self._elements.values())
+        self._elements = OrderedDict()
+        self.nodes = {}
+        for cpt in elements:
+            self._add(cpt.copy())
+
     def __getitem__(self, name):
         """Return element or node by name."""
 
@@ -136,6 +193,7 @@ class NetlistMixin(object):
             # Need to search lists and update component.
             # For example, remove nodes that are only connected
             # to this component.
+            self._invalidate()
         else:
             # Check that this name won't conflict with an attr.
             # For example, cannot have name V or I.  Perhaps
@@ -148,6 +206,11 @@ class NetlistMixin(object):
         for node in cpt.nodes:
             self._node_add(node, cpt)
 
+        # Update the schematic, if it has been drawn, so that the
+        # layout of the other components is kept.
+        if hasattr(self, '_sch'):
+            self._sch.add(str(cpt))
+
     def copy(self):
         """Create a copy of the netlist"""
 
@@ -167,6 +230,19 @@ class NetlistMixin(object):
         # If have OnePort, Network, etc., treat as Netlist
         return Netlist(context=context)
 
+    def __reduce__(self):
+        """Pickle the netlist as its text and options.  The components
+        are parsed when unpickled and the analysis results are
+        recalculated when required."""
+
+        cls = self.__class__
+        if isinstance(self, SubNetlist):
+            cls = Netlist
+        state = {'opts': self.opts,
+                 'simplify_level': self.context.simplify_level,
+                 'float_digits': self.context.float_digits}
+        return (_netlist_load, (cls, self.netlist(), state))
+
     def remove(self, name):
         """Remove specified element."""
 
@@ -329,12 +405,243 @@ class NetlistMixin(object):
         
         return I(Isc) | Y(Ysc)
 
+    @property
+    def _killed(self):
+        """Return s-domain MNA subnetlist for the network with the
+        independent sources killed.  This is cached so that its
+        factorization can be reused for many port calculations."""
+
+        if not hasattr(self, '_killed_sub'):
+            self._killed_sub = SubNetlist(self.kill(), [], 's')
+        return self._killed_sub
+
+    def _port_impedances(self, ports):
+        """Return sympy matrix of s-domain impedances between the ports
+        (Np, Nm) with the independent sources killed."""
+
+        for port in ports:
+            self._check_nodes(*port)
+        sub = self._killed
+        X = sub._port_solve(ports)
+        Z = sym.Matrix.vstack(*[sub._port_voltages(X, Np, Nm)
+                                for Np, Nm in ports])
+        return Z.applyfunc(sym.cancel)
+
+    def _port_admittances(self, ports):
+        """Return sympy matrix of s-domain admittances between the ports
+        (Np, Nm) with the independent sources killed.  This drives
+        each port with a voltage source and so is applicable when the
+        impedance matrix does not exist."""
+
+        for port in ports:
+            self._check_nodes(*port)
+        new = self.kill()
+        names = []
+        for m, (Np, Nm) in enumerate(ports):
+            names.append('Vport%d_' % (m + 1))
+            new._add('%s %s %s 0' % (names[-1], Np, Nm))
+        sub = SubNetlist(new, [], 's')
+        sub._analyse()
+
+        num_nodes = len(sub.node_list) - 1
+        rows = [num_nodes + sub._branch_index(name) for name in names]
+
+        R = sym.zeros(sub._A.rows, len(ports))
+        for m, row in enumerate(rows):
+            R[row, m] = 1
+        X = sub._solve_rhs(R)
+
+        # The branch currents flow out of Np through the sources.
+        Y = -sym.Matrix.vstack(*[X[row, :] for row in rows])
+        return Y.applyfunc(sym.cancel)
+
+    def port_matrix(self, ports, kind='Z'):
+        """Return s-domain impedance matrix (kind='Z') or admittance matrix
+        (kind='Y') for the specified ports with the independent
+        sources killed.  ports is a list of node pairs (Np, Nm), for
+        example, [(1, 0), (2, 0), (3, 4)].  The current for each port
+        flows into Np and out of Nm and the voltage is V[Np] - V[Nm].
+
+        The network is only factorized once; the results are cached
+        and reused by impedance, admittance, and transfer.
+        """
+
+        if kind not in ('Z', 'Y'):
+            raise ValueError('Unknown port matrix kind %s' % kind)
+
+        ports = [('%s' % Np, '%s' % Nm) for Np, Nm in ports]
+        for port in ports:
+            self._check_nodes(*port)
+
+        try:
+            Z = self._port_impedances(ports)
+        except (ValueError, RuntimeError):
+            # The network may be floating without the port sources.
+            if kind == 'Z':
+                raise ValueError('Cannot determine impedance matrix;'
+                                 ' the network may be floating')
+            Z = None
+
+        if kind == 'Z':
+            return ZsMatrix(Z)
+
+        if Z is not None and Z.det() != 0:
+            return YsMatrix(Z.inv().applyfunc(sym.cancel))
+        try:
+            return YsMatrix(self._port_admittances(ports))
+        except ValueError:
+            raise ValueError('Cannot determine admittance matrix')
+
+    def reduce(self, keep_nodes):
+        """Return new s-domain netlist with all the nodes, apart from ground
+        and those in keep_nodes, eliminated.  This uses Kron reduction
+        (the Schur complement of the MNA matrix).  The result has an
+        admittance between each pair of kept nodes and between each
+        kept node and ground.  If the network has independent sources
+        or initial conditions, these are replaced by Norton current
+        sources from ground to each of the kept nodes.  The Norton
+        sources are found separately for each transform domain of the
+        sources: dc, ac (of angular frequency omega), s, and t (for
+        resistive networks).  A ValueError is raised for other kinds
+        of source.
+
+        The network must be reciprocal, say comprised of R, L, C, Y,
+        and Z components, and ideal transformers."""
+
+        sub = self._killed
+        sub._analyse()
+
+        keep_nodes = ['%s' % node for node in keep_nodes]
+        for node in keep_nodes:
+            if node not in sub.node_map:
+                raise ValueError('Unknown node %s' % node)
+        keep_nodes = [node for node in keep_nodes
+                      if sub.node_map[node] != '0']
+
+        keep = []
+        for node in keep_nodes:
+            index = sub._node_index(node)
+            if index in keep:
+                raise ValueError('Node %s is equipotential with another'
+                                 ' kept node' % node)
+            keep.append(index)
+        eliminate = [m for m in range(sub._A.rows) if m not in keep]
+
+        A = sub._A
+        Akk = A.extract(keep, keep)
+        if eliminate == []:
+            Y = Akk
+        else:
+            Ake = A.extract(keep, eliminate)
+            Aek = A.extract(eliminate, keep)
+            Aee = A.extract(eliminate, eliminate)
+            try:
+                Y = Akk - Ake * Aee.LUsolve(Aek)
+            except ValueError:
+                raise ValueError('Cannot eliminate nodes; the network has'
+                                 ' internal nodes that are floating')
+        Y = Y.applyfunc(sym.cancel)
+
+        if (Y - Y.T).applyfunc(sym.simplify) != sym.zeros(*Y.shape):
+            raise ValueError('Cannot reduce non-reciprocal network')
+
+        new = self._new()
+        num = len(keep)
+        count = 0
+        for m in range(num):
+            Yg = sym.cancel(sum(Y[m, :]))
+            if Yg != 0:
+                count += 1
+                new.add('Y%d %s 0 %s' % (count, keep_nodes[m],
+                                         cpts.arg_format(Yg)))
+            for n in range(m + 1, num):
+                if Y[m, n] != 0:
+                    count += 1
+                    new.add('Y%d %s %s %s' % (count, keep_nodes[m],
+                                              keep_nodes[n],
+                                              cpts.arg_format(-Y[m, n])))
+
+        if self.independent_sources or self.is_ivp:
+            # Norton current sources so that the kept nodes have the
+            # same open-circuit voltages.  These are found separately
+            # for each transform domain of the sources.
+            Vocs = [self.Voc(node, 0) for node in keep_nodes]
+            kinds = []
+            for Voc in Vocs:
+                kinds.extend([kind for kind in Voc if kind not in kinds])
+
+            count = 0
+            for kind in kinds:
+                if kind == 's':
+                    Yk = Y
+                elif kind == 'dc':
+                    Yk = Y.subs(s.expr, 0)
+                elif kind == omega.expr:
+                    Yk = Y.subs(s.expr, sym.I * kind)
+                elif kind == 't' and s.expr not in Y.free_symbols:
+                    # Time-domain analysis of a resistive network.
+                    Yk = Y
+                else:
+                    raise ValueError('Cannot reduce network with %s sources'
+                                     % kind)
+
+                V = sym.Matrix([Voc[kind].expr if kind in Voc else 0
+                                for Voc in Vocs])
+                Isc = (Yk * V).applyfunc(sym.cancel)
+                for m in range(num):
+                    if Isc[m] == 0:
+                        continue
+                    count += 1
+                    if kind == omega.expr:
+                        value = '%s %s' % (cpts.arg_format(sym.Abs(Isc[m])),
+                                           cpts.arg_format(sym.arg(Isc[m])))
+                    else:
+                        value = cpts.arg_format(Isc[m])
+                    keyword = {'s': 's ', 'dc': 'dc ', 't': ''}.get(kind, 'ac ')
+                    new.add('I%d %s 0 %s%s' % (count, keep_nodes[m],
+                                                keyword, value))
+        return new
+
+    def reduce_order(self, ports, order=10, s0=0):
+        """Return reduced order model of the network as viewed from the
+        specified ports using PRIMA.  ports is a list of node pairs
+        (Np, Nm).  order is the maximum number of states of the reduced
+        model and s0 is the expansion point; this needs to be non-zero
+        if the network has nodes without a DC path to ground.
+
+        The component values must be numeric.  The reduced model is
+        passive if the network is comprised of R, L, and C components.
+        Use the error method of the reduced model to compare its
+        impedance matrix with the full model.  For two ports, the
+        twoport method returns a TwoPort object."""
+
+        from lcapy.reduction import ReducedModel
+
+        ports = [('%s' % Np, '%s' % Nm) for Np, Nm in ports]
+
+        sub = self._killed
+        G, C = sub._numeric_GC()
+        B = np.array(sub._port_rhs(ports).tolist(), dtype=float)
+
+        try:
+            return ReducedModel(G, C, B, order, s0, ports)
+        except (ValueError, np.linalg.LinAlgError):
+            raise ValueError('Cannot reduce network; try a non-zero'
+                             ' expansion point s0')
+
     def admittance(self, Np, Nm):
         """Return s-domain admittance between nodes Np and Nm with independent 
         sources killed.
 
         """
 
+        try:
+            Z = self._port_impedances([('%s' % Np, '%s' % Nm)])[0, 0]
+            if Z != 0:
+                return Ys(1 / Z, causal=True)
+        except (ValueError, RuntimeError):
+            pass
+
         new = self.kill()
 
         # Connect 1 V s-domain voltage source between nodes and
@@ -351,6 +658,12 @@ class NetlistMixin(object):
 
         """
 
+        try:
+            Z = self._port_impedances([('%s' % Np, '%s' % Nm)])[0, 0]
+            return Zs(Z, causal=True)
+        except (ValueError, RuntimeError):
+            pass
+
         new = self.kill()
 
         # Connect 1 A s-domain current source between nodes and
@@ -400,6 +713,18 @@ class NetlistMixin(object):
 
         """
 
+        try:
+            # Drive port 1 with a current source; the ratio V2 / V1 is
+            # the same as for a voltage source.
+            sub = self._killed
+            X = sub._port_solve([('%s' % N1p, '%s' % N1m)])
+            V1 = sub._port_voltages(X, '%s' % N1p, '%s' % N1m)[0, 0]
+            V2 = sub._port_voltages(X, '%s' % N2p, '%s' % N2m)[0, 0]
+            if V1 != 0:
+                return Hs(sym.cancel(V2 / V1), causal=True)
+        except (ValueError, RuntimeError):
+            pass
+
         new = self.kill()
         new._add('V1_ %d %d {DiracDelta(t)}' % (N1p, N1m))
 
@@ -414,42 +739,117 @@ class NetlistMixin(object):
         I2 is the current flowing into N2p and out of N2m
         V1 is V[N1p] - V[N1m]
         V2 is V[N2p] - V[N2m]
+
+        Note, the independent sources are ignored; they are zeroed in
+        an s-domain copy of the netlist, leaving this netlist
+        unchanged.
         """
 
-        from lcapy.twoport import AMatrix
+        V2, I1 = self._twoport_solve(N1p, N1m, N2p, N2m)
+        return self._twoport_A(V2, I1)
 
-        if self.Voc(N1p, N1m) != 0 or self.Voc(N2p, N2m) != 0:
-            raise ValueError('Network contains independent sources')
+    def _check_nodes(self, *nodes):
 
-        try:
-            self.add('V1_ %d %d {DiracDelta(t)}' % (N1p, N1m))
+        for node in nodes:
+            # The ground node may be missing for a floating network.
+            if node != '0' and node not in self.nodes:
+                raise ValueError('Unknown node %s' % node)
 
-            # A11 = V1 / V2 with I2 = 0
-            # Apply V1 and measure V2 with port 2 open-circuit
-            A11 = Hs(self.V1_.V.laplace() / self.Voc(N2p, N2m).laplace())
+    def _source_rhs(self, sub):
+        """Return s-domain right hand side vector for the independent
+        sources and initial conditions of the network.  The unknowns
+        are those of the MNA subnetlist sub; this has the sources
+        zeroed so it has the same A matrix as the network."""
 
-            # A12 = V1 / I2 with V2 = 0
-            # Apply V1 and measure I2 with port 2 short-circuit
-            A12 = Zs(self.V1_.V.laplace() / self.Isc(N2p, N2m).laplace())
+        R = sym.zeros(sub._A.rows, 1)
+        num_nodes = len(sub.node_list) - 1
 
-            self.remove('V1_')
+        if self.is_ivp:
+            # The sources are transformed to the s-domain along with
+            # the initial conditions.
+            ivp = SubNetlist(self, self.independent_sources, 'ivp')
+            ivp._analyse()
+            ivp_nodes = len(ivp.node_list) - 1
+            for node in ivp.node_list[1:]:
+                R[sub._node_index(node), 0] = ivp._Z[ivp._node_index(node)]
+            for m, name in enumerate(ivp.unknown_branch_currents):
+                R[num_nodes + sub._branch_index(name), 0] = \
+                    ivp._Z[ivp_nodes + m]
+            return R
+
+        for name in self.independent_sources:
+            elt = self.elements[name]
+            if elt.type == 'V':
+                m = num_nodes + sub._branch_index(name)
+                R[m, 0] += elt.cpt.Voc.laplace().expr
+                continue
 
-            self.add('I1_ %d %d {DiracDelta(t)}' % (N1p, N1m))
+            Isc = elt.cpt.Isc.laplace().expr
+            n1 = sub._node_index(elt.nodes[0])
+            n2 = sub._node_index(elt.nodes[1])
+            if n1 >= 0:
+                R[n1, 0] += Isc
+            if n2 >= 0:
+                R[n2, 0] -= Isc
+        return R
+
+    def _twoport_solve(self, N1p, N1m, N2p, N2m, sources=False):
+        """Return the port 2 voltages and port 1 currents (as row vectors)
+        for the excitations: (a) V1 = 0 with a unit current injected
+        into port 2, (b) V1 = 1 with port 2 open-circuit, and, if
+        sources is True, (c) V1 = 0 with port 2 open-circuit due to
+        the independent sources of the network.  These are found with
+        a single factorization."""
+
+        N1p, N1m, N2p, N2m = ['%s' % node for node in (N1p, N1m, N2p, N2m)]
+        self._check_nodes(N1p, N1m, N2p, N2m)
+
+        # The independent sources are zeroed rather than killed so
+        # that the voltage sources remain as branches; thus the same
+        # A matrix can be used with the source excitation.  Port 1 is
+        # driven by the voltage source V1_.
+        new = self.copy()
+        new._add('V1_ %s %s 0' % (N1p, N1m))
+        sub = SubNetlist(new, [], 's')
 
-            # A21 = I1 / V2 with I2 = 0
-            # Apply I1 and measure I2 with port 2 open-circuit
-            A21 = Ys(-self.I['I1_'].laplace() / self.Voc(N2p, N2m).laplace())
+        try:
+            sub._analyse()
+            row = len(sub.node_list) - 1 + sub._branch_index('V1_')
+            R = sub._port_rhs([(N2p, N2m)]).row_join(sym.zeros(sub._A.rows, 1))
+            R[row, 1] = 1
+            if sources:
+                R = R.row_join(self._source_rhs(sub))
+            X = sub._solve_rhs(R)
+        except (ValueError, RuntimeError):
+            raise ValueError('Cannot create A matrix')
 
-            # A22 = I1 / I2 with V2 = 0
-            # Apply I1 and measure I2 with port 2 short-circuit
-            A22 = Hs(-self.I['I1_'].laplace() / self.Isc(N2p, N2m).laplace())
+        V2 = sub._port_voltages(X, N2p, N2m)
+        # The branch current flows out of N1p through the source.
+        I1 = -X[row, :]
+        return V2, I1
 
-            self.remove('I1_')
-            return AMatrix(A11, A12, A21, A22)
+    @staticmethod
+    def _twoport_A(V2, I1):
 
-        except ValueError:
+        from lcapy.twoport import AMatrix
+
+        V2i, V2v = V2[0, 0], V2[0, 1]
+        I1i, I1v = I1[0, 0], I1[0, 1]
+
+        if V2v == 0:
             raise ValueError('Cannot create A matrix')
 
+        # A11 = V1 / V2 with I2 = 0
+        A11 = Hs(1 / V2v)
+        # A12 = V1 / -I2 with V2 = 0
+        A12 = Zs(V2i / V2v)
+        # A21 = I1 / V2 with I2 = 0
+        A21 = Ys(I1v / V2v)
+        # A22 = I1 / -I2 with V2 = 0
+        A22 = Hs(I1v * V2i / V2v - I1i)
+
+        return AMatrix(A11, A12, A21, A22)
+
     def select(self, sourcenames, kind):
         """Return new netlist with transform domain kind selected for
         specified source.  Sources not in sourcenames are set to zero."""
@@ -580,10 +980,33 @@ class NetlistMixin(object):
 
         from lcapy.twoport import TwoPortBModel
 
-        V2b = self.Voc(N2p, N2m)
-        I2b = self.Isc(N2p, N2m)
+        # The source excitation can only be found with the same
+        # factorization for s-domain sources and initial value
+        # problems; dc and ac sources need separate analyses.
+        sources = self.is_ivp or all([kind == 's' for kind in
+                                      self.independent_source_groups()])
+
+        V2, I1 = self._twoport_solve(N1p, N1m, N2p, N2m, sources)
+        if sources:
+            # Superpose the V1 = 1 excitation so that port 1 is
+            # open-circuit, I1 = 0, as well as port 2.
+            V2s, I1s = V2[0, 2], I1[0, 2]
+            if I1[0, 1] != 0:
+                V2s = V2s - I1s * V2[0, 1] / I1[0, 1]
+            V2b = Vs(sym.cancel(V2s))
+        else:
+            V2b = Vs(self.Voc(N2p, N2m).laplace())
+
+        A = self._twoport_A(V2, I1)
 
-        A = self.kill().Amatrix(N1p, N1m, N2p, N2m)
+        if V2b == 0:
+            I2b = Is(0)
+        elif A.A22 != 0:
+            # Use the open-circuit output impedance, A22 / A21, rather
+            # than solving the network again with port 2 short-circuited.
+            I2b = Is(V2b * A.A21 / A.A22).simplify()
+        else:
+            I2b = Is(self.Isc(N2p, N2m).laplace())
 
         return TwoPortBModel(A.B, V2b, I2b)
 
@@ -887,10 +1310,26 @@ class Netlist(NetlistMixin, NetfileMixin):
         self._invalidate()
         self.kind = 'super'
 
+    def add(self, string):
+        """Add a component to the netlist.
+        The general form is: 'Name Np Nm args'
+        where Np is the positive node and Nm is the negative node.
+
+        A positive current is defined to flow from the positive node
+        to the negative node.
+        """
+
+        # The schematic is kept since it is updated by _cpt_add.
+        sch = getattr(self, '_sch', None)
+        self._invalidate()
+        if sch is not None:
+            self._sch = sch
+        self._add(string)
+
     def _invalidate(self):
 
         for attr in ('_sch', '_sub', '_Vdict', '_Idict', '_analysis',
-                     '_node_map'):
+                     '_node_map', '_killed_sub'):
             try:
                 delattr(self, attr)
             except:
@@ -992,10 +1431,10 @@ class Netlist(NetlistMixin, NetfileMixin):
         """Current through component"""
 
         result = Isuper()
+        # The result for each transform domain is already simplified.
         for sub in self.sub.values():
             I = sub.get_I(name)
             result.add(I)
-        result = result.canonical()            
         return result
 
     def get_i(self, name):
@@ -1012,10 +1451,10 @@ class Netlist(NetlistMixin, NetfileMixin):
             Np = '%s' % Np            
 
         result = Vsuper()
+        # The result for each transform domain is already simplified.
         for sub in self.sub.values():
             Vd = sub.get_Vd(Np, Nm)
             result.add(Vd)
-        result = result.canonical()
         return result
 
     def get_vd(self, Np, Nm):
@@ -1043,7 +1482,7 @@ class SubNetlist(NetlistMixin, MNA):
         """Current through component"""
 
         self._solve()
-        return self._Idict[name].canonical()
+        return self._Idict[name].simplify_to(self.simplify_level)
 
     def get_i(self):
         """Time-domain current through component"""
@@ -1054,9 +1493,24 @@ class SubNetlist(NetlistMixin, MNA):
         """Voltage drop between nodes"""
 
         self._solve()
-        return (self._Vdict[Np] - self._Vdict[Nm]).canonical()
+        # Subtract the numerators over the shared denominator.
+        V = self._Vdict[Np]
+        Vd = V.__class__(self._solution.Vd(Np, Nm), **V.assumptions)
+        return Vd.simplify_to(self.simplify_level)
 
     def get_vd(self, Np, Nm):
         """Time-domain voltage drop between nodes"""
 
         return self.get_Vd(Np, Nm).time()
+
+
+def _netlist_load(cls, netlist, state):
+    """Create netlist when unpickling, see NetlistMixin.__reduce__."""
+
+    new = cls()
+    new.opts = state['opts']
+    new.context.simplify_level = state['simplify_level']
+    new.context.float_digits = state['float_digits']
+    if netlist != '':
+        new._add(netlist)
+    return new
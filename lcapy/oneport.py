@@ -146,11 +146,15 @@ class OnePort(Network):
     def ladder(self, *args):
         """Create (unbalanced) ladder network"""
 
+        from lcapy.twoport import Ladder
+
         return Ladder(self, *args)
 
     def lsection(self, OP2):
         """Create L section (voltage divider)"""
 
+        from lcapy.twoport import LSection
+
         if not issubclass(OP2.__class__, OnePort):
             raise TypeError('Argument not ', OnePort)
 
@@ -159,6 +163,8 @@ class OnePort(Network):
     def tsection(self, OP2, OP3):
         """Create T section"""
 
+        from lcapy.twoport import TSection
+
         if not issubclass(OP2.__class__, OnePort):
             raise TypeError('Argument not ', OnePort)
 
@@ -1042,7 +1048,3 @@ class FerriteBead(OnePort):
     def expand(self):
 
         return R(self.Rs) + (R(self.Rp) + L(self.Lp) + C(self.Cp))
-
-
-# Import this at end to circumvent circular dependencies
-from lcapy.twoport import Ladder, LSection, TSection
@@ -72,7 +72,9 @@ class Rule(object):
                 if field[0] == '.':
                     # Note name contains namespace
                     field = name + field
-                else:
+                elif not field.startswith(namespace):
+                    # The node may already have the namespace when a
+                    # component is recreated, say by select.
                     field = namespace + field
                 nodes.append(field)
             elif paramdir[param].base != 'keyword':
@@ -5,7 +5,10 @@ Copyright 2016 Michael Hayes, UCECE
 """
 
 from __future__ import division
+import numpy as np
 import sympy as sym
+import mpmath
+from mpmath.libmp import prec_to_dps
 from sympy.core.mul import _unevaluated_Mul as uMul
 
 
@@ -30,11 +33,321 @@ def _zp2tf(zeros, poles, K=1, var=None):
     return uMul(K, *(zz + pp))
 
 
+def _deflate(coeffs, root):
+    """Return coefficients of the quotient of the polynomial with the
+    specified coefficients (highest power first) and (x - root); the
+    remainder is discarded."""
+
+    quotient = [coeffs[0]]
+    for c in coeffs[1:-1]:
+        quotient.append(c + root * quotient[-1])
+    return quotient
+
+
+def _polish(coeffs, root, steps=3):
+    """Refine root of the polynomial with the specified coefficients
+    using Newton's method."""
+
+    for step in range(steps):
+        value = coeffs[0]
+        deriv = 0
+        for c in coeffs[1:]:
+            deriv = deriv * root + value
+            value = value * root + c
+        if deriv == 0:
+            break
+        root -= value / deriv
+    return root
+
+
+def approximate_cancel(expr, var, digits=15):
+    """Cancel common factors of the numerator and denominator of expr, a
+    rational function of var with floating point coefficients.  Roots
+    of the numerator and denominator that agree to within rounding
+    error are treated as common factors and divided out.  Expressions
+    with other symbols are cancelled exactly with sympy.cancel."""
+
+    if var is None or expr.free_symbols - set((var, )):
+        return sym.cancel(expr)
+
+    # Avoid sympy.cancel if possible since this is slow for floating
+    # point coefficients.
+    N, D = sym.fraction(expr)
+    try:
+        Npoly, Dpoly = sym.Poly(N, var), sym.Poly(D, var)
+    except sym.PolynomialError:
+        expr = sym.cancel(expr)
+        N, D = sym.fraction(expr)
+        Npoly, Dpoly = sym.Poly(N, var), sym.Poly(D, var)
+    expr = N / D
+
+    if Npoly.is_zero:
+        return sym.S.Zero
+    if Npoly.degree() < 1 or Dpoly.degree() < 1:
+        return expr
+
+    with mpmath.workdps(digits):
+        try:
+            Ncoeffs = [mpmath.mpmathify(c) for c in Npoly.all_coeffs()]
+            Dcoeffs = [mpmath.mpmathify(c) for c in Dpoly.all_coeffs()]
+            # The roots are found to machine precision and then
+            # polished if more digits are required.
+            Nroots = list(np.roots([complex(c) for c in Ncoeffs]))
+            Droots = list(np.roots([complex(c) for c in Dcoeffs]))
+        except (TypeError, ValueError, np.linalg.LinAlgError):
+            # Coefficients not numbers.
+            return expr
+
+        # Multiple roots are only accurate to about half the digits.
+        tol = 10.0 ** (-min(digits, 15) / 2)
+        common = []
+        for root in Nroots:
+            if Droots == []:
+                break
+            match = min(Droots, key=lambda pole: abs(pole - root))
+            if abs(match - root) <= tol * max(1, abs(root)):
+                Droots.remove(match)
+                common.append(root)
+
+        if common == []:
+            return expr
+
+        real = not any([isinstance(c, mpmath.mpc)
+                        for c in Ncoeffs + Dcoeffs])
+        for root in common:
+            root = mpmath.mpc(root)
+            if digits > 15:
+                root = _polish(Dcoeffs, root)
+            Ncoeffs = _deflate(Ncoeffs, root)
+            Dcoeffs = _deflate(Dcoeffs, root)
+
+        def convert(coeffs):
+            if real:
+                coeffs = [sym.Float(mpmath.re(c), digits) for c in coeffs]
+            else:
+                coeffs = [sym.Float(mpmath.re(c), digits) +
+                          sym.I * sym.Float(mpmath.im(c), digits)
+                          for c in coeffs]
+            return sym.Poly(coeffs, var).as_expr()
+
+        return convert(Ncoeffs) / convert(Dcoeffs)
+
+
+def cancel(expr, var=None):
+    """Cancel common factors of the numerator and denominator of expr.
+    If expr has floating point numbers, the common factors are found
+    to within the precision of these numbers; see
+    approximate_cancel."""
+
+    floats = expr.atoms(sym.Float)
+    if floats == set():
+        return sym.cancel(expr)
+
+    digits = max([prec_to_dps(x._prec) for x in floats])
+    return approximate_cancel(expr, var, digits)
+
+
+class PolyRatfun(object):
+    """Rational function represented as N(var) / D(var) * exp(-var * delay)
+    where N and D are sympy Poly objects.
+
+    Arithmetic is performed on the polynomials and common factors are
+    cancelled after each operation.  The general sympy expression is
+    only created when the expr attribute is accessed.  This is much
+    faster than repeatedly factoring a general expression when many
+    rational functions are combined, say when chaining two-ports."""
+
+    def __init__(self, N, D=1, var=None, delay=0, domain=None):
+
+        if var is None:
+            for P in (N, D):
+                if isinstance(P, sym.Poly):
+                    var = P.gen
+                    break
+            else:
+                raise ValueError('Need var to create PolyRatfun')
+
+        if not isinstance(N, sym.Poly):
+            N = sym.Poly(N, var, domain=domain)
+        if not isinstance(D, sym.Poly):
+            D = sym.Poly(D, var, domain=domain)
+        if D.is_zero:
+            raise ZeroDivisionError('Denominator of rational function is zero')
+
+        if N.is_zero:
+            D = sym.Poly(1, var, domain=D.domain)
+        else:
+            N, D = N.cancel(D, include=True)
+
+        self.N = N
+        self.D = D
+        self.var = var
+        self.delay = sym.sympify(delay)
+        self._expr = None
+
+    @classmethod
+    def from_expr(cls, expr, var, domain=None):
+        """Create PolyRatfun from a product of a rational function and
+        an exponential."""
+
+        expr = sym.sympify(expr)
+        N, D, delay = Ratfun(expr, var).as_ratfun_delay()
+        if domain is not None:
+            N = N.set_domain(domain)
+            D = D.set_domain(domain)
+        return cls(N, D, var, delay)
+
+    def _convert(self, x):
+
+        if isinstance(x, PolyRatfun):
+            if x.var != self.var:
+                raise ValueError('Cannot combine rational functions of %s and %s'
+                                 % (self.var, x.var))
+            return x
+        return self.from_expr(x, self.var)
+
+    @property
+    def expr(self):
+        """Return general sympy expression; this is created on demand."""
+
+        if self._expr is None:
+            expr = self.N.as_expr() / self.D.as_expr()
+            if self.delay != 0:
+                expr *= sym.exp(-self.var * self.delay)
+            self._expr = expr
+        return self._expr
+
+    @property
+    def is_zero(self):
+
+        return self.N.is_zero
+
+    @property
+    def free_symbols(self):
+
+        return self.N.free_symbols | self.D.free_symbols | \
+            self.delay.free_symbols
+
+    def as_ratfun_delay(self):
+        """Return (N, D, delay) where expr = (N / D) * exp(-var * delay)"""
+
+        return self.N, self.D, self.delay
+
+    def __repr__(self):
+
+        return '%s(%s, %s, %s, %s)' % (self.__class__.__name__,
+                                       self.N.as_expr(), self.D.as_expr(),
+                                       self.var, self.delay)
+
+    def __str__(self):
+
+        return str(self.expr)
+
+    def __eq__(self, x):
+
+        try:
+            x = self._convert(x)
+        except ValueError:
+            return False
+        # Both are in lowest terms but may differ by a constant factor.
+        return (self.delay == x.delay and
+                (self.N * x.D - x.N * self.D).is_zero)
+
+    def __ne__(self, x):
+
+        return not self.__eq__(x)
+
+    def __hash__(self):
+
+        return hash(self.expr)
+
+    def __reduce__(self):
+        # sympy Poly objects cannot be pickled so the polynomials are
+        # pickled as expressions.
+        return (self.__class__, (self.N.as_expr(), self.D.as_expr(),
+                                 self.var, self.delay))
+
+    def __neg__(self):
+
+        return self.__class__(-self.N, self.D, self.var, self.delay)
+
+    def __add__(self, x):
+
+        x = self._convert(x)
+        if self.is_zero:
+            return x
+        if x.is_zero:
+            return self
+        if self.delay != x.delay:
+            raise ValueError('Cannot add rational functions with different'
+                             ' delays %s and %s' % (self.delay, x.delay))
+
+        # Use the lcm of the denominators to avoid unnecessary growth.
+        D = self.D.lcm(x.D)
+        N = self.N * D.quo(self.D) + x.N * D.quo(x.D)
+        return self.__class__(N, D, self.var, self.delay)
+
+    def __radd__(self, x):
+
+        return self.__add__(x)
+
+    def __sub__(self, x):
+
+        return self.__add__(-self._convert(x))
+
+    def __rsub__(self, x):
+
+        return (-self).__add__(x)
+
+    def __mul__(self, x):
+
+        x = self._convert(x)
+
+        # Cross cancel first to keep the products small.
+        N1, D2 = self.N.cancel(x.D, include=True)
+        N2, D1 = x.N.cancel(self.D, include=True)
+        return self.__class__(N1 * N2, D1 * D2, self.var,
+                              self.delay + x.delay)
+
+    def __rmul__(self, x):
+
+        return self.__mul__(x)
+
+    def __truediv__(self, x):
+
+        return self.__mul__(self._convert(x).reciprocal())
+
+    def __rtruediv__(self, x):
+
+        return self.reciprocal().__mul__(x)
+
+    __div__ = __truediv__
+    __rdiv__ = __rtruediv__
+
+    def __pow__(self, n):
+
+        if not isinstance(n, int):
+            raise ValueError('Can only raise PolyRatfun to an integer power')
+        if n < 0:
+            return self.reciprocal() ** -n
+        return self.__class__(self.N ** n, self.D ** n, self.var,
+                              self.delay * n)
+
+    def reciprocal(self):
+        """Return 1 / self."""
+
+        if self.is_zero:
+            raise ZeroDivisionError('Reciprocal of zero rational function')
+        return self.__class__(self.D, self.N, self.var, -self.delay)
+
+
 class Ratfun(object):
 
-    def __init__(self, expr, var):
+    def __init__(self, expr, var, ratfun_delay=None):
         self.expr = expr
         self.var = var
+        # Optional precomputed (N, D, delay) to avoid factoring expr.
+        self._ratfun_delay = ratfun_delay
 
     def as_residue_parts(self):
         """Return residues of expression"""
@@ -79,6 +392,9 @@ class Ratfun(object):
         
         Note, delay only represents a delay when var is s."""
 
+        if self._ratfun_delay is not None:
+            return self._ratfun_delay
+
         expr = self.expr
         var = self.var
         
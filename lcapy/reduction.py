@@ -0,0 +1,206 @@
+"""
+This module performs model order reduction of large RLC networks
+using PRIMA (passive reduced-order interconnect macromodeling
+algorithm).  The MNA equations of the network, with the independent
+sources killed, are written as
+
+(G + s C) x = B u,  y = B^T x
+
+where u are the currents injected into the ports and y are the port
+voltages.  These are projected onto an orthonormal basis X of the
+block Krylov subspace of -(G + s0 C)^-1 C with starting block
+(G + s0 C)^-1 B.  The congruence transform preserves passivity and the
+first moments of the port impedance matrix about s0 are matched.
+
+Copyright 2017 Michael Hayes, UCECE
+"""
+
+from __future__ import division
+import numpy as np
+import sympy as sym
+from scipy.linalg import lu_factor, lu_solve
+
+
+def _orthonormalize(V, X, tol=1e-12):
+    """Orthonormalize the columns of V against the columns of X and each
+    other.  Columns that are linearly dependent are dropped."""
+
+    # Twice is enough (Kahan) for modified Gram-Schmidt.
+    for _ in range(2):
+        if X.shape[1] > 0:
+            V = V - np.dot(X, np.dot(X.T, V))
+
+    columns = []
+    for m in range(V.shape[1]):
+        v = V[:, m]
+        for q in columns:
+            v = v - np.dot(q, v) * q
+        norm = np.linalg.norm(v)
+        if norm > tol * max(1, np.linalg.norm(V[:, m])):
+            columns.append(v / norm)
+
+    if columns == []:
+        return np.zeros((V.shape[0], 0))
+    return np.column_stack(columns)
+
+
+def prima(G, C, B, order, s0=0):
+    """Return orthonormal projection matrix X with at most order columns
+    using the block Arnoldi algorithm."""
+
+    M = lu_factor(G + s0 * C)
+
+    X = np.zeros((G.shape[0], 0))
+    V = lu_solve(M, B)
+    while X.shape[1] < order:
+        V = _orthonormalize(V, X)
+        if V.shape[1] == 0:
+            # The Krylov subspace is exhausted.
+            break
+        X = np.hstack((X, V))
+        V = -lu_solve(M, np.dot(C, V))
+
+    return X[:, 0:order]
+
+
+class ReducedModel(object):
+    """Reduced order model of a network found with PRIMA.  The reduced
+    model has the matrices G, C, and B where the port impedance matrix
+    is Z(s) = B^T (G + s C)^-1 B.
+
+    The full model is retained so that the error of the reduced model
+    can be determined, see error."""
+
+    def __init__(self, G, C, B, order, s0=0, ports=None):
+
+        X = prima(G, C, B, order, s0)
+
+        self.X = X
+        self.G = np.dot(X.T, np.dot(G, X))
+        self.C = np.dot(X.T, np.dot(C, X))
+        self.B = np.dot(X.T, B)
+        self.s0 = s0
+        self.ports = ports
+        self._full = G, C, B
+
+    @property
+    def order(self):
+        """Order of the reduced model."""
+
+        return self.G.shape[0]
+
+    @property
+    def full_order(self):
+        """Order of the full model."""
+
+        return self._full[0].shape[0]
+
+    @staticmethod
+    def _Zeval(G, C, B, fvector):
+
+        fvector = np.atleast_1d(np.asarray(fvector, dtype=float))
+        Z = np.empty((len(fvector), B.shape[1], B.shape[1]), dtype=complex)
+        for m, f in enumerate(fvector):
+            Z[m] = np.dot(B.T, np.linalg.solve(G + 2j * np.pi * f * C, B))
+        return Z
+
+    def Zparams(self, fvector):
+        """Return impedance matrix of the reduced model evaluated at each of
+        the frequencies in fvector as a complex array of shape
+        (len(fvector), N, N) where N is the number of ports."""
+
+        return self._Zeval(self.G, self.C, self.B, fvector)
+
+    def Zparams_full(self, fvector):
+        """Return impedance matrix of the full model evaluated at each of
+        the frequencies in fvector."""
+
+        return self._Zeval(self._full[0], self._full[1], self._full[2],
+                           fvector)
+
+    def error(self, fvector):
+        """Return relative error (Frobenius norm) of the impedance matrix of
+        the reduced model compared with the full model at each of the
+        frequencies in fvector."""
+
+        Zr = self.Zparams(fvector)
+        Zf = self.Zparams_full(fvector)
+
+        error = np.empty(len(Zr))
+        for m in range(len(Zr)):
+            error[m] = (np.linalg.norm(Zr[m] - Zf[m]) /
+                        max(np.linalg.norm(Zf[m]), 1e-300))
+        return error
+
+    def _pole_residue(self):
+        """Return poles, residues, and direct term of the impedance matrix
+        of the reduced model.  With G' = G + s0 C and the eigen
+        decomposition G'^-1 C = V diag(lambda) V^-1,
+
+        Z(s) = B^T V diag(1 / (1 + (s - s0) lambda)) V^-1 G'^-1 B
+
+        so each non-zero eigenvalue gives a pole at s0 - 1 / lambda."""
+
+        if hasattr(self, '_poleres'):
+            return self._poleres
+
+        Gs = self.G + self.s0 * self.C
+        lam, V = np.linalg.eig(np.linalg.solve(Gs, self.C))
+        Left = np.dot(self.B.T, V)
+        Right = np.linalg.solve(V, np.linalg.solve(Gs, self.B))
+
+        finite = abs(lam) > 1e-12 * max(1, max(abs(lam)))
+        poles = self.s0 - 1 / lam[finite]
+        residues = [np.outer(Left[:, k], Right[k, :]) / lam[k]
+                    for k in np.nonzero(finite)[0]]
+        direct = np.dot(Left[:, ~finite], Right[~finite, :])
+
+        self._poleres = poles, residues, direct
+        return self._poleres
+
+    @property
+    def poles(self):
+        """Poles of the reduced model as a numpy array."""
+
+        return self._pole_residue()[0]
+
+    @property
+    def Z(self):
+        """Return s-domain impedance matrix of the reduced model.  This is
+        formed from the pole-residue representation so that no
+        symbolic matrix inversion is required."""
+
+        from lcapy.core import ssym, ZsMatrix
+
+        poles, residues, direct = self._pole_residue()
+
+        D = np.poly(poles)
+        Nports = self.B.shape[1]
+        Z = sym.zeros(Nports, Nports)
+        for m in range(Nports):
+            for n in range(Nports):
+                N = direct[m, n] * D
+                for k, r in enumerate(residues):
+                    N = np.polyadd(N, r[m, n] * np.poly(np.delete(poles, k)))
+                # The poles and residues occur in conjugate pairs.
+                N = sym.Poly(np.real(N).tolist(), ssym)
+                Z[m, n] = N.as_expr() / sym.Poly(np.real(D).tolist(),
+                                                 ssym).as_expr()
+        return ZsMatrix(Z)
+
+    def twoport(self):
+        """Return two-port Z model of the reduced model; this requires two
+        ports."""
+
+        from lcapy.twoport import TwoPortZModel, ZMatrix
+
+        if self.B.shape[1] != 2:
+            raise ValueError('Need two ports for a two-port model')
+
+        Z = self.Z
+        return TwoPortZModel(ZMatrix(Z[0, 0], Z[0, 1], Z[1, 0], Z[1, 1]))
+
+    def __repr__(self):
+
+        return '%s(order=%d, full_order=%d)' % (self.__class__.__name__,
+                                                self.order, self.full_order)
@@ -0,0 +1,135 @@
+"""
+This module provides a content-addressed cache of rendered schematics.
+The files are named by a hash of the generated LaTeX, the output
+format, the rendering options, and the toolchain version so that an
+unchanged schematic is copied from the cache rather than being
+rendered again with pdflatex.
+
+The cache is stored in the directory specified by the LCAPY_CACHE_DIR
+environment variable, otherwise in lcapy in the user's cache
+directory (XDG_CACHE_HOME or ~/.cache).
+
+Copyright 2017 Michael Hayes, UCECE
+"""
+
+from os import path, environ, makedirs, rename, remove, close
+from shutil import copyfile
+from tempfile import mkstemp
+import hashlib
+import json
+
+
+def cache_dir():
+    """Return name of the cache directory."""
+
+    dirname = environ.get('LCAPY_CACHE_DIR')
+    if dirname is not None:
+        return dirname
+
+    base = environ.get('XDG_CACHE_HOME')
+    if base is None:
+        base = path.join(path.expanduser('~'), '.cache')
+    return path.join(base, 'lcapy')
+
+
+def _makedirs(dirname):
+
+    try:
+        makedirs(dirname)
+    except OSError:
+        # The directory exists or cannot be created; in the latter
+        # case, the cache is not used.
+        pass
+
+
+def _tmpfilename(dst):
+    """Return name of a new temporary file in the directory of dst.  This
+    is unique so that threads and processes writing the same file do
+    not share it."""
+
+    fd, tmp = mkstemp(suffix='.tmp', dir=path.dirname(dst))
+    close(fd)
+    return tmp
+
+
+def _atomic_copy(src, dst):
+    """Copy src to dst so that a partially written dst is never seen by
+    another process or thread."""
+
+    tmp = _tmpfilename(dst)
+    copyfile(src, tmp)
+    try:
+        rename(tmp, dst)
+    except OSError:
+        # On Windows, rename fails if dst exists.
+        remove(tmp)
+
+
+def render_key(content, ext, *args):
+    """Return hash of the content and the output format ext, and the
+    other arguments, say the options and toolchain version."""
+
+    h = hashlib.sha1()
+    h.update(content.encode('utf-8'))
+    for arg in (ext, ) + args:
+        h.update(b'\0')
+        h.update(str(arg).encode('utf-8'))
+    return h.hexdigest()
+
+
+def cache_filename(key, ext):
+
+    return path.join(cache_dir(), key + ext)
+
+
+def cache_lookup(key, ext, filename):
+    """Copy the cached file for key to filename.  Return False if there
+    is no cached file."""
+
+    cached = cache_filename(key, ext)
+    if not path.exists(cached):
+        return False
+    try:
+        copyfile(cached, filename)
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def cache_store(key, ext, filename):
+    """Store copy of filename in the cache for key.  Errors are ignored
+    since the cache is only an optimisation."""
+
+    _makedirs(cache_dir())
+    try:
+        _atomic_copy(filename, cache_filename(key, ext))
+    except (IOError, OSError):
+        pass
+
+
+def cache_load(name):
+    """Return dictionary stored in the cache as JSON with the specified
+    name or an empty dictionary."""
+
+    try:
+        with open(path.join(cache_dir(), name + '.json'), 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def cache_save(name, data):
+    """Store dictionary in the cache as JSON with the specified name."""
+
+    _makedirs(cache_dir())
+    filename = path.join(cache_dir(), name + '.json')
+    try:
+        tmp = _tmpfilename(filename)
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        try:
+            rename(tmp, filename)
+        except OSError:
+            remove(tmp)
+    except (IOError, OSError):
+        pass
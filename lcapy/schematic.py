@@ -41,14 +41,19 @@ import re
 from lcapy.latex import latex_str, format_label
 from lcapy.core import Expr
 import lcapy.schemcpts as cpts
+import lcapy.schemsvg as schemsvg
 from lcapy.schemgraph import Graph
 from lcapy.schemmisc import Pos, Opts
 from lcapy.netfile import NetfileMixin
-from lcapy.system import run_dot, run_latex, convert_pdf_png, convert_pdf_svg
-from lcapy.system import tmpfilename, circuitikz_version, latex_cleanup
-from os import path, remove
+from lcapy.system import run_latex, convert_pdf_png, convert_pdf_svg
+from lcapy.system import tmpdir, circuitikz_version, latex_errors
+from lcapy.rendercache import render_key, cache_lookup, cache_store
+from os import path
+from shutil import copyfile
 from collections import OrderedDict
+from io import StringIO
 import math
+from time import time
 
 __all__ = ('Schematic', )
 
@@ -376,17 +381,49 @@ class Schematic(NetfileMixin):
         if cpt.opts_string != '':
             self.hints = True
 
-        self._invalidate()
-
         if cpt.name in self.elements:
             print('Overriding component %s' % cpt.name)
             # Need to search lists and update component.
+            self._invalidate()
 
         self.elements[cpt.name] = cpt
 
         for node in cpt.required_node_names + cpt.extra_node_names:
             self._node_add(node, cpt)
 
+        self._graphs_add(cpt)
+
+    def _graphs_add(self, cpt):
+        """Add cpt to the x and y graphs, if these have been made, so
+        that when the schematic is drawn again only the positions of
+        the new nodes need to be found.  The graphs are recreated if
+        cpt joins nodes that are already in the graphs."""
+
+        for node_name in cpt.required_node_names + cpt.extra_node_names:
+            parts = node_name.split('.')
+            if len(parts) < 2 or parts[-2] not in self.elements:
+                continue
+            elt = self.elements[parts[-2]]
+            if (elt is not cpt and hasattr(elt, '_nodes') and
+                self.nodes[node_name] not in elt._nodes):
+                # The node is an anchor of another component that
+                # has already been placed so the nodes of that
+                # component change.
+                elt._invalidate()
+                self._invalidate()
+
+        if not hasattr(self, 'xgraph'):
+            return
+
+        cpt.xlink(self.xgraph)
+        cpt.ylink(self.ygraph)
+        if self.xgraph.stale or self.ygraph.stale:
+            self._invalidate()
+            return
+
+        cpt.xplace(self.xgraph)
+        cpt.yplace(self.ygraph)
+
     def check_nodes(self):
 
         def check_explicit_node(node):
@@ -457,10 +494,31 @@ class Schematic(NetfileMixin):
 
     def _positions_calculate(self):
 
-        self.make_graphs()
+        # Record the time taken for each stage of the layout to help
+        # find slow schematics; this is printed with the debug option.
+        self.timings = OrderedDict()
+        start_time = time()
 
-        xpos, self.width = self.xgraph.analyse()
-        ypos, self.height = self.ygraph.analyse()
+        # The graphs are only made when needed; they are updated as
+        # components are added, see _graphs_add.
+        try:
+            if hasattr(self, 'xgraph'):
+                self.check_nodes()
+            else:
+                self.make_graphs()
+            self.timings['make_graphs'] = time() - start_time
+
+            xpos, self.width = self.xgraph.analyse()
+            ypos, self.height = self.ygraph.analyse()
+        except:
+            # Do not update a broken graph.
+            self._invalidate()
+            raise
+
+        for name, graph in (('x', self.xgraph), ('y', self.ygraph)):
+            for key, val in graph.timings.items():
+                self.timings[name + key] = val
+        self.timings['total'] = time() - start_time
 
         scale = self.node_spacing
         for n, node in self.nodes.items():
@@ -495,13 +553,14 @@ class Schematic(NetfileMixin):
 
         return wires
 
-    def _label_nodes(self, **kwargs):
+    def _labelled_nodes(self, **kwargs):
+        """Generate the nodes to label and the TikZ anchors for their
+        labels."""
 
         label_nodes = kwargs.get('label_nodes', 'primary')
 
-        s = ''
         if not label_nodes:
-            return s
+            return
 
         for m, node in enumerate(self.nodes.values()):
 
@@ -525,56 +584,143 @@ class Schematic(NetfileMixin):
             if node.pin and node.pinpos is None:
                 continue
 
-            s += r'  \draw[anchor=%s] (%s) node {%s};''\n' % (
-                anchor, node.s, node.label.replace('_', r'\_'))
-        return s
+            yield node, anchor
 
-    def _tikz_draw(self, style_args='', **kwargs):
+    def _label_nodes(self, out, **kwargs):
+
+        for node, anchor in self._labelled_nodes(**kwargs):
+            out.write(r'  \draw[anchor=%s] (%s) node {%s};''\n' % (
+                anchor, node.s, node.label.replace('_', r'\_')))
+
+    def _tikz_write(self, out, style_args='', **kwargs):
+        """Write the TikZ code for the schematic to the file-like object
+        out.  The code is written as it is generated so that the
+        whole picture is not held in memory."""
 
         self._positions_calculate()
 
         # Note, scale does not scale the font size.
         opts = r'scale=%.2f,transform shape,/tikz/circuitikz/bipoles/length=%.2fcm,%s' % (
             self.scale, self.cpt_size, style_args)
-        s = r'\begin{tikzpicture}[%s]''\n' % opts
+        out.write(r'\begin{tikzpicture}[%s]''\n' % opts)
 
         help = float(kwargs.pop('help_lines', 0))
         if help != 0:
             start = Pos(-0.5, -0.5) * self.node_spacing
             stop = Pos(self.width + 0.5, self.height + 0.5) * self.node_spacing
 
-            s += r'\draw[help lines, blue] (%s) grid [xstep=%s, ystep=%s] (%s);''\n' % (
-                start, help, help, stop)
+            out.write(r'\draw[help lines, blue] (%s) grid [xstep=%s, ystep=%s] (%s);''\n' % (
+                start, help, help, stop))
 
         # Write coordinates
         for n in self.nodes.values():
-            s += r'  \coordinate (%s) at (%s);''\n' % (n.s, n.pos)
+            out.write(r'  \coordinate (%s) at (%s);''\n' % (n.s, n.pos))
 
         # Draw components
         for m, elt in enumerate(self.elements.values()):
-            s += elt.draw(**kwargs)
+            out.write(elt.draw(**kwargs))
 
         wires = self._make_wires()
 
-        s += self._label_nodes(**kwargs)
+        self._label_nodes(out, **kwargs)
 
-        s += '  ' + kwargs.pop('append', '')
+        out.write('  ' + kwargs.pop('append', ''))
 
-        s += r'\end{tikzpicture}''\n'
+        out.write(r'\end{tikzpicture}''\n')
 
-        return s
+    def _tikz_draw(self, style_args='', **kwargs):
 
-    def tikz_draw(self, filename, **kwargs):
+        out = StringIO()
+        self._tikz_write(out, style_args=style_args, **kwargs)
+        return out.getvalue()
+
+    def _svg_draw(self, **kwargs):
+
+        self._positions_calculate()
+
+        drawing = schemsvg.SVG(self.scale)
+
+        help = float(kwargs.pop('help_lines', 0))
+        if help != 0:
+            start = Pos(-0.5, -0.5) * self.node_spacing
+            stop = Pos(self.width + 0.5, self.height + 0.5) * self.node_spacing
+            drawing.grid(start, stop, help)
+
+        draw_nodes = kwargs.get('draw_nodes', True)
+        nodes = OrderedDict()
+
+        for elt in self.elements.values():
+            elt.svg_draw(drawing, **kwargs)
+            if elt.invisible or getattr(elt, 'implicit', False):
+                continue
+            for node in elt.nodes:
+                nodes[node.name] = node
+
+        # Draw the nodes last so that they are not obscured.
+        if draw_nodes:
+            for node in nodes.values():
+                if not node.visible(draw_nodes) or node.pin:
+                    continue
+                drawing.circle(node.pos, 0.05,
+                               fill='white' if node.port else 'black')
+
+        gap = Pos(-0.05, 0.05)
+        for node, anchor in self._labelled_nodes(**kwargs):
+            drawing.text(node.pos + gap, schemsvg.svg_text(node.label), anchor)
+
+        return drawing.svg()
+
+    def svg_draw(self, filename, **kwargs):
+        """Draw schematic as a svg or png file without using LaTeX.  This
+        is much faster than tikz_draw but only the common components
+        are supported.  Drawing png files requires cairosvg."""
 
         root, ext = path.splitext(filename)
 
-        debug = kwargs.pop('debug', False)
+        kwargs.pop('debug', False)
+        kwargs.pop('cache', True)
         oversample = float(kwargs.pop('oversample', 2))
         style = kwargs.pop('style', 'american')
         self.cpt_size = float(kwargs.pop('cpt_size', 1.2))
         self.node_spacing = float(kwargs.pop('node_spacing', 2.0))
         self.scale = float(kwargs.pop('scale', 1.0))
 
+        if style != 'american':
+            raise ValueError('Only the american style is supported for svg drawing')
+        if kwargs.pop('append', '') != '':
+            raise ValueError('The append option needs TikZ drawing')
+        if ext not in ('.svg', '.png'):
+            raise RuntimeError('Cannot create file of type %s with svg drawing' % ext)
+
+        # There is no need for circuitikz version specific drawing.
+        self.circuitikz_version = '9999/99/99'
+
+        content = self._svg_draw(**kwargs)
+
+        if kwargs.get('nosave', False):
+            return content
+
+        if ext == '.svg':
+            open(filename, 'wb').write(content.encode('utf-8'))
+            return content
+
+        try:
+            import cairosvg
+        except ImportError:
+            raise RuntimeError('cairosvg is required for drawing png files without LaTeX')
+        cairosvg.svg2png(bytestring=content.encode('utf-8'),
+                         write_to=filename, scale=oversample)
+        return content
+
+    def _tikz_style(self, kwargs):
+        """Remove the drawing options from kwargs and return the
+        circuitikz style arguments."""
+
+        style = kwargs.pop('style', 'american')
+        self.cpt_size = float(kwargs.pop('cpt_size', 1.2))
+        self.node_spacing = float(kwargs.pop('node_spacing', 2.0))
+        self.scale = float(kwargs.pop('scale', 1.0))
+
         if style == 'american':
             style_args = 'american currents, american voltages'
         elif style == 'british':
@@ -585,69 +731,108 @@ class Schematic(NetfileMixin):
         else:
             raise ValueError('Unknown style %s' % style)
 
-        # For debugging when do not want to write to file
-        nosave = kwargs.pop('nosave', False)
-
         self.circuitikz_version = circuitikz_version()
         if self.circuitikz_version is None:
             raise RuntimeError('circuitikz is not installed')
 
+        return style_args
+
+    def tikz_write(self, out, **kwargs):
+        """Write the TikZ code for the schematic to the file-like object
+        out, say an open file or a socket wrapped with makefile.  This
+        avoids creating the code as a string for large schematics.
+        The keyword arguments are the same as for draw."""
+
+        style_args = self._tikz_style(kwargs)
+        self._tikz_write(out, style_args=style_args, **kwargs)
+
+    def _tikz_debug(self, oversample):
+
+        print('width = %d, height = %d, oversample = %d, cpt_size = %.2f, node_spacing = %.2f, scale = %.2f'
+              % (self.width, self.height, oversample, 
+                 self.cpt_size, self.node_spacing, self.scale))
+        print(self.nodes)
+        print(', '.join(['%s = %.3f s' % (key, val)
+                         for key, val in self.timings.items()]))
+        # print(self.xgraph.cnodes)
+        # print(self.ygraph.cnodes)
+
+    def tikz_draw(self, filename, **kwargs):
+
+        root, ext = path.splitext(filename)
+
+        debug = kwargs.pop('debug', False)
+        oversample = float(kwargs.pop('oversample', 2))
+        style_args = self._tikz_style(kwargs)
+
+        # For debugging when do not want to write to file
+        nosave = kwargs.pop('nosave', False)
+        # Reuse previously rendered pdf, svg, and png files
+        cache = kwargs.pop('cache', True) and not debug
+
+        # Need amsmath for operatorname
+        header = ('\\documentclass[a4paper]{standalone}\n'
+                  '\\usepackage{amsmath}\n'
+                  '\\usepackage{circuitikz}\n'
+                  '\\usetikzlibrary{fit, shapes}\n'
+                  '\\begin{document}\n')
+        footer = '\\end{document}'
+
+        if ext in ('.pytex', '.schtex', '.tex') and not nosave:
+            # Write the code directly to the file.
+            with open(filename, 'w') as out:
+                if ext == '.tex':
+                    out.write(header)
+                self._tikz_write(out, style_args=style_args, **kwargs)
+                if ext == '.tex':
+                    out.write(footer)
+            if debug:
+                self._tikz_debug(oversample)
+            return
+
         content = self._tikz_draw(style_args=style_args, **kwargs)
         
         if nosave:
             return
 
         if debug:
-            print('width = %d, height = %d, oversample = %d, cpt_size = %.2f, node_spacing = %.2f, scale = %.2f'
-                  % (self.width, self.height, oversample, 
-                     self.cpt_size, self.node_spacing, self.scale))
-            print(self.nodes)
-            # print(self.xgraph.cnodes)
-            # print(self.ygraph.cnodes)
-
-        if ext in ('.pytex', '.schtex'):
-            open(filename, 'w').write(content)
-            return
+            self._tikz_debug(oversample)
 
-        # Need amsmath for operatorname
-        template = ('\\documentclass[a4paper]{standalone}\n'
-                    '\\usepackage{amsmath}\n'
-                    '\\usepackage{circuitikz}\n'
-                    '\\usetikzlibrary{fit, shapes}\n'
-                    '\\begin{document}\n%s\\end{document}')
-        content = template % content
+        content = header + content + footer
 
-        tex_filename = filename.replace(ext, '.tex')
-        open(tex_filename, 'w').write(content)
+        cache = cache and ext in ('.pdf', '.svg', '.png')
+        if cache:
+            key = render_key(content, ext, oversample,
+                             self.circuitikz_version)
+            if cache_lookup(key, ext, filename):
+                return
 
-        if ext == '.tex':
-            return
+        if ext not in ('.pdf', '.svg', '.png'):
+            raise RuntimeError('Cannot create file of type %s' % ext)
 
-        pdf_filename = tex_filename.replace('.tex', '.pdf')
-        run_latex(tex_filename)
-        if not debug:
-            latex_cleanup(tex_filename, pdf_filename)
+        # Render in a temporary directory so that schematics can be
+        # drawn concurrently.  This is kept for debugging.
+        with tmpdir(keep=debug) as dirname:
+            if debug:
+                print('Rendering in %s' % dirname)
 
-        if not path.exists(pdf_filename):
-            raise RuntimeError('Could not generate %s with pdflatex' % 
-                               pdf_filename)
+            tex_filename = path.join(dirname, 'schematic.tex')
+            open(tex_filename, 'w').write(content)
 
-        if ext == '.pdf':
-            return
+            pdf_filename = run_latex(tex_filename)
+            if not path.exists(pdf_filename):
+                raise RuntimeError('Could not generate %s with pdflatex\n%s' % 
+                                   (filename, latex_errors(tex_filename)))
 
-        if ext == '.svg':
-            convert_pdf_svg(pdf_filename, root + '.svg')
-            if not debug:
-                remove(pdf_filename)
-            return
-
-        if ext == '.png':
-            convert_pdf_png(pdf_filename, root + '.png', oversample)
-            if not debug:
-                remove(pdf_filename)
-            return
+            out_filename = path.join(dirname, 'schematic' + ext)
+            if ext == '.svg':
+                convert_pdf_svg(pdf_filename, out_filename)
+            elif ext == '.png':
+                convert_pdf_png(pdf_filename, out_filename, oversample)
+            copyfile(out_filename, filename)
 
-        raise RuntimeError('Cannot create file of type %s' % ext)
+        if cache:
+            cache_store(key, ext, filename)
 
     def draw(self, filename=None, opts={}, **kwargs):
         """
@@ -674,7 +859,10 @@ class Schematic(NetfileMixin):
            cpt_size: size of a component, default 1.5
            oversample: oversampling factor for png or pdf files
            help_lines: distance between lines in grid, default 0.0 (disabled)
+           cache: False to not reuse previously rendered files
            debug: True to display debug information
+           backend: 'tikz' to draw with circuitikz and LaTeX (default)
+             or 'svg' to draw the common components without LaTeX
         """
 
         for key, val in opts.items():
@@ -701,53 +889,72 @@ class Schematic(NetfileMixin):
         if not self.hints:
             raise RuntimeWarning('No schematic drawing hints provided!')
 
+        backend = kwargs.pop('backend', 'tikz')
+        if backend == 'tikz':
+            draw = self.tikz_draw
+        elif backend == 'svg':
+            draw = self.svg_draw
+        else:
+            raise ValueError('Unknown backend %s' % backend)
+
         png = 'png' in kwargs and kwargs.pop('png')
         svg = 'svg' in kwargs and kwargs.pop('svg')
 
         if not png and not svg:
-            png = True
+            png = backend != 'svg'
+            svg = backend == 'svg'
 
         if in_ipynb() and filename is None:
 
             if png:
                 from IPython.display import Image, display_png
 
-                pngfilename = tmpfilename('.png')
-                self.tikz_draw(pngfilename, **kwargs)
-
-                # Create and display PNG image object.
-                # There are two problems:
-                # 1. The image metadata (width, height) is ignored
-                #    when the ipynb file is loaded.
-                # 2. The image metadata (width, height) is not stored
-                #    when the ipynb file is written non-interactively.
-                display_png(Image(filename=pngfilename,
-                                  width=self.width * 100, 
-                                  height=self.height * 100))
+                with tmpdir() as dirname:
+                    pngfilename = path.join(dirname, 'schematic.png')
+                    draw(pngfilename, **kwargs)
+
+                    # Create and display PNG image object.
+                    # There are two problems:
+                    # 1. The image metadata (width, height) is ignored
+                    #    when the ipynb file is loaded.
+                    # 2. The image metadata (width, height) is not stored
+                    #    when the ipynb file is written non-interactively.
+                    display_png(Image(filename=pngfilename,
+                                      width=self.width * 100, 
+                                      height=self.height * 100))
                 return
 
-            if svg:
+            if svg and backend == 'svg':
                 from IPython.display import SVG, display_svg
 
-                svgfilename = tmpfilename('.svg')
-                self.tikz_draw(svgfilename, **kwargs)
+                kwargs['nosave'] = True
+                display_svg(SVG(data=draw('schematic.svg', **kwargs)))
+                return
+
+            if svg:
+                from IPython.display import SVG, display_svg
 
-                # Create and display SVG image object.
-                # Note, there is a problem displaying multiple SVG
-                # files since the later ones inherit the namespace of
-                # the first ones.
-                display_svg(SVG(filename=pngfilename, 
-                                width=self.width * 100,
-                                height=self.height * 100))
+                with tmpdir() as dirname:
+                    svgfilename = path.join(dirname, 'schematic.svg')
+                    self.tikz_draw(svgfilename, **kwargs)
+
+                    # Create and display SVG image object.
+                    # Note, there is a problem displaying multiple SVG
+                    # files since the later ones inherit the namespace of
+                    # the first ones.
+                    display_svg(SVG(filename=svgfilename, 
+                                    width=self.width * 100,
+                                    height=self.height * 100))
                 return
 
         if filename is None:
-            filename = tmpfilename('.png')
-            self.tikz_draw(filename=filename, **kwargs)
-            display_matplotlib(filename)
+            with tmpdir() as dirname:
+                filename = path.join(dirname, 'schematic.png')
+                draw(filename=filename, **kwargs)
+                display_matplotlib(filename)
             return
         
-        self.tikz_draw(filename=filename, **kwargs)
+        draw(filename=filename, **kwargs)
 
 def test():
 
@@ -1,6 +1,7 @@
 """
 This module defines and draws the schematic components using
-circuitikz.   The components are defined at the bottom of this file.
+circuitikz or, for the common components, as SVG.   The components
+are defined at the bottom of this file.
 
 Copyright 2015, 2016 Michael Hayes, UCECE
 """
@@ -9,6 +10,7 @@ Copyright 2015, 2016 Michael Hayes, UCECE
 from __future__ import print_function
 from lcapy.latex import latex_str, format_label
 from lcapy.schemmisc import Pos, Opts
+import lcapy.schemsvg as svg
 import numpy as np
 import sys
 
@@ -262,6 +264,12 @@ class Cpt(object):
                 return node
         raise ValueError('Unknown anchor %s for %s' % (anchor, self))
 
+    def _invalidate(self):
+
+        for attr in ('_nodes', '_tcoords'):
+            if hasattr(self, attr):
+                delattr(self, attr)
+
     @property
     def nodes(self):
         """Nodes used to draw the current element."""
@@ -418,6 +426,10 @@ class Cpt(object):
     def draw(self, **kwargs):
         raise NotImplementedError('draw method not implemented for %s' % self)
 
+    def svg_draw(self, drawing, **kwargs):
+        """Draw component with the SVG object drawing."""
+        raise NotImplementedError('svg_draw method not implemented for %s' % self)
+
 
     def opts_str_list(self, choices):
         """Format voltage, current, or label string as a key-value pair
@@ -567,6 +579,59 @@ class Cpt(object):
         return r'  \draw[%s] (%s) node[] {%s};''\n'% (
             self.args_str, pos, self.label(**kwargs))
 
+    def label_text(self, **kwargs):
+        """Return label as LaTeX string, the component identifier and/or
+        value unless overridden by the l option."""
+
+        label_values = kwargs.get('label_values', True)
+        label_ids = kwargs.get('label_ids', True)
+
+        for key, val in self.opts.items():
+            if key in self.label_keys:
+                return format_label(val)
+
+        if (label_ids and label_values and self.id_label != '' 
+            and self.value_label and self.id_label != self.value_label):
+            return '%s=%s' % (self.id_label, self.value_label)
+        elif label_ids and self.id_label != '':
+            return self.id_label
+        elif label_values and self.value_label != '':
+            return self.value_label
+        return ''
+
+    def svg_annotate(self, drawing, f, hl, hh, **kwargs):
+        """Draw the label, voltage, and current annotations for a bipole
+        with body half-length hl and half-height hh in the frame f."""
+
+        gap = 0.1
+        n = f.label_normal
+        drawing.text(f.mid + n * (hh + gap), svg.svg_text(self.label_text(**kwargs)),
+                 svg.normal_anchor(n))
+
+        for key, val in self.opts.items():
+            if key in self.voltage_keys + ('vr', ):
+                # Place voltage on opposite side to label.
+                sign = -1 if '>' in key or key == 'vr' else 1
+                u = max(hl, 0.15) + gap
+                drawing.text(f.mid - n * (hh + gap), svg.svg_text(format_label(val)),
+                         svg.normal_anchor(-n))
+                drawing.text(f.mid - n * (hh + gap) - f.d * u * sign, '+')
+                drawing.text(f.mid - n * (hh + gap) + f.d * u * sign, '−')
+                break
+
+        for key, val in self.opts.items():
+            if key in self.current_keys + ('ir', ):
+                # Draw current arrow on lead to first node.
+                sign = -1 if '<' in key or key == 'ir' else 1
+                u = (f.length / 2 + hl) / 2
+                if hl == 0:
+                    u = f.length / 4
+                drawing.line((f(-u - 0.12 * sign), f(-u + 0.12 * sign)))
+                svg.arrowhead(drawing, f(-u + 0.12 * sign), f.d * sign)
+                drawing.text(f(-u) + n * gap, svg.svg_text(format_label(val)),
+                         svg.normal_anchor(n))
+                break
+
 
 class StretchyCpt(Cpt):
 
@@ -1047,6 +1112,30 @@ class OnePort(StretchyCpt):
             node_pair_str, self.s, n2.s)
         return s
 
+    def svg_draw(self, drawing, **kwargs):
+
+        if not self.check():
+            return
+
+        if self.type not in svg.bipoles:
+            raise NotImplementedError('svg_draw method not implemented for %s' % self)
+        if self.variable and self.type not in ('C', 'R', 'L'):
+            raise ValueError('Component %s not variable' % self.name)
+
+        n1, n2 = self.nodes[0:2]
+        f = svg.Frame(n1.pos, n2.pos, self.mirror)
+
+        symbol = svg.bipoles[self.type]
+        hl = hh = 0
+        if symbol is not None:
+            hl, hh = symbol(drawing, f, self.sch.cpt_size * self.scale)
+            drawing.line((f.p1, f(-hl)))
+            drawing.line((f(hl), f.p2))
+            if self.variable:
+                svg.variable(drawing, f, hl, hh)
+
+        self.svg_annotate(drawing, f, hl, hh, **kwargs)
+
 
 class VCS(OnePort):
     """Voltage controlled source"""
@@ -1125,6 +1214,39 @@ class Opamp(FixedCpt):
         s += self.draw_nodes(**kwargs)
         return s
 
+    def svg_draw(self, drawing, **kwargs):
+
+        if not self.check():
+            return
+
+        centre = self.node('mid').pos.xy
+        mid = np.array(self.anchors['mid'])
+
+        def body(xy):
+            # Position on the opamp body relative to its centre.
+            offset = (np.array(xy) - mid) * (self.w, self.h)
+            return centre + np.dot(offset, self.R()) * (
+                self.size * self.scale * self.sch.node_spacing)
+
+        # Vertices of the triangle, in the coordinates of the anchors.
+        drawing.line((body((0.35, 0.99)), body((0.35, -0.99)), body((2.17, 0))),
+                 closed=True)
+
+        for anchor, pin in (('out', (2.17, 0)),
+                            ('+', (0.35, self.anchors['+'][1])),
+                            ('-', (0.35, self.anchors['-'][1]))):
+            p1 = body(pin)
+            if anchor != 'out':
+                p1 = body((pin[0] - 0.35, pin[1]))
+                drawing.line((p1, body(pin)))
+            p2 = self.node(anchor).pos.xy
+            # Join the pin to the node, vertically then horizontally.
+            drawing.line((p1, (p1[0], p2[1]), p2))
+
+        drawing.text(body((0.55, self.anchors['+'][1])), '+')
+        drawing.text(body((0.55, self.anchors['-'][1])), '−')
+        drawing.text(centre, svg.svg_text(self.label(**kwargs)))
+
 
 class FDOpamp(FixedCpt):
 
@@ -1765,6 +1887,44 @@ class Wire(OnePort):
                     self.args_str, n1.s, self.current_str, n2.s)
         return s
 
+    def svg_draw(self, drawing, **kwargs):
+
+        if not self.check():
+            return
+
+        n1, n2 = self.nodes
+        f = svg.Frame(n1.pos, n2.pos)
+
+        if self.implicit:
+            kind = 'sground'
+            for key in self.implicit_keys:
+                if key in self.opts and key != 'implicit':
+                    kind = key
+            drawing.line((f.p1, f.p2))
+            svg.ground(drawing, f.p2, f.d, kind)
+            if 'l' in self.opts:
+                anchor = 'north west' if self.down else 'south west'
+                drawing.text(self.tf(n2.pos, (0.125, 0)),
+                         svg.svg_text(self.label(**kwargs)), anchor)
+            return
+
+        width = 3 if self.opts.get('bus', False) else None
+        drawing.line((f.p1, f.p2), width=width)
+
+        startarrow = self.opts.get('startarrow', '')
+        endarrow = self.opts.get('endarrow', self.opts.get('arrow', ''))
+        for arrow, p, d in ((startarrow, f.p1, -f.d), (endarrow, f.p2, f.d)):
+            if arrow == 'tri':
+                svg.arrowhead(drawing, p, d)
+            elif arrow == 'otri':
+                svg.arrowhead(drawing, p, d, fill='white')
+            elif arrow == 'tee':
+                drawing.line((p + f.n * 0.1, p - f.n * 0.1))
+            elif arrow != '':
+                raise NotImplementedError('svg_draw method not implemented for arrow %s' % arrow)
+
+        self.svg_annotate(drawing, f, 0, 0, **kwargs)
+
 
 class FB(StretchyCpt):
     """Ferrite bead"""
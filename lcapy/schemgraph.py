@@ -1,4 +1,8 @@
 from __future__ import print_function
+from lcapy.system import run_dot, tmpdir
+from collections import OrderedDict
+from os import path
+from time import time
 
 class Cnodes(dict):
     """Common nodes"""
@@ -97,6 +101,16 @@ class Graph(dict):
 
         self.cnodes = Cnodes(nodes)
         self.name = name
+        # The gnodes and forward edges added since the last analysis
+        # and the positions found by the last analysis.  These are
+        # used to update the positions when components are added.
+        self.new_gnodes = []
+        self.new_edges = []
+        self.result = None
+        self.changed = True
+        # This is set if the graph cannot be updated and needs to be
+        # recreated.
+        self.stale = False
 
     def __repr__(self):
 
@@ -123,8 +137,29 @@ class Graph(dict):
 
     def link(self, n1, n2):
         """Make nodes n1 and n2 share common node"""
-        
+
+        keys = set((self.cnode(n1), self.cnode(n2)))
         self.cnodes.link(n1, n2)
+        self.changed = True
+
+        # If the nodes have already been added to the graph, rename
+        # the gnode for the common node.
+        gnodes = [super(Graph, self).pop(key) for key in keys if key in self]
+        if len(gnodes) == 1:
+            gnode = gnodes[0]
+            gnode.name = self.cnodes[n1]
+            self[gnode.name] = gnode
+        elif len(gnodes) > 1:
+            # Merging gnodes with edges is not supported.
+            self.stale = True
+
+    def cnode(self, n):
+        """Return common node for node n, adding n if it is new"""
+
+        if n not in self.cnodes:
+            self.cnodes[n] = (n, )
+            self.changed = True
+        return self.cnodes[n]
 
     def add(self, cpt, n1, n2, size, stretch):
         """Add cpt between nodes n1 and n2 to the graph"""
@@ -136,10 +171,8 @@ class Graph(dict):
             n1, n2 = n2, n1
             size = -size
 
-        if n1 in self.cnodes:
-            n1 = self.cnodes[n1]
-        if n2 in self.cnodes:
-            n2 = self.cnodes[n2]
+        n1 = self.cnode(n1)
+        n2 = self.cnode(n2)
 
         gnode1 = self.add_node(n1)
         gnode2 = self.add_node(n2)
@@ -150,12 +183,17 @@ class Graph(dict):
         
         if n not in self:
             self[n] = Gnode(n)
+            self.new_gnodes.append(self[n])
+            self.changed = True
         return self[n]
 
     def add_edges(self, cpt, gnode1, gnode2, size, stretch):
 
-        gnode1.add_fedge(Gedge(cpt, gnode1, gnode2, size, stretch))
+        edge = Gedge(cpt, gnode1, gnode2, size, stretch)
+        gnode1.add_fedge(edge)
         gnode2.add_redge(Gedge(cpt, gnode2, gnode1, size, stretch))
+        self.new_edges.append(edge)
+        self.changed = True
 
     @property
     def nodes(self):
@@ -169,9 +207,15 @@ class Graph(dict):
     def add_start_nodes(self):
 
         if 'start' in self:
-            return
+            # Only the gnodes added since the last analysis need to be
+            # connected.  The old gnodes may now have redundant edges
+            # to start or end but these do not change the layout.
+            gnodes = [gnode for gnode in self.new_gnodes
+                      if gnode.name not in ('start', 'end')]
+        else:
+            # Note, need a copy of the gnodes since start and end are added.
+            gnodes = list(self.values())
 
-        gnodes = self.values()
         start = self.add_node('start')
         end = self.add_node('end')
 
@@ -195,19 +239,33 @@ class Graph(dict):
                 return True
         return False
 
-    def assign_fixed(self, unknown):
+    def assign_fixed(self, unknown, gnodes=None):
         """ Assign node positions to nodes with fixed edge lengths to
-        nodes with known positions.  Iterate until no more changes.
+        nodes with known positions.  If gnodes is specified, only the
+        neighbours of these newly known gnodes need to be considered.
         This stage is not needed but provides a minor optimisation."""
-        
-        changes = True
-        while changes and unknown != set():
-            for n in unknown:
-                gnode = self[n]
-                changes = self.assign_fixed1(gnode)
-                if changes:
-                    unknown.discard(n)
-                    break
+
+        if gnodes is None:
+            candidates = [self[n] for n in unknown]
+        else:
+            candidates = []
+            for gnode in gnodes:
+                candidates.extend(self._fixed_neighbours(gnode, unknown))
+
+        # When a node is assigned, only its neighbours can now be
+        # assigned so there is no need to check all the unknown nodes
+        # again.
+        while candidates != []:
+            gnode = candidates.pop()
+            if gnode.name not in unknown or not self.assign_fixed1(gnode):
+                continue
+            unknown.discard(gnode.name)
+            candidates.extend(self._fixed_neighbours(gnode, unknown))
+
+    def _fixed_neighbours(self, gnode, unknown):
+
+        return [edge.to_gnode for edge in gnode.fedges + gnode.redges
+                if not edge.stretch and edge.to_gnode.name in unknown]
 
     def assign_stretch1(self, gnode):
 
@@ -287,13 +345,99 @@ class Graph(dict):
                 changes = self.assign_stretch1(gnode)
                 if changes:
                     unknown.discard(n)
-                    self.assign_fixed(unknown)
+                    self.assign_fixed(unknown, (gnode, ))
                     break
 
-    def analyse(self, stage=None):
+    def edge_fits(self, edge):
+        """Return True if the positions of the gnodes of edge satisfy
+        its size."""
+
+        dist = edge.to_gnode.pos - edge.from_gnode.pos
+        if edge.stretch:
+            return dist - edge.size > -1e-6
+        return abs(dist - edge.size) < 1e-6
+
+    def update(self):
+        """Assign positions to the gnodes added since the last analysis.
+        The other gnodes keep their positions so only the nodes of the
+        new components are moved.  None is returned if the new
+        components do not fit, say if they are on a new longest path,
+        and thus the graph needs to be analysed again."""
 
         self.add_start_nodes()
 
+        unknown = set([gnode.name for gnode in self.new_gnodes
+                       if gnode.pos is None])
+        for edge in self.new_edges:
+            if (edge.cpt is not None and edge.from_gnode.name not in unknown
+                and edge.to_gnode.name not in unknown
+                and not self.edge_fits(edge)):
+                return None
+
+        try:
+            self.assign_fixed(unknown)
+            self.assign_stretch(unknown)
+        except ValueError:
+            return None
+
+        if unknown != set():
+            return None
+
+        distance_max = self['end'].pos
+        for gnode in self.new_gnodes:
+            if gnode.pos < -1e-6 or gnode.pos - distance_max > 1e-6:
+                return None
+        for edge in self.new_edges:
+            if edge.cpt is not None and not self.edge_fits(edge):
+                return None
+
+        try:
+            return self.positions(), distance_max
+        except KeyError:
+            return None
+
+    def positions(self):
+        """Return dictionary of node positions keyed by node name."""
+
+        # The gnodes are looked up directly by their common node.
+        gnodes = super(Graph, self).__getitem__
+        try:
+            pos = {}
+            for n, key in self.cnodes.items():
+                pos[n] = gnodes(key).pos
+
+        except KeyError:
+            # TODO determine which components are not connected.
+            raise KeyError("The %s schematic graph is dodgy, probably a "
+                           "component is unattached:\n%s" % (self.name, self))
+        return pos
+
+    def analyse(self, stage=None):
+        """Return dictionary of node positions and the maximum
+        distance.  If the graph has been analysed before, only the
+        positions of the gnodes added since are found, when
+        possible."""
+
+        self.timings = OrderedDict()
+        start_time = time()
+
+        if stage is None and self.result is not None:
+            if self.changed:
+                self.result = self.update()
+                self.new_gnodes = []
+                self.new_edges = []
+                self.changed = False
+                self.timings['update'] = time() - start_time
+            if self.result is not None:
+                return self.result
+            start_time = time()
+
+        self.result = None
+        self.add_start_nodes()
+        self.new_gnodes = []
+        self.new_edges = []
+        self.changed = False
+
         for gnode in self.values():
             gnode.pos = None
 
@@ -309,6 +453,7 @@ class Graph(dict):
 
         # Find longest path through the graph.
         self.longest_path(self['start'])
+        self.timings['longest_path'] = time() - start_time
 
         try:
             # Nodes on the longest path have known positions.
@@ -327,37 +472,70 @@ class Graph(dict):
         if stage == 1:
             return
             
+        start_time = time()
         self.assign_fixed(unknown)
+        self.timings['assign_fixed'] = time() - start_time
 
         if stage == 2:
             return
 
+        start_time = time()
         self.assign_stretch(unknown)
+        self.timings['assign_stretch'] = time() - start_time
 
         if unknown != set():
             raise ValueError('Cannot assign nodes %s for %s graph:\n%s' %
                              (unknown, self.name, self))
             
         self.check_positions()
-  
-        try:
-            pos = {}
-            for n, gnode in self.cnodes.items():
-                pos[n] = self[gnode].pos
 
-        except KeyError:
-            # TODO determine which components are not connected.
-            raise KeyError("The %s schematic graph is dodgy, probably a "
-                           "component is unattached:\n%s" % (self.name, self))
+        self.result = self.positions(), self['end'].pos
+        return self.result
 
-        distance_max = self['end'].pos
+    def _dodgy(self):
+
+        return RuntimeError(
+            ("The %s schematic graph is dodgy, probably a component"
+             " is connected to the wrong node:\n%s") % (self.name, self))
+
+    def topological_sort(self, start, forward=True):
+        """Return list of gnodes reachable from start, where each gnode
+        is before the gnodes that it has edges to.  The graph is
+        traversed iteratively so that long chains of components do
+        not exceed the recursion limit."""
+
+        order = []
+        visited = set([start.name])
+        # Gnodes on the current path; if one of these is reached again
+        # there is a cycle.
+        active = set([start.name])
+        stack = [(start, iter(start.fedges if forward else start.redges))]
+
+        while stack != []:
+            gnode, edges = stack[-1]
+            for edge in edges:
+                next_gnode = edge.to_gnode
+                if next_gnode.name in active:
+                    raise self._dodgy()
+                if next_gnode.name not in visited:
+                    visited.add(next_gnode.name)
+                    active.add(next_gnode.name)
+                    stack.append((next_gnode,
+                                  iter(next_gnode.fedges if forward
+                                       else next_gnode.redges)))
+                    break
+            else:
+                stack.pop()
+                active.discard(gnode.name)
+                order.append(gnode)
 
-        return pos, distance_max
+        order.reverse()
+        return order
 
     def longest_path_to_known(self, start, forward=True):
         """Find longest path through DAG to a node with a known dist."""
 
-        def traverse(gnode):
+        def value(gnode):
 
             if gnode.name in ('start', 'end'):
                 # Choose as last resort
@@ -367,26 +545,52 @@ class Graph(dict):
             if gnode.pos is not None:
                 gnode.next = None
                 return gnode.pos
+            return None
+
+        # The gnodes are evaluated in reverse topological order so
+        # that each gnode is only evaluated once.  The traversal stops
+        # at gnodes with known positions.
+        values = {}
+        # Gnodes waiting for the values of their successors; if one of
+        # these is reached again there is a cycle.
+        active = set()
+        stack = [(start, False)]
+        while stack != []:
+            gnode, expanded = stack.pop()
+            if gnode.name in values:
+                continue
+
+            val = value(gnode)
+            if val is not None:
+                values[gnode.name] = val
+                continue
 
             edges = gnode.fedges if forward else gnode.redges
+            if not expanded:
+                stack.append((gnode, True))
+                active.add(gnode.name)
+                for edge in reversed(edges):
+                    next_gnode = edge.to_gnode
+                    if next_gnode.name in active:
+                        raise self._dodgy()
+                    if next_gnode.name not in values:
+                        stack.append((next_gnode, False))
+                continue
+
+            active.discard(gnode.name)
+
             min_dist = 2000
             for edge in edges:
                 next_gnode = edge.to_gnode
-                # TODO, memoize
-                dist = traverse(next_gnode) - edge.size
+                dist = values[next_gnode.name] - edge.size
                 if dist < min_dist:
                     min_dist = dist
                     next_gnode.prev = edge
                     gnode.next = edge
-            return min_dist
+            values[gnode.name] = min_dist
 
         start.dist = 0
-        try:
-            return traverse(start)
-        except RuntimeError:
-            raise RuntimeError(
-                ("The %s schematic graph is dodgy, probably a component"
-                 " is connected to the wrong node:\n%s") % (self.name, self))
+        return values[start.name]
 
     def longest_path(self, start, forward=True):
         """Find longest path through DAG."""
@@ -396,31 +600,38 @@ class Graph(dict):
             gnode.prev = None
             gnode.next = None
 
-        def traverse(gnode):
-
-            if gnode.pos is not None:
-                return True
-
-            edges = gnode.fedges if forward else gnode.redges
-            for edge in edges:
-                next_gnode = edge.to_gnode
-                dist = gnode.dist + edge.size
-                if dist > next_gnode.dist:
-                    next_gnode.dist = dist
-                    next_gnode.prev = edge
-                    gnode.next = edge
-                    if traverse(next_gnode):
-                        return True
-            return False
+        def edges(gnode):
+            return gnode.fedges if forward else gnode.redges
 
+        # Find the longest distance to each gnode, taking the gnodes
+        # in topological order.
         start.dist = 0
-        try:
-            traverse(start)
-        except RuntimeError:
-            raise RuntimeError(
-                ("The %s schematic graph is dodgy, probably a component"
-                 " is connected to the wrong node:\n%s") % (self.name, self))
-
+        for gnode in self.topological_sort(start, forward):
+            for edge in edges(gnode):
+                dist = gnode.dist + edge.size
+                if dist > edge.to_gnode.dist:
+                    edge.to_gnode.dist = dist
+
+        # There may be multiple longest paths to a gnode.  Choose the
+        # first one found by a depth-first search, following the
+        # edges in order, so that the layout is the same as for the
+        # original recursive algorithm.  Only edges on longest paths
+        # need to be searched and each gnode is visited once.
+        visited = set([start.name])
+        stack = [iter(edges(start))]
+        while stack != []:
+            for edge in stack[-1]:
+                next_gnode = edge.to_gnode
+                if (next_gnode.name in visited or
+                    edge.from_gnode.dist + edge.size != next_gnode.dist):
+                    continue
+                visited.add(next_gnode.name)
+                next_gnode.prev = edge
+                edge.from_gnode.next = edge
+                stack.append(iter(edges(next_gnode)))
+                break
+            else:
+                stack.pop()
 
     def check_positions(self):
 
@@ -449,9 +660,12 @@ class Graph(dict):
             return ('%.2f' % value).rstrip('0').rstrip('.')
 
         if filename is None:
-            filename = tmpfilename('.png')
-            self.dot(filename=filename, stage=stage)
-            display_matplotlib(filename)
+            from lcapy.schematic import display_matplotlib
+
+            with tmpdir() as dirname:
+                filename = path.join(dirname, 'graph.png')
+                self.dot(filename=filename, stage=stage)
+                display_matplotlib(filename)
             return
 
         base, ext = path.splitext(filename)
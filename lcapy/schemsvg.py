@@ -0,0 +1,509 @@
+"""
+This module provides a native SVG renderer for schematics.  This is
+much faster than drawing with Circuitikz and pdflatex, and does not
+need LaTeX, but it only supports the common components.
+
+The SVG class collects drawing primitives using the coordinates of
+the schematic layout (cm, with the y axis pointing up as for TikZ).
+The symbol functions draw the body of a bipole in a frame aligned with
+the component; they return the half-length and half-height of the
+body so that the caller can draw the leads and labels.
+
+Copyright 2017 Michael Hayes, UCECE
+"""
+
+from __future__ import division
+from lcapy.schemmisc import Pos
+import numpy as np
+import re
+
+# Pixels per cm (96 dpi).
+px_per_cm = 96 / 2.54
+
+font_size = 13
+
+_symbols = {'Omega': 'Ω', 'omega': 'ω', 'mu': 'µ',
+            'alpha': 'α', 'beta': 'β', 'gamma': 'γ',
+            'delta': 'δ', 'Delta': 'Δ', 'epsilon': 'ε',
+            'theta': 'θ', 'lambda': 'λ', 'pi': 'π',
+            'phi': 'φ', 'sigma': 'σ', 'tau': 'τ',
+            'infty': '∞', 'cdot': '·', 'times': '×',
+            'pm': '±', 'ldots': '…', 'prime': '′',
+            ',': ' ', ';': ' ', ':': ' ', ' ': ' ', 'quad': ' ',
+            '!': '', 'left': '', 'right': '', '{': '{', '}': '}',
+            '_': '_', '$': '$', '%': '%', '&': '&amp;'}
+
+_fonts = ('mathrm', 'mbox', 'text', 'textrm', 'textit', 'mathit',
+          'mathbf', 'operatorname')
+
+_command_pattern = re.compile(r'\\([a-zA-Z]+|.)')
+
+
+def _escape(s):
+
+    return s.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _group(s, i):
+    """Return the argument of a LaTeX command or script starting at
+    index i of s, a braced group or a single character, and the index
+    after it."""
+
+    while i < len(s) and s[i] == ' ':
+        i += 1
+    if i >= len(s):
+        return '', i
+
+    if s[i] == '{':
+        level = 0
+        for j in range(i, len(s)):
+            if s[j] == '{':
+                level += 1
+            elif s[j] == '}':
+                level -= 1
+                if level == 0:
+                    return s[i + 1:j], j + 1
+        return s[i + 1:], len(s)
+
+    if s[i] == '\\':
+        match = _command_pattern.match(s, i)
+        return match.group(0), match.end()
+
+    return s[i], i + 1
+
+
+def svg_text(s):
+    """Convert a LaTeX label, such as $R_{1}$, to SVG text markup.  Only
+    the common constructs used for component labels are handled."""
+
+    parts = []
+    i = 0
+    while i < len(s):
+        c = s[i]
+        if c == '\\':
+            match = _command_pattern.match(s, i)
+            name = match.group(1)
+            i = match.end()
+            if name in _fonts:
+                arg, i = _group(s, i)
+                parts.append(svg_text(arg))
+            elif name == 'frac':
+                num, i = _group(s, i)
+                den, i = _group(s, i)
+                parts.append('%s/%s' % (_bracket(svg_text(num)),
+                                        _bracket(svg_text(den))))
+            elif name == 'sqrt':
+                arg, i = _group(s, i)
+                parts.append('√%s' % _bracket(svg_text(arg)))
+            elif name in _symbols:
+                parts.append(_symbols[name])
+            else:
+                parts.append(_escape(name))
+        elif c in '_^':
+            arg, i = _group(s, i + 1)
+            parts.append('<tspan baseline-shift="%s" font-size="70%%">%s</tspan>'
+                         % ('sub' if c == '_' else 'super', svg_text(arg)))
+        elif c in '{}$':
+            i += 1
+        elif c == '~':
+            parts.append(' ')
+            i += 1
+        else:
+            parts.append(_escape(c))
+            i += 1
+    return ''.join(parts)
+
+
+def _bracket(s):
+
+    for c in '+-/ ':
+        if c in s:
+            return '(%s)' % s
+    return s
+
+
+def _plain_len(markup):
+    """Approximate number of characters displayed for SVG text markup."""
+
+    return len(re.sub(r'<[^>]*>', '', re.sub(r'&[a-z]+;', 'x', markup)))
+
+
+def _xy(point):
+
+    if isinstance(point, Pos):
+        return point.x, point.y
+    return float(point[0]), float(point[1])
+
+
+class SVG(object):
+    """Collection of drawing primitives for a schematic."""
+
+    def __init__(self, scale=1.0):
+
+        # Note, the scale does not change the font size or line widths.
+        self.scale = scale
+        self.elements = []
+        self.xmin = self.ymin = np.inf
+        self.xmax = self.ymax = -np.inf
+
+    def _extend(self, x, y, dx=0, dy=0):
+
+        self.xmin = min(self.xmin, x - dx)
+        self.xmax = max(self.xmax, x + dx)
+        self.ymin = min(self.ymin, y - dy)
+        self.ymax = max(self.ymax, y + dy)
+
+    def line(self, points, closed=False, fill=None, width=None, style=None):
+        """Draw lines joining the points."""
+
+        points1 = [_xy(point) for point in points]
+        # Remove repeated points.
+        points = points1[0:1]
+        for x, y in points1[1:]:
+            if abs(x - points[-1][0]) > 1e-9 or abs(y - points[-1][1]) > 1e-9:
+                points.append((x, y))
+        if len(points) < 2:
+            return
+
+        for x, y in points:
+            self._extend(x, y)
+        attrs = ''
+        if fill is not None:
+            attrs += ' fill="%s"' % fill
+        if width is not None:
+            attrs += ' stroke-width="%s"' % width
+        if style is not None:
+            attrs += ' ' + style
+        self.elements.append(('polygon' if closed else 'polyline',
+                              points, attrs))
+
+    def circle(self, centre, radius, fill=None):
+
+        x, y = _xy(centre)
+        self._extend(x, y, radius, radius)
+        attrs = '' if fill is None else ' fill="%s"' % fill
+        self.elements.append(('circle', (x, y, radius), attrs))
+
+    def text(self, pos, markup, anchor='center'):
+        """Draw text markup with the specified TikZ anchor at pos."""
+
+        x, y = _xy(pos)
+        if markup == '':
+            return
+
+        # Estimate extent of text for the bounding box.
+        w = _plain_len(markup) * 0.6 * font_size / (px_per_cm * self.scale)
+        h = font_size / (px_per_cm * self.scale)
+        dx = 0 if 'west' in anchor else w if 'east' in anchor else w / 2
+        dy = 0 if 'south' in anchor else h if 'north' in anchor else h / 2
+        self._extend(x + w / 2 - dx, y + h / 2 - dy, w / 2, h / 2)
+        self.elements.append(('text', (x, y, anchor), markup))
+
+    def grid(self, start, stop, step):
+
+        x1, y1 = _xy(start)
+        x2, y2 = _xy(stop)
+        style = 'stroke="#8080ff" stroke-width="0.5"'
+        for x in np.arange(x1, x2 + 1e-6, step):
+            self.line(((x, y1), (x, y2)), style=style)
+        for y in np.arange(y1, y2 + 1e-6, step):
+            self.line(((x1, y), (x2, y)), style=style)
+
+    def svg(self, margin=0.25):
+        """Return SVG document."""
+
+        if self.elements == []:
+            self._extend(0, 0)
+
+        px = px_per_cm * self.scale
+        margin /= self.scale
+        xmin = self.xmin - margin
+        ymax = self.ymax + margin
+        width = (self.xmax + margin - xmin) * px
+        height = (ymax - self.ymin + margin) * px
+
+        def X(x):
+            return (x - xmin) * px
+
+        def Y(y):
+            return (ymax - y) * px
+
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+                 '<svg xmlns="http://www.w3.org/2000/svg" width="%.1f" height="%.1f" viewBox="0 0 %.1f %.1f">' % (width, height, width, height),
+                 '<g fill="none" stroke="black" stroke-width="1" stroke-linecap="round" stroke-linejoin="round" font-family="serif" font-size="%d">' % font_size]
+
+        for kind, args, attrs in self.elements:
+            if kind in ('polyline', 'polygon'):
+                points = ' '.join(['%.2f,%.2f' % (X(x), Y(y)) for x, y in args])
+                lines.append('<%s points="%s"%s/>' % (kind, points, attrs))
+            elif kind == 'circle':
+                x, y, radius = args
+                lines.append('<circle cx="%.2f" cy="%.2f" r="%.2f"%s/>' %
+                             (X(x), Y(y), radius * px, attrs))
+            elif kind == 'text':
+                x, y, anchor = args
+                text_anchor = 'middle'
+                if 'west' in anchor:
+                    text_anchor = 'start'
+                elif 'east' in anchor:
+                    text_anchor = 'end'
+                # Offset the baseline since dominant-baseline is not
+                # widely supported.
+                dy = 0.35 * font_size
+                if 'north' in anchor:
+                    dy = 0.8 * font_size
+                elif 'south' in anchor:
+                    dy = -0.25 * font_size
+                lines.append('<text x="%.2f" y="%.2f" text-anchor="%s" fill="black" stroke="none">%s</text>' %
+                             (X(x), Y(y) + dy, text_anchor, attrs))
+
+        lines.append('</g>')
+        lines.append('</svg>')
+        return '\n'.join(lines) + '\n'
+
+
+def normal_anchor(n):
+    """Return TikZ anchor for text placed in the direction n from a
+    point."""
+
+    anchor = []
+    if n[1] < -0.5:
+        anchor.append('north')
+    elif n[1] > 0.5:
+        anchor.append('south')
+    if n[0] > 0.5:
+        anchor.append('west')
+    elif n[0] < -0.5:
+        anchor.append('east')
+    if anchor == []:
+        return 'center'
+    return ' '.join(anchor)
+
+
+class Frame(object):
+    """Coordinate frame of a bipole drawn from p1 to p2.  The u axis
+    points from p1 to p2 and the v axis is normal to it; the origin is
+    the midpoint."""
+
+    def __init__(self, p1, p2, mirror=False):
+
+        self.p1 = np.array(_xy(p1))
+        self.p2 = np.array(_xy(p2))
+        diff = self.p2 - self.p1
+        self.length = np.hypot(diff[0], diff[1])
+        if self.length == 0:
+            self.d = np.array((1.0, 0.0))
+        else:
+            self.d = diff / self.length
+        self.n = np.array((-self.d[1], self.d[0]))
+        if mirror:
+            self.n = -self.n
+        self.mid = (self.p1 + self.p2) / 2
+
+    @property
+    def label_normal(self):
+        """Normal pointing to the side for the component label; this is
+        below horizontal components and to the right of vertical
+        ones."""
+
+        n = np.array((self.d[1], -self.d[0]))
+        if n[0] < -1e-6 or n[1] > 1e-6:
+            n = -n
+        return n
+
+    def __call__(self, u, v=0):
+
+        return self.mid + u * self.d + v * self.n
+
+    def points(self, uvs):
+
+        return [self(u, v) for u, v in uvs]
+
+
+def arrowhead(svg, tip, d, size=0.12, fill='black'):
+    """Draw an arrowhead with its tip at tip pointing in direction d."""
+
+    tip = np.array(_xy(tip))
+    d = np.array(d)
+    n = np.array((-d[1], d[0]))
+    base = tip - d * size
+    svg.line((base + n * size * 0.4, tip, base - n * size * 0.4),
+             closed=True, fill=fill)
+
+
+def resistor(svg, f, L):
+
+    hl, hh = 0.3 * L, 0.08 * L
+    uvs = [(-hl, 0)]
+    for m in range(6):
+        uvs.append((-hl + (m + 0.5) * hl / 3, hh if m % 2 == 0 else -hh))
+    uvs.append((hl, 0))
+    svg.line(f.points(uvs))
+    return hl, hh
+
+
+def impedance(svg, f, L):
+
+    hl, hh = 0.3 * L, 0.1 * L
+    svg.line(f.points(((-hl, -hh), (-hl, hh), (hl, hh), (hl, -hh))),
+             closed=True)
+    return hl, hh
+
+
+def capacitor(svg, f, L):
+
+    hl, hh = 0.06 * L, 0.2 * L
+    svg.line(f.points(((-hl, -hh), (-hl, hh))))
+    svg.line(f.points(((hl, -hh), (hl, hh))))
+    return hl, hh
+
+
+def inductor(svg, f, L):
+
+    hl, hh = 0.3 * L, 0.08 * L
+    r = hl / 4
+    uvs = []
+    for m in range(4):
+        centre = -hl + r * (2 * m + 1)
+        for theta in np.linspace(np.pi, 0, 9):
+            uvs.append((centre + r * np.cos(theta), r * np.sin(theta)))
+    svg.line(f.points(uvs))
+    return hl, hh
+
+
+def diode(svg, f, L):
+
+    hl, hh = 0.1 * L, 0.12 * L
+    svg.line(f.points(((-hl, -hh), (-hl, hh), (hl, 0))), closed=True,
+             fill='black')
+    svg.line(f.points(((hl, -hh), (hl, hh))))
+    return hl, hh
+
+
+def _circle_source(svg, f, L):
+
+    r = 0.2 * L
+    svg.circle(f(0), r)
+    return r, r
+
+
+def _diamond_source(svg, f, L):
+
+    r = 0.2 * L
+    svg.line(f.points(((-r, 0), (0, r), (r, 0), (0, -r))), closed=True)
+    return r, r
+
+
+def _signs(svg, f, r):
+
+    # The positive node is the first node.
+    svg.text(f(-r * 0.5), '+')
+    svg.text(f(r * 0.5), '−')
+
+
+def _arrow(svg, f, r):
+
+    # The current flows into the first node.
+    svg.line((f(r * 0.6), f(-r * 0.3)))
+    arrowhead(svg, f(-r * 0.6), -f.d, r * 0.3)
+
+
+def vsource(svg, f, L):
+
+    r, hh = _circle_source(svg, f, L)
+    _signs(svg, f, r)
+    return r, hh
+
+
+def isource(svg, f, L):
+
+    r, hh = _circle_source(svg, f, L)
+    _arrow(svg, f, r)
+    return r, hh
+
+
+def cvsource(svg, f, L):
+
+    r, hh = _diamond_source(svg, f, L)
+    _signs(svg, f, r)
+    return r, hh
+
+
+def csource(svg, f, L):
+
+    r, hh = _diamond_source(svg, f, L)
+    _arrow(svg, f, r)
+    return r, hh
+
+
+def _meter(svg, f, L, letter):
+
+    r, hh = _circle_source(svg, f, L)
+    svg.text(f(0), letter)
+    return r, hh
+
+
+def ammeter(svg, f, L):
+
+    return _meter(svg, f, L, 'A')
+
+
+def voltmeter(svg, f, L):
+
+    return _meter(svg, f, L, 'V')
+
+
+def switch(svg, f, L):
+
+    hl, hh = 0.2 * L, 0.15 * L
+    r = 0.03 * L
+    svg.circle(f(-hl + r), r)
+    svg.circle(f(hl - r), r)
+    svg.line((f(-hl + 2 * r), f(hl - r, hh)))
+    return hl, hh
+
+
+def battery(svg, f, L):
+
+    hl, hh = 0.1 * L, 0.2 * L
+    for m, u in enumerate((-hl, -hl / 3, hl / 3, hl)):
+        h = hh if m % 2 == 0 else hh / 2
+        svg.line((f(u, -h), f(u, h)))
+    return hl, hh
+
+
+def variable(svg, f, hl, hh):
+    """Draw arrow through a bipole to show that it is variable."""
+
+    tail = f(-hl * 0.8, -hh * 1.8)
+    tip = f(hl * 0.8, hh * 1.8)
+    svg.line((tail, tip))
+    d = tip - tail
+    arrowhead(svg, tip, d / np.hypot(d[0], d[1]), 0.1)
+
+
+# Bipole symbols keyed by component type; None for components, such as
+# open-circuits, that are not drawn.
+bipoles = {'R': resistor, 'NR': resistor, 'Z': impedance, 'Y': impedance,
+           'C': capacitor, 'L': inductor, 'D': diode,
+           'V': vsource, 'sV': vsource, 'I': isource, 'sI': isource,
+           'E': cvsource, 'H': cvsource, 'F': csource, 'G': csource,
+           'AM': ammeter, 'VM': voltmeter, 'SW': switch, 'BAT': battery,
+           'O': None, 'P': None}
+
+
+def ground(svg, p, d, kind='sground'):
+    """Draw ground symbol of the specified kind at p, where d is the
+    direction of the wire into the ground."""
+
+    f = Frame(p, np.array(_xy(p)) + np.array(d))
+    f.mid = f.p1
+    w = 0.15
+    if kind == 'ground':
+        for m in range(3):
+            svg.line((f(m * 0.06, w * (1 - m / 3.0)),
+                      f(m * 0.06, -w * (1 - m / 3.0))))
+    elif kind == 'rground':
+        svg.line((f(0, w), f(0, -w)), width=2)
+    else:
+        svg.line((f(0, w), f(0, -w), f(w, 0)), closed=True)
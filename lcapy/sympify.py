@@ -74,9 +74,33 @@ def symbols_find(arg):
         return []
     return [symbol.name for symbol in arg.atoms(Symbol)]
 
+def auto_float(digits):
+    """Return transformation that converts numbers with a decimal point or
+    exponent to sympy Floats with the specified number of significant
+    digits."""
+
+    def transform(tokens, local_dict, global_dict):
+
+        result = []
+        for tokNum, tokVal in tokens:
+            number = tokVal.lower()
+            if (tokNum == NUMBER and not number.startswith('0x') and
+                not number.endswith('j') and
+                ('.' in number or 'e' in number)):
+                result.extend([(NAME, 'Float'), (OP, '('),
+                               (STRING, repr(tokVal)), (OP, ','),
+                               (NUMBER, '%d' % digits), (OP, ')')])
+            else:
+                result.append((tokNum, tokVal))
+        return result
+
+    return transform
+
+
 def parse(string, symbols={}, evaluate=True, local_dict={}, **assumptions):
 
     cache = assumptions.pop('cache', True)
+    digits = assumptions.pop('digits', None)
 
     def auto_symbol(tokens, local_dict, global_dict):
         """Inserts calls to ``Symbol`` for undefined variables."""
@@ -127,8 +151,12 @@ def parse(string, symbols={}, evaluate=True, local_dict={}, **assumptions):
         return result
 
 
-    s = parse_expr(string, transformations=(auto_symbol, auto_number,
-                                            rationalize), 
+    if digits is None:
+        transformations = (auto_symbol, auto_number, rationalize)
+    else:
+        transformations = (auto_symbol, auto_float(digits), auto_number)
+
+    s = parse_expr(string, transformations=transformations,
                    global_dict=global_dict, local_dict=local_dict,
                    evaluate=evaluate)
     if not cache:
@@ -153,7 +181,12 @@ def parse(string, symbols={}, evaluate=True, local_dict={}, **assumptions):
 
 
 def sympify1(arg, symbols={}, evaluate=True, **assumptions):
-    """Create a sympy expression."""
+    """Create a sympy expression.  Floats are converted to rationals
+    unless the digits keyword argument is specified; they are then
+    converted to sympy Floats with this number of significant
+    digits."""
+
+    digits = assumptions.pop('digits', None)
 
     if hasattr(arg, 'expr'):
         return arg.expr
@@ -161,10 +194,17 @@ def sympify1(arg, symbols={}, evaluate=True, **assumptions):
     if isinstance(arg, (Symbol, Expr)):
         return arg
 
+    def convert(value):
+        if digits is not None:
+            return sym.Float(value, digits)
+        # Note, need to convert to string to achieve a rational
+        # representation.
+        return sym.sympify(str(value), rational=True, evaluate=evaluate)
+
     # Why doesn't sympy do this?
     if isinstance(arg, complex):
-        re = sym.sympify(str(arg.real), rational=True, evaluate=evaluate)
-        im = sym.sympify(str(arg.imag), rational=True, evaluate=evaluate)
+        re = convert(arg.real)
+        im = convert(arg.imag)
         if im == 1.0:
             arg = re + sym.I
         else:
@@ -172,13 +212,16 @@ def sympify1(arg, symbols={}, evaluate=True, **assumptions):
         return arg
 
     if isinstance(arg, float):
-        # Note, need to convert to string to achieve a rational
-        # representation.
-        return sym.sympify(str(arg), rational=True, evaluate=evaluate)
-        
+        return convert(arg)
+
     if isinstance(arg, str):
         return parse(arg, symbols, evaluate=evaluate,
-                     local_dict=symbols, **assumptions)
+                     local_dict=symbols, digits=digits, **assumptions)
+
+    if digits is not None:
+        expr = sym.sympify(arg, locals=symbols, evaluate=evaluate)
+        return expr.xreplace(dict([(x, sym.Float(x, digits)) for x in
+                                   expr.atoms(sym.Float)]))
 
     return sym.sympify(arg, rational=True, locals=symbols, 
                        evaluate=evaluate)
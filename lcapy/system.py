@@ -1,10 +1,38 @@
-from os import system, path, remove, mkdir, chdir, getcwd
+from os import path, remove
+from subprocess import Popen, PIPE, STDOUT
+from threading import BoundedSemaphore, Timer
+from contextlib import contextmanager
 import re
 from sys import platform
 
 # System dependent functions
 
+# Maximum time (s) that an external program, such as pdflatex, can run.
+default_timeout = 60
+
+# Limit the number of external programs running at once, say when
+# schematics are drawn from many threads.
+_jobs = None
+
+
+def set_max_jobs(jobs=None):
+    """Set the maximum number of external programs, such as pdflatex,
+    that can run concurrently.  The default is the number of CPUs."""
+
+    global _jobs
+
+    if jobs is None:
+        from multiprocessing import cpu_count
+        jobs = cpu_count()
+    _jobs = BoundedSemaphore(jobs)
+
+
+set_max_jobs()
+
+
 def tmpfilename(suffix=''):
+    """Return name of a new temporary file; this is not deleted and so
+    must be removed by the caller.  Consider using tmpdir instead."""
 
     from tempfile import gettempdir, NamedTemporaryFile
     
@@ -16,28 +44,99 @@ def tmpfilename(suffix=''):
     return filename
 
 
+@contextmanager
+def tmpdir(keep=False):
+    """Context manager returning name of a new temporary directory.  This
+    is removed, along with its contents, on exit unless keep is True."""
+
+    from tempfile import mkdtemp
+    from shutil import rmtree
+
+    dirname = mkdtemp(prefix='lcapy')
+    try:
+        yield dirname
+    finally:
+        if not keep:
+            rmtree(dirname, ignore_errors=True)
+
+
+def _communicate(proc, timeout):
+    """Return the output of the process proc or None if it runs for more
+    than timeout seconds, in which case it is killed."""
+
+    try:
+        from subprocess import TimeoutExpired
+    except ImportError:
+        # Python 2 does not support a timeout for communicate so kill
+        # the process from a timer thread.
+        expired = []
+
+        def kill():
+            expired.append(True)
+            proc.kill()
+
+        timer = Timer(timeout, kill)
+        timer.start()
+        try:
+            output, _ = proc.communicate()
+        finally:
+            timer.cancel()
+        if expired:
+            return None
+        return output
+
+    try:
+        output, _ = proc.communicate(timeout=timeout)
+    except TimeoutExpired:
+        proc.kill()
+        proc.communicate()
+        return None
+    return output
+
+
+def run(args, cwd=None, timeout=None):
+    """Run program with argument list args in the directory cwd.  This
+    returns the exit status and the output of the program.  A
+    RuntimeError is raised if the program is not installed or if it
+    runs for more than timeout seconds."""
+
+    if timeout is None:
+        timeout = default_timeout
+
+    with _jobs:
+        try:
+            proc = Popen(args, cwd=cwd, stdin=PIPE, stdout=PIPE,
+                         stderr=STDOUT)
+        except OSError:
+            raise RuntimeError('Cannot run %s.  Is it installed?' % args[0])
+        output = _communicate(proc, timeout)
+        if output is None:
+            raise RuntimeError('%s timed out after %s s' % (args[0], timeout))
+
+    return proc.returncode, output.decode('utf-8', 'replace')
+
+
 def convert_pdf_svg(pdf_filename, svg_filename):
 
-    system('pdf2svg %s %s' % (pdf_filename, svg_filename))
+    status, output = run(['pdf2svg', pdf_filename, svg_filename])
     if not path.exists(svg_filename):
-        raise RuntimeError('Could not generate %s with pdf2svg.  Is it installed?' % 
-                           svg_filename)
+        raise RuntimeError('Could not generate %s with pdf2svg.  Is it installed?\n%s' % 
+                           (svg_filename, output))
 
 
 def convert_pdf_png(pdf_filename, png_filename, oversample=1):
 
+    args = ['convert', '-density', '%d' % (oversample * 100),
+            pdf_filename, png_filename]
     if 'win' in platform:
         # Windows has a program called convert, try magick convert
         # for image magick convert.
-        system('magick convert -density %d %s %s' %
-               (oversample * 100, pdf_filename, png_filename))
-    else:
-        system('convert -density %d %s %s' %
-               (oversample * 100, pdf_filename, png_filename))
-        
+        args = ['magick'] + args
+
+    status, output = run(args)
     if not path.exists(png_filename):
-        raise RuntimeError('Could not generate %s with convert' % 
-                           png_filename)
+        raise RuntimeError('Could not generate %s with convert\n%s' % 
+                           (png_filename, output))
 
 
 def latex_cleanup(tex_filename, wanted_filename=''):
@@ -54,48 +153,106 @@ def latex_cleanup(tex_filename, wanted_filename=''):
             remove(filename)
 
 
-def run_latex(tex_filename):
+def latex_errors(tex_filename):
+    """Return the error messages from the log file produced by pdflatex
+    for tex_filename."""
 
     root, ext = path.splitext(tex_filename)
-    dirname = path.dirname(tex_filename)
-    baseroot = path.basename(root)
-    cwd = getcwd()
-    if dirname != '':
-        chdir(path.abspath(dirname))
-        
-    system('pdflatex -interaction batchmode %s.tex' % baseroot)
-    
-    if dirname != '':
-        chdir(cwd)            
+    try:
+        lines = open(root + '.log', 'r').readlines()
+    except (IOError, OSError):
+        return ''
+
+    errors = []
+    for m, line in enumerate(lines):
+        if line.startswith('!'):
+            errors.extend(lines[m:m + 2])
+    return ''.join(errors)
+
 
+def run_latex(tex_filename, timeout=None):
+    """Run pdflatex in the directory of tex_filename and return the name
+    of the generated pdf file.  Note, this file does not exist if
+    pdflatex fails; the errors can be found with latex_errors."""
+
+    root, ext = path.splitext(path.abspath(tex_filename))
+    run(['pdflatex', '-interaction', 'batchmode', path.basename(root) + '.tex'],
+        cwd=path.dirname(root), timeout=timeout)
     return root + '.pdf'
 
 
 def run_dot(dotfilename, filename):
 
     base, ext = path.splitext(filename)
-    system('dot -T %s -o %s %s' % (ext[1:], filename, dotfilename))
-    remove(dotfilename)            
-    return
+    status, output = run(['dot', '-T', ext[1:], '-o', filename, dotfilename])
+    remove(dotfilename)
+    if not path.exists(filename):
+        raise RuntimeError('Could not generate %s with dot\n%s' % 
+                           (filename, output))
 
 
-def circuitikz_version():
+def _circuitikz_sty():
+    """Return identifier for the installed circuitikz package, its path and
+    modification time, or None if it cannot be found."""
+
+    try:
+        status, sty = run(['kpsewhich', 'circuitikz.sty'])
+    except RuntimeError:
+        return None
+    sty = sty.strip()
+    if sty == '' or not path.exists(sty):
+        return None
+    return '%s %d' % (sty, path.getmtime(sty))
+
+
+def _circuitikz_version():
 
     content = ('\\documentclass[a4paper]{standalone}\n'
                '\\usepackage{circuitikz}\n'
                '\\begin{document}\n'
                '\\end{document}\n')
 
-    tex_filename = tmpfilename('.tex')
-    open(tex_filename, 'w').write(content)
+    with tmpdir() as dirname:
+        tex_filename = path.join(dirname, 'version.tex')
+        open(tex_filename, 'w').write(content)
 
-    log_filename = tex_filename.replace('.tex', '.log')
-    run_latex(tex_filename)
-    
-    log = open(log_filename, 'r').read()
-    latex_cleanup(tex_filename)    
+        try:
+            run_latex(tex_filename)
+            log = open(path.join(dirname, 'version.log'), 'r').read()
+        except (RuntimeError, IOError, OSError):
+            return None
 
     match = re.search(r'circuitikz ([0-9/]+)', log)
     if match is None:
         return None
     return match.group(1)
+
+
+_circuitikz_versions = {}
+
+
+def circuitikz_version():
+    """Return version (date) of the installed circuitikz package or None if
+    it is not installed.  Finding this requires running pdflatex so
+    the version is only found once per process; it is also stored in
+    the render cache keyed by the location and modification time of
+    circuitikz.sty so that it is only found again after circuitikz is
+    updated."""
+
+    from lcapy.rendercache import cache_load, cache_save
+
+    if 'version' in _circuitikz_versions:
+        return _circuitikz_versions['version']
+
+    sty = _circuitikz_sty()
+    versions = cache_load('circuitikz_version')
+    if sty is not None and sty in versions:
+        version = versions[sty]
+    else:
+        version = _circuitikz_version()
+        if sty is not None and version is not None:
+            versions[sty] = version
+            cache_save('circuitikz_version', versions)
+
+    _circuitikz_versions['version'] = version
+    return version
@@ -352,3 +352,493 @@ class LcapyTester(unittest.TestCase):
 
         self.assertEqual(a.sub['s'].is_causal, True, "Causal incorrect")
         self.assertEqual2(a.L1.v, 2 * exp(-t) * u(t), "L current incorrect")
+
+    def test_twoport(self):
+        """Lcapy: check twoport extraction"""
+
+        a = Circuit()
+        a.add('V1 4 1 s 5')
+        a.add('R1 4 2 2')
+        a.add('C2 2 0 4')
+        a.add('R3 2 3 3')
+        a.add('I1 3 0 s 2')
+
+        A = a.Amatrix(1, 0, 3, 0)
+        self.assertEqual(A.A11, 8 * s + 1, "Incorrect A11")
+        self.assertEqual(A.A12, 24 * s + 5, "Incorrect A12")
+        self.assertEqual(A.A21, 4 * s, "Incorrect A21")
+        self.assertEqual(A.A22, 12 * s + 1, "Incorrect A22")
+
+        b = a.twoport(1, 0, 3, 0)
+        self.assertEqual2(b.V2b, Vs(6 + 1 / (2 * s)), "Incorrect V2b")
+        self.assertEqual(b.I2b, 2, "Incorrect I2b")
+
+        a.add('R0 1 0 7')
+        a.add('L1 3 0 2')
+        b = a.twoport(1, 0, 3, 0)
+        self.assertEqual2(b.V2b, Vs(a.Voc(3, 0).laplace()), "Incorrect V2b")
+
+    def test_port_matrix(self):
+        """Lcapy: check port impedance and admittance matrices"""
+
+        a = Circuit()
+        a.add('V1 1 0 5')
+        a.add('R1 1 2 2')
+        a.add('R2 2 0 4')
+        a.add('R3 2 3 3')
+
+        Z = a.port_matrix([(2, 0), (3, 0)], 'Z')
+        self.assertEqual(Z[0, 0], Zs(sym.Rational(4, 3)), "Incorrect Z11")
+        self.assertEqual(Z[0, 1], Zs(sym.Rational(4, 3)), "Incorrect Z12")
+        self.assertEqual(Z[1, 1], Zs(sym.Rational(13, 3)), "Incorrect Z22")
+        self.assertEqual(a.impedance(3, 0), Z[1, 1], "Incorrect impedance")
+
+        Y = a.port_matrix([(2, 0), (3, 0)], 'Y')
+        self.assertEqual(Y[1, 1], sym.Rational(1, 3), "Incorrect Y22")
+        self.assertEqual(Y[0, 1], -sym.Rational(1, 3), "Incorrect Y12")
+
+        self.assertRaises(ValueError, a.port_matrix, [(2, 0), (9, 0)])
+        self.assertRaises(ValueError, a.impedance, 9, 0)
+
+        # This network is floating; only the port voltage sources
+        # connect it to ground.
+        b = Circuit()
+        b.add('R1 1 2 3')
+        Y = b.port_matrix([(1, 0), (2, 0)], 'Y')
+        self.assertEqual(Y[0, 0], sym.Rational(1, 3), "Incorrect Y11")
+
+    def test_reduce(self):
+        """Lcapy: check Kron reduction"""
+
+        a = Circuit()
+        a.add('V1 1 0 s {5 / s}')
+        a.add('R1 1 2 2')
+        a.add('R2 2 0 4')
+        a.add('C1 2 3 3')
+        a.add('R3 3 4 3')
+        a.add('L1 4 0 1')
+
+        b = a.reduce([2, 3])
+        self.assertEqual(len(b.elements), 4, "Incorrect number of elements")
+        self.assertEqual2(b.Voc(3, 0).s, a.Voc(3, 0).s, "Incorrect Voc")
+        self.assertEqual2(b.impedance(2, 0), a.impedance(2, 0),
+                          "Incorrect impedance")
+
+        a = Circuit()
+        a.add('V1 1 0 dc 6')
+        a.add('V2 1 2 ac 3')
+        a.add('R1 2 3 2')
+        a.add('R2 3 0 4')
+        a.add('R3 3 4 3')
+        a.add('R4 4 0 1')
+
+        b = a.reduce([3])
+        self.assertEqual(b.Voc(3, 0).dc, a.Voc(3, 0).dc, "Incorrect dc Voc")
+        self.assertEqual(b.Voc(3, 0).ac, a.Voc(3, 0).ac, "Incorrect ac Voc")
+
+    def test_ordering(self):
+        """Lcapy: check fill-reducing ordering"""
+
+        a = Circuit()
+        a.add('V1 1 0 s 1')
+        for m in range(1, 5):
+            a.add('R%d %d %d 1' % (m, m, m + 1))
+            a.add('C%d %d 0 1' % (m, m + 1))
+
+        sub = a.sub['s']
+        report = sub.fill_report()
+        self.assertEqual(sorted(sub.ordering), list(range(sub._A.rows)),
+                         "Ordering not a permutation")
+        self.assertTrue(report['ordered'] <= report['natural'],
+                        "Ordering increases fill")
+        # Compare with the solution for the natural ordering.
+        X = sub._A.LUsolve(sub._Z)
+        V5 = X[sub._node_index('5')].subs(s.expr, 1)
+        self.assertEqual(a.Voc(5, 0).s.expr.subs(s.expr, 1), V5,
+                         "Incorrect voltage")
+
+    def test_blocks(self):
+        """Lcapy: check block triangular solution"""
+
+        a = Circuit()
+        a.add('V1 1 0 s 1')
+        a.add('R1 1 2 1')
+        a.add('C1 2 0 1')
+        a.add('E1 3 0 2 0 4')
+        a.add('R2 3 4 2')
+        a.add('C2 4 0 1')
+
+        sub = a.sub['s']
+        self.assertTrue(len(sub.blocks) > 1, "Stages not decoupled")
+        cols = sorted(sum([cols for rows, cols in sub.blocks], []))
+        self.assertEqual(cols, list(range(sub._A.rows)),
+                         "Blocks not a partition")
+        self.assertEqual2(a.Voc(2, 0).s, 1 / (s + 1),
+                          "Incorrect voltage")
+        self.assertEqual2(a.Voc(4, 0).s, 4 / ((s + 1) * (2 * s + 1)),
+                          "Incorrect voltage")
+
+        # Check more unknowns than the recursion limit.  The last row
+        # needs an augmenting path through all the other rows.
+        from lcapy.mna import _maximum_matching, _strong_components
+        import sys
+
+        N = sys.getrecursionlimit() + 1000
+        structure = [[n, n + 1] for n in range(N - 1)] + [[0]]
+        col_match = _maximum_matching(structure, N)
+        self.assertEqual(col_match, [N - 1] + list(range(N - 1)),
+                         "Incorrect matching")
+        # Tridiagonal structure
+        graph = [[m for m in (n - 1, n + 1) if 0 <= m < N]
+                 for n in range(N)]
+        self.assertEqual(len(_strong_components(graph)), 1,
+                         "Incorrect components")
+
+    def test_structure(self):
+        """Lcapy: check structural singularity detection"""
+
+        def problems(*lines, **kwargs):
+            a = Circuit()
+            for line in lines:
+                a.add(line)
+            return ' '.join(a.sub[kwargs.get('kind', 's')]._structural_problems())
+
+        self.assertEqual(problems('V1 1 0 s 1', 'R1 1 2 1', 'R2 2 0 1'), '',
+                         "Spurious problem")
+        self.assertTrue('V1, V2' in problems('V1 1 0 s 1', 'W 1 2',
+                                             'V2 2 0 s 1'),
+                        "Voltage source loop not found")
+        self.assertTrue('3, 4 are floating' in
+                        problems('V1 1 0 s 1', 'R1 1 2 1', 'R2 2 0 1',
+                                 'R3 3 4 1'),
+                        "Floating nodes not found")
+        self.assertTrue('I1, I2' in
+                        problems('I1 1 0 s 1', 'R1 1 2 1', 'I2 2 0 s 1',
+                                 'R2 3 0 1'),
+                        "Current source cutset not found")
+        self.assertTrue('no DC path' in
+                        problems('V1 1 0 dc 1', 'R1 1 2 1', 'C1 2 3 1',
+                                 'R2 3 4 1', kind='dc'),
+                        "Missing DC path not found")
+
+        # A long chain of nodes should not exceed the recursion limit.
+        from lcapy.mna import _DisjointSets
+        import sys
+
+        N = sys.getrecursionlimit() + 1000
+        sets = _DisjointSets()
+        for m in range(N):
+            sets.union(m, m + 1)
+        self.assertEqual(sets.find(0), sets.find(N), "Chain not joined")
+        self.assertFalse(sets.union(N, 0), "Chain joined twice")
+
+        a = Circuit()
+        a.add('V1 1 0 s 1')
+        a.add('L1 1 0 1')
+        a.add('V2 1 0 s 2')
+        self.assertRaises(ValueError, a.Voc, 1, 0)
+
+    def test_solution(self):
+        """Lcapy: check shared denominator solution"""
+
+        a = Circuit()
+        a.add('V1 1 0 s 1')
+        a.add('R1 1 2 1')
+        a.add('C1 2 0 1')
+        a.add('R2 2 3 1')
+        a.add('C2 3 0 1')
+
+        solution = a.sub['s'].solution
+        D = solution.denominator
+        V3 = a.Voc(3, 0).s.expr
+        self.assertEqual(sym.simplify(solution.voltages['3'] / D - V3), 0,
+                         "Incorrect numerator")
+        H = a.transfer(2, 0, 3, 0).expr
+        self.assertEqual(sym.simplify(solution.ratio('2', '0', '3', '0') - H),
+                         0, "Incorrect ratio")
+        poles = solution.poles(s.expr)
+        self.assertEqual(sum(poles.values()), 2, "Incorrect number of poles")
+        self.assertEqual(sym.simplify(sum(poles.keys()) + 3), 0,
+                         "Incorrect poles")
+
+    def test_simplify_level(self):
+        """Lcapy: check simplify levels"""
+
+        a = Circuit()
+        a.add('V1 1 0 s 1')
+        a.add('R1 1 2 1')
+        a.add('C1 2 0 1')
+
+        self.assertEqual(a.simplify_level, 'canonical', "Incorrect default")
+        V2 = a.Voc(2, 0).s
+        for level in ('none', 'cancel', 'together', 'full'):
+            a.simplify_level = level
+            self.assertEqual(a.sub['s'].simplify_level, level,
+                             "Level not shared")
+            self.assertEqual2(a.Voc(2, 0).s, V2,
+                              "Incorrect voltage for level %s" % level)
+        self.assertRaises(ValueError, setattr, a, 'simplify_level', 'some')
+
+    def test_threads(self):
+        """Lcapy: check circuits solved concurrently in threads"""
+
+        from threading import Thread
+        from lcapy.core import current_context, global_context
+
+        def solve(m, results):
+            a = Circuit()
+            a.numeric = m % 2 == 1
+            a.add('V1 1 0 s 1')
+            a.add('R1 1 2 %d' % (m + 1))
+            a.add('C1 2 0 2')
+            results[m] = a.C1.V.s.expr
+
+        results = {}
+        threads = [Thread(target=solve, args=(m, results)) for m in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for m in range(4):
+            expected = 1 / (2 * (m + 1) * s.expr + 1)
+            for f in (0.1, 1, 10):
+                Ve = complex(expected.subs(s.expr, 2j * sym.pi * f))
+                V = complex(results[m].subs(s.expr, 2j * sym.pi * f))
+                self.assertTrue(abs(V - Ve) < 1e-10 * abs(Ve),
+                                "Incorrect result for thread %d" % m)
+        self.assertTrue(current_context() is global_context,
+                        "Context not restored")
+
+        a = Circuit()
+        seen = []
+        with a.context.activate():
+            thread = Thread(target=lambda: seen.append(current_context()))
+            thread.start()
+            thread.join()
+            self.assertTrue(current_context() is a.context,
+                            "Context not activated")
+        self.assertTrue(seen[0] is global_context,
+                        "Context shared between threads")
+
+    def test_pickle(self):
+        """Lcapy: check pickling"""
+
+        import pickle
+
+        a = Circuit()
+        a.add('V1 1 0 {u(t) + 3}; down')
+        a.add('R1 1 2 3; right')
+        a.add('C1 2 0_2 C1; down')
+        a.add('W 0 0_2; right')
+        a.simplify_level = 'full'
+        V = a.C1.V
+        Z = (a.R1.Z + 1 / s).as_polyratfun()
+
+        b = pickle.loads(pickle.dumps(a))
+        self.assertEqual(b.netlist(), a.netlist(), "Incorrect netlist")
+        self.assertEqual(b.simplify_level, 'full', "Incorrect simplify level")
+        self.assertEqual(b.C1.V, V, "Incorrect result")
+
+        C1 = pickle.loads(pickle.dumps(a.C1))
+        self.assertEqual(C1.cct.netlist(), a.netlist(), "Incorrect cpt netlist")
+        self.assertEqual(C1.V, V, "Incorrect cpt result")
+
+        self.assertEqual(pickle.loads(pickle.dumps(V)), V, "Incorrect super")
+        vt = pickle.loads(pickle.dumps(a.C1.v))
+        self.assertEqual(vt, a.C1.v, "Incorrect time domain result")
+        self.assertEqual(pickle.loads(pickle.dumps(Z)), Z,
+                         "Incorrect polynomial expression")
+
+        # Check unpickling in a new process, say a process pool worker.
+        from subprocess import Popen, PIPE
+        import sys
+
+        code = ('import pickle, sys\n'
+                'stdin = getattr(sys.stdin, "buffer", sys.stdin)\n'
+                'a, C1, V = pickle.loads(stdin.read())\n'
+                'print(a.C1.V == V, C1.V == V)\n')
+        proc = Popen([sys.executable, '-c', code], stdin=PIPE, stdout=PIPE)
+        output = proc.communicate(pickle.dumps((a, a.C1, V)))[0]
+        self.assertEqual(output.split(), [b'True', b'True'],
+                         "Cannot unpickle in new process")
+
+        data = pickle.dumps(Vt('x1 * t'))
+        with a.context.activate():
+            pickle.loads(data)
+        self.assertFalse('x1' in a.context.symbols,
+                         "Symbol added to netlist context")
+
+    def test_numeric(self):
+        """Lcapy: check numeric mode"""
+
+        a = Circuit()
+        a.add('V1 1 0 s 1')
+        for m in range(1, 4):
+            a.add('R%d %d %d 1.5e3' % (m, m, m + 1))
+            a.add('C%d %d 0 2.2e-9' % (m, m + 1))
+        V4 = a.Voc(4, 0).s.expr
+
+        a.numeric = True
+        self.assertEqual(a.numeric, 15, "Incorrect digits")
+        self.assertTrue(a.R1.cpt.R.expr.atoms(sym.Float) != set(),
+                        "Value not float")
+        V4n = a.Voc(4, 0).s.expr
+        D = sym.fraction(V4n)[1]
+        self.assertEqual(sym.Poly(D, s.expr).degree(), 3,
+                         "Common factors not cancelled")
+        for f in (1e3, 1e5, 1e7):
+            Ve = complex(V4.subs(s.expr, 2j * sym.pi * f))
+            Vn = complex(V4n.subs(s.expr, 2j * sym.pi * f))
+            self.assertTrue(abs(Vn - Ve) < 1e-10 * abs(Ve),
+                            "Incorrect voltage at %s Hz" % f)
+
+        a.numeric = False
+        self.assertEqual(sym.simplify(a.Voc(4, 0).s.expr - V4), 0,
+                         "Incorrect exact voltage")
+
+    def test_include_macromodel(self):
+        """Lcapy: check included subcircuit macromodels"""
+
+        import os
+        import tempfile
+
+        fd, filename = tempfile.mkstemp(suffix='.net')
+        with os.fdopen(fd, 'w') as f:
+            f.write('R1 1 2 3\nC1 2 0 4\nR2 2 3 5\nR3 2 0 7\n'
+                    'P1 1 0\nP2 3 0\n')
+
+        try:
+            Vocs = []
+            for option in ('', ' macromodel'):
+                a = Circuit()
+                for name in ('a', 'b'):
+                    a.add('.include %s as %s%s' % (filename, name, option))
+                    a.add('W %s.0 0' % name)
+                a.add('V1 a.1 0 s 1')
+                a.add('W a.3 b.1')
+                Vocs.append(a.Voc('b.3', 0))
+        finally:
+            os.remove(filename)
+
+        self.assertEqual(len(a.elements), 14, "Incorrect number of elements")
+        self.assertEqual2(Vocs[0].s, Vocs[1].s, "Incorrect macromodel")
+
+    def test_reduce_order(self):
+        """Lcapy: check PRIMA model order reduction"""
+
+        import numpy as np
+
+        a = Circuit()
+        for m in range(20):
+            a.add('R%d %d %d 1' % (m + 1, m + 1, m + 2))
+            a.add('C%d %d 0 0.1' % (m + 1, m + 2))
+            a.add('L%d %d 0 10' % (m + 1, m + 2))
+        a.add('R0 21 0 1')
+
+        r = a.reduce_order([(1, 0), (21, 0)], order=20, s0=1)
+        self.assertEqual(r.order, 20, "Incorrect order")
+        self.assertTrue(max(r.error([0.01, 0.1, 0.2])) < 1e-2,
+                        "Large reduction error")
+
+        # Passivity: the projected matrices remain semi-definite.
+        self.assertTrue(min(np.linalg.eigvalsh(r.C)) > -1e-9,
+                        "Non-passive reduced model")
+        self.assertTrue(min(np.linalg.eigvalsh(r.G + r.G.T)) > -1e-9,
+                        "Non-passive reduced model")
+
+        Z = r.twoport().Z
+        Zf = r.Zparams(1 / (2 * np.pi))[0]
+        self.assertAlmostEqual(complex(Z[0, 1].expr.subs(s.expr, sym.I)),
+                               Zf[0, 1], 6, "Incorrect twoport")
+
+    def test_schematic_svg(self):
+        """Lcapy: check drawing schematic as SVG without LaTeX"""
+
+        from lcapy.schemsvg import svg_text
+
+        self.assertEqual(svg_text(r'$R_{1}$=10\,\mbox{$\Omega$}'),
+                         'R<tspan baseline-shift="sub" font-size="70%">1'
+                         '</tspan>=10\u2009Ω', "svg_text")
+
+        a = Circuit()
+        a.add('V1 1 0 10; down')
+        a.add('R1 1 2 100; right, i=I_1')
+        a.add('C1 2 0_2; down, v=V_C')
+        a.add('W 0 0_2; right')
+        a.add('W 0 0_g; down, implicit')
+        content = a.sch.svg_draw('schematic.svg', nosave=True)
+        self.assertTrue(content.startswith('<?xml'), "SVG header")
+        self.assertTrue('R<tspan baseline-shift="sub" font-size="70%">1'
+                        '</tspan>=100\u2009Ω' in content, "R1 label")
+        self.assertEqual(content.count('<circle'), 1 + 3, "Number of circles")
+
+        b = Circuit()
+        b.add('Q1 1 2 3; right')
+        self.assertRaises(NotImplementedError, b.sch.svg_draw,
+                          'schematic.svg', nosave=True)
+
+    def test_schematic_layout_large(self):
+        """Lcapy: check layout of large schematic"""
+
+        a = Circuit()
+        for m in range(1200):
+            a.add('R%d %d %d; right' % (m + 1, m + 1, m + 2))
+        a.sch._positions_calculate()
+        self.assertEqual(a.sch.width, 1200, "Incorrect width")
+        self.assertEqual(a.sch.height, 0, "Incorrect height")
+        self.assertTrue('xlongest_path' in a.sch.timings, "Missing timings")
+
+    def test_schematic_layout_update(self):
+        """Lcapy: check schematic layout updated when component added"""
+
+        a = Circuit()
+        a.add('V1 1 0 10; down')
+        a.add('R1 1 2 100; right')
+        a.add('C1 2 0_2; down')
+        a.add('W 0 0_2; right')
+        sch = a.sch
+        sch._positions_calculate()
+        pos = dict([(n, (node.pos.x, node.pos.y))
+                    for n, node in sch.nodes.items()])
+
+        a.add('R2 2 3; down=0.5')
+        self.assertTrue(a.sch is sch, "Schematic recreated")
+        sch._positions_calculate()
+        self.assertTrue('xupdate' in sch.timings, "Layout not updated")
+        self.assertFalse('xlongest_path' in sch.timings, "Layout recreated")
+        for n, (x, y) in pos.items():
+            self.assertEqual((sch.nodes[n].pos.x, sch.nodes[n].pos.y),
+                             (x, y), "Node %s moved" % n)
+        self.assertEqual(sch.nodes['3'].pos.x, sch.nodes['2'].pos.x,
+                         "Incorrect x position")
+        self.assertEqual(sch.nodes['3'].pos.y,
+                         sch.nodes['2'].pos.y - 0.5 * sch.node_spacing,
+                         "Incorrect y position")
+
+        # This component does not fit so the layout is recreated.
+        a.add('R3 1 4; up=2')
+        sch._positions_calculate()
+        self.assertTrue('ylongest_path' in sch.timings, "Layout not recreated")
+        self.assertEqual(sch.height, 3, "Incorrect height")
+
+    def test_schematic_tikz_write(self):
+        """Lcapy: check writing schematic TikZ code to a stream"""
+
+        from io import StringIO
+
+        a = Circuit()
+        a.add('V1 1 0 10; down')
+        a.add('R1 1 2 100; right')
+        a.add('C1 2 0_2; down')
+        a.add('W 0 0_2; right')
+        sch = a.sch
+        sch.circuitikz_version = '2017/05/28'
+        out = StringIO()
+        sch._tikz_write(out)
+        content = out.getvalue()
+        self.assertTrue(content.startswith(r'\begin{tikzpicture}'), "Start")
+        self.assertTrue(content.endswith('\\end{tikzpicture}\n'), "End")
+        self.assertEqual(content.count(r'\coordinate'), len(sch.nodes),
+                         "Coordinates")
+        self.assertEqual(content, sch._tikz_draw(), "Different code")
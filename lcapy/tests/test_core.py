@@ -318,3 +318,127 @@ class LcapyTester(unittest.TestCase):
         self.assertEqual(a.nid, a.conjugate.nid, "Different nids for conjugate")
         self.assertEqual(a.nid, a.real.nid, "Different nids for real")
         self.assertEqual(a.nid, a.imag.nid, "Different nids for imag")                
+
+    def test_polyratfun(self):
+        """Lcapy: check polynomial representation"""
+
+        a = Zs(1 / s).as_polyratfun()
+        b = Zs(s + 2)
+        c = (a * b) / (a + 1)
+        self.assertEqual(c.expr, ((s + 2) / (s + 1)).expr, "polyratfun expr")
+        self.assertEqual(c, (b / (s * (1 / s + 1))).simplify(),
+                         "polyratfun arithmetic")
+        self.assertEqual(c.N, (s + 2).expr, "polyratfun N")
+        self.assertEqual((a - 2).D, s.expr, "polyratfun D")
+        self.assertEqual(type(c), Zs, "polyratfun class")
+
+    def test_render_cache(self):
+        """Lcapy: check render cache"""
+
+        from lcapy.rendercache import render_key, cache_lookup, cache_store
+        from tempfile import mkdtemp
+        from shutil import rmtree
+        from os import environ, path
+
+        tmpdir = mkdtemp()
+        environ['LCAPY_CACHE_DIR'] = path.join(tmpdir, 'cache')
+        try:
+            key = render_key('content', '.png', 2.0, '2017/05/28')
+            self.assertEqual(key, render_key('content', '.png', 2.0,
+                                             '2017/05/28'), "key changed")
+            self.assertNotEqual(key, render_key('content', '.png', 1.0,
+                                                '2017/05/28'), "key same")
+            self.assertNotEqual(key, render_key('content', '.svg', 2.0,
+                                                '2017/05/28'), "key same")
+
+            src = path.join(tmpdir, 'src.png')
+            dst = path.join(tmpdir, 'dst.png')
+            open(src, 'w').write('image')
+            self.assertFalse(cache_lookup(key, '.png', dst), "cache hit")
+            cache_store(key, '.png', src)
+            self.assertTrue(cache_lookup(key, '.png', dst), "cache miss")
+            self.assertEqual(open(dst).read(), 'image', "cache contents")
+
+            # Store the same entry from several threads.
+            from threading import Thread
+            from os import listdir
+
+            threads = [Thread(target=cache_store, args=(key, '.png', src))
+                       for m in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertTrue(cache_lookup(key, '.png', dst), "cache miss")
+            self.assertEqual(open(dst).read(), 'image', "cache contents")
+            names = listdir(environ['LCAPY_CACHE_DIR'])
+            self.assertEqual([name for name in names if name.endswith('.tmp')],
+                             [], "temporary files remain")
+        finally:
+            environ.pop('LCAPY_CACHE_DIR')
+            rmtree(tmpdir)
+
+    def test_system_run(self):
+        """Lcapy: check running external programs"""
+
+        from lcapy.system import run, tmpdir
+        from os import path
+        import sys
+
+        with tmpdir() as dirname:
+            status, output = run([sys.executable, '-c',
+                                  'import os; print(os.getcwd())'],
+                                 cwd=dirname)
+            self.assertEqual(status, 0, "status")
+            self.assertEqual(path.realpath(output.strip()),
+                             path.realpath(dirname), "cwd")
+        self.assertFalse(path.exists(dirname), "tmpdir not removed")
+
+        self.assertRaises(RuntimeError, run, ['lcapy-no-such-program'])
+        self.assertRaises(RuntimeError, run, [sys.executable, '-c',
+                                              'import time; time.sleep(10)'],
+                          timeout=0.5)
+
+    def test_import_lazy(self):
+        """Lcapy: check import lcapy is fast"""
+
+        from subprocess import check_output
+        import sys
+
+        code = ('import sys, time\n'
+                'start = time.time()\n'
+                'import lcapy\n'
+                'print(time.time() - start, "sympy" in sys.modules)\n')
+        output = check_output([sys.executable, '-c', code]).split()
+        # Importing SymPy takes seconds; allow for a slow machine.
+        self.assertTrue(float(output[0]) < 1, "import lcapy too slow")
+        self.assertEqual(output[1], b'False', "SymPy imported")
+
+        import lcapy
+        self.assertTrue(lcapy.Circuit is Circuit, "Circuit")
+        self.assertTrue('Circuit' in lcapy.__all__, "__all__")
+        self.assertTrue(isinstance(lcapy.__version__, str), "__version__")
+        self.assertRaises(AttributeError, getattr, lcapy, 'no_such_name')
+
+    def test_import_submodule(self):
+        """Lcapy: check submodules can be imported first"""
+
+        from subprocess import Popen, PIPE, STDOUT
+        import sys
+
+        code = ('import lcapy.%s\n'
+                'from lcapy import Circuit\n'
+                'a = Circuit()\n'
+                'a.add("I1 1 0 2")\n'
+                'a.add("R1 1 0 3")\n'
+                'print(a.R1.V.dc)\n')
+        # These modules are part of import cycles.
+        modules = ('oneport', 'twoport', 'circuit', 'netlist', 'mna',
+                   'mnacpts', 'schematic')
+        procs = [Popen([sys.executable, '-c', code % module],
+                       stdout=PIPE, stderr=STDOUT) for module in modules]
+        for module, proc in zip(modules, procs):
+            output = proc.communicate()[0].decode()
+            self.assertEqual(output.strip(), '6',
+                             "Cannot import lcapy.%s first\n%s" %
+                             (module, output))
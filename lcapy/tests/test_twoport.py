@@ -1,6 +1,7 @@
 from lcapy import *
 import unittest
 import sympy as sym
+from lcapy.twoport import ZMatrix
 
 
 class LcapyTester(unittest.TestCase):
@@ -325,3 +326,75 @@ class LcapyTester(unittest.TestCase):
         self.assertEqual(d.B.B12, -10, "incorrect B12.")
         self.assertEqual(d.B.B21, -0.05, "incorrect B21.")
         self.assertEqual(d.B.B22, 1.5, "incorrect B22.")
+
+    def test_Ladder(self):
+        """Lcapy: check Ladder
+
+        """
+
+        a = Ladder(R(10), R(30))
+        b = LSection(R(10), R(30))
+        self.assertEqual(a.B.B11, b.B.B11, "incorrect B11.")
+        self.assertEqual(a.B.B12, b.B.B12, "incorrect B12.")
+        self.assertEqual(a.B.B21, b.B.B21, "incorrect B21.")
+        self.assertEqual(a.B.B22, b.B.B22, "incorrect B22.")
+
+        c = Ladder(R(1), C(2) + Vdc(3), L(4), R(5))
+        d = Series(R(1)).chain(Shunt(C(2) + Vdc(3))).chain(
+            Series(L(4))).chain(Shunt(R(5)))
+        self.assertEqual(c.B.B11, d.B.B11, "incorrect B11.")
+        self.assertEqual(c.B.B21, d.B.B21, "incorrect B21.")
+        self.assertEqual(c.V2b, d.V2b, "incorrect V2b.")
+        self.assertEqual(c.I2b, d.I2b, "incorrect I2b.")
+
+        e = Chain(Series(R(1)), Shunt(C(2) + Vdc(3)), Series(L(4)),
+                  Shunt(R(5)))
+        self.assertEqual(e.B.B12, d.B.B12, "incorrect B12.")
+        self.assertEqual(e.B.B22, d.B.B22, "incorrect B22.")
+        self.assertEqual(e.I2b, d.I2b, "incorrect I2b.")
+
+    def test_sparams(self):
+        """Lcapy: check sparams
+
+        """
+
+        a = LSection(R(10), R(30))
+        S = a.sparams([1, 10], Z0=50)
+        self.assertEqual(S.shape, (2, 2, 2), "incorrect shape.")
+        self.assertAlmostEqual(S[0, 0, 0], -17 / 63.0, 10, "incorrect S11.")
+        self.assertAlmostEqual(S[1, 1, 0], 10 / 21.0, 10, "incorrect S21.")
+        self.assertAlmostEqual(S[1, 0, 1], 10 / 21.0, 10, "incorrect S12.")
+        self.assertAlmostEqual(S[1, 1, 1], -3 / 7.0, 10, "incorrect S22.")
+
+        Y = a.yparams([1])
+        self.assertAlmostEqual(Y[0, 1, 1], 2 / 15.0, 10, "incorrect Y22.")
+        Z = a.zparams([1])
+        self.assertAlmostEqual(Z[0, 0, 0], 40, 10, "incorrect Z11.")
+
+        # Matched lossless line.
+        b = LosslessTxLine(50, l=1)
+        S = b.sparams([1e6, 1e7])
+        self.assertAlmostEqual(abs(S[0, 1, 0]), 1, 10, "incorrect S21.")
+        self.assertAlmostEqual(abs(S[1, 0, 0]), 0, 10, "incorrect S11.")
+
+    def test_conversion_cache(self):
+        """Lcapy: check cached two-port matrix conversions
+
+        """
+
+        a = LSection(R(10), R(30))
+        B = a.B
+        self.assertIs(B.Y._conversions, B.Y._conversions, "Y not cached.")
+        self.assertIs(B.A._conversions['B']._conversions, B._conversions,
+                      "B not cached.")
+        self.assertEqual(B.A.det(), 1 / B.det(), "incorrect det.")
+        self.assertEqual(B.Z.Y, B.Y, "incorrect Y.")
+
+        C = B.Y.Z
+        self.assertEqual(C[0, 0], 40, "incorrect Z11.")
+
+        # The cached matrices are not shared with the caller.
+        Y = B.Y
+        Y[0, 0] = 5
+        self.assertNotEqual(B.Y[0, 0], 5, "cached Y modified.")
+        self.assertEqual(Y.Z, ZMatrix(Y.inv()), "stale Z for modified Y.")
@@ -6,12 +6,15 @@ Copyright 2014--2017 Michael Hayes, UCECE
 
 from __future__ import division
 from warnings import warn
+import numpy as np
 import sympy as sym
-from lcapy.core import s, Vs, Is, Zs, Ys, Hs, cExpr, sExpr
-from lcapy.core import WyeDelta, DeltaWye, Vector, Matrix
+from sympy.utilities.lambdify import lambdify
+from lcapy.core import s, ssym, Vs, Is, Zs, Ys, Hs, Expr, cExpr, sExpr
+from lcapy.core import WyeDelta, DeltaWye, Matrix
 from lcapy.core import VsVector, IsVector, YsVector, ZsVector
 from lcapy.oneport import OnePort, I, V, Y, Z
 from lcapy.network import Network
+from lcapy.ratfun import PolyRatfun
 
 
 # This needs to be generalised for superpositions.
@@ -106,11 +109,168 @@ def _check_oneport_args(args):
             raise ValueError('%s not a OnePort' % arg1)
 
 
+def _chain_bparams(args):
+    """Return the B matrix and the V2b, I2b sources for a chain of
+    two-ports.
+
+    The two-ports are combined pairwise as a balanced binary tree,
+    rather than one after the other, so the intermediate expressions
+    stay small.  Where possible, the elements are represented as
+    polynomial pairs (see PolyRatfun) so that the products are not
+    expanded into general sympy expressions and no simplification is
+    required until the end."""
+
+    def convert(TP):
+
+        B = TP.B
+        elements = (B[0, 0].expr, B[0, 1].expr, B[1, 0].expr, B[1, 1].expr,
+                    TP.V2b.expr, TP.I2b.expr)
+        return [PolyRatfun.from_expr(element, ssym) for element in elements]
+
+    def combine(first, second):
+        # The B matrix of the combination is B2 * B1 and the sources
+        # are b2 + B2 * b1.
+
+        a11, a12, a21, a22, av, ai = first
+        b11, b12, b21, b22, bv, bi = second
+        return [b11 * a11 + b12 * a21, b11 * a12 + b12 * a22,
+                b21 * a11 + b22 * a21, b21 * a12 + b22 * a22,
+                bv + b11 * av + b12 * ai, bi + b21 * av + b22 * ai]
+
+    def tree_product(nodes):
+
+        while len(nodes) > 1:
+            pairs = [combine(nodes[m], nodes[m + 1])
+                     for m in range(0, len(nodes) - 1, 2)]
+            if len(nodes) & 1:
+                pairs.append(nodes[-1])
+            nodes = pairs
+        return nodes[0]
+
+    try:
+        params = tree_product([convert(arg) for arg in args])
+        params = [param.expr for param in params]
+        # The polynomial pairs are in lowest terms so avoid the
+        # costly simplification of the elements.
+        B = BMatrix._new_unsimplified(*params[0:4])
+    except (ValueError, sym.PolynomialError):
+        # Have a non-rational element or a mix of delays so fall
+        # back to general expressions, simplifying only at the end.
+        def convert(TP):
+
+            B = TP.B
+            return [B[0, 0].expr, B[0, 1].expr, B[1, 0].expr, B[1, 1].expr,
+                    TP.V2b.expr, TP.I2b.expr]
+
+        params = tree_product([convert(arg) for arg in args])
+        params = [sym.cancel(param) for param in params]
+        B = BMatrix._new_unsimplified(*params[0:4])
+
+    return B, Vs(params[4]), Is(params[5])
+
+
+def _evaluate_elements(elements, svector):
+    """Evaluate a sequence of sympy expressions of s at each of the points
+    in svector.  An array of shape (len(svector), len(elements)) is
+    returned."""
+
+    result = np.empty((len(svector), len(elements)), dtype=complex)
+    for m, element in enumerate(elements):
+        expr = sym.sympify(element)
+        symbols = expr.free_symbols - set((ssym, ))
+        if symbols != set():
+            raise ValueError('Cannot evaluate %s since it depends on %s'
+                             % (expr, ', '.join([str(x) for x in symbols])))
+        if ssym not in expr.free_symbols:
+            result[:, m] = complex(expr)
+            continue
+        func = lambdify(ssym, expr, 'numpy')
+        result[:, m] = func(svector)
+    return result
+
+
+def _chain_anumeric(args, svector):
+    """Return the A matrices for a chain of two-ports evaluated at each of
+    the points in svector as an array of shape (len(svector), 2, 2)
+    and their determinants."""
+
+    # Cascade the A matrices rather than inverting the B matrix of the
+    # chain.  The determinants are also cascaded since they cannot be
+    # found accurately from the elements for long chains.
+    A, det = args[0]._Anumeric(svector)
+    for arg in args[1:]:
+        A2, det2 = arg._Anumeric(svector)
+        A = np.matmul(A, A2)
+        det = det * det2
+    return A, det
+
+
+def _A_to_S(A, det, Z0):
+    """Convert an array of A matrices, of shape (N, 2, 2), with
+    determinants det to scattering parameters for the reference
+    impedance Z0."""
+
+    A11, A12, A21, A22 = A[:, 0, 0], A[:, 0, 1], A[:, 1, 0], A[:, 1, 1]
+    delta = A11 + A12 / Z0 + A21 * Z0 + A22
+
+    S = np.empty(A.shape, dtype=complex)
+    S[:, 0, 0] = (A11 + A12 / Z0 - A21 * Z0 - A22) / delta
+    S[:, 0, 1] = 2 * det / delta
+    S[:, 1, 0] = 2 / delta
+    S[:, 1, 1] = (-A11 + A12 / Z0 - A21 * Z0 + A22) / delta
+    return S
+
+
+def _cached_conversion(method):
+    """Decorator for the methods converting a two-port matrix to
+    another family of matrix.  Each conversion is only performed once;
+    the result is cached in the matrix keyed by the target family."""
+
+    family = method.__name__
+
+    def wrapper(self):
+
+        cache = self._conversions
+        if family not in cache:
+            result = method(self)
+            if isinstance(result, TwoPortMatrix):
+                if result is self:
+                    result = self._copy()
+                else:
+                    # Allow the conversion back without any work.
+                    result._conversions.setdefault(self._family,
+                                                   self._copy())
+                    # The determinant of the inverse matrix is known.
+                    if (family == self._inverse_family and
+                            self._det is not None):
+                        result._det = 1 / self._det
+            cache[family] = result
+
+        # The cached matrices are never handed out since they are
+        # mutable.
+        result = cache[family]
+        if isinstance(result, TwoPortMatrix):
+            return result._copy()
+        return result
+
+    wrapper.__name__ = family
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
 class TwoPortMatrix(Matrix):
 
+    # Name of the matrix family and of the family of the inverse matrix.
+    _family = None
+    _inverse_family = None
+    _det = None
+
     def __new__(cls, *args):
 
-        args = [sym.simplify(arg) for arg in args]
+        # Use the sympy expressions; sympifying an Expr would create
+        # a new s symbol with different assumptions.
+        args = [sym.simplify(arg.expr if isinstance(arg, Expr) else arg)
+                for arg in args]
 
         if len(args) == 4:
             return super(TwoPortMatrix, cls).__new__(
@@ -118,30 +278,81 @@ class TwoPortMatrix(Matrix):
 
         return super(TwoPortMatrix, cls).__new__(cls, *args)
 
+    @property
+    def _conversions(self):
+
+        try:
+            return self.__dict__['_conversions_cache']
+        except KeyError:
+            cache = {}
+            self.__dict__['_conversions_cache'] = cache
+            return cache
+
+    def __setitem__(self, key, value):
+
+        # Forget the cached conversions and determinant; create a new
+        # dict since a copy of the matrix may share the old one.
+        self.__dict__['_conversions_cache'] = {}
+        self._det = None
+        super(TwoPortMatrix, self).__setitem__(key, value)
+
+    def det(self):
+        """Return determinant; this is cached."""
+
+        if self._det is None:
+            self._det = super(TwoPortMatrix, self).det()
+        return self._det
+
+    def _copy(self):
+        """Return copy of matrix that shares the cached conversions and
+        determinant.  The cache is detached from the copy if the copy
+        is modified."""
+
+        elements = [sym.Matrix.__getitem__(self, (m, n))
+                    for m in range(2) for n in range(2)]
+        new = self._new_unsimplified(*elements)
+        new.__dict__['_conversions_cache'] = self._conversions
+        new._det = self._det
+        return new
+
+    @classmethod
+    def _new_unsimplified(cls, *args):
+        """Create matrix from the four elements without simplifying
+        them."""
+
+        return super(TwoPortMatrix, cls).__new__(
+            cls, ((args[0], args[1]), (args[2], args[3])))
+
     # The following properties are fallbacks when other conversions have
     # not been defined.
 
     @property
+    @_cached_conversion
     def A(self):
         return AMatrix(self.B.inv())
 
     @property
+    @_cached_conversion
     def B(self):
         return BMatrix(self.A.inv())
 
     @property
+    @_cached_conversion
     def G(self):
         return GMatrix(self.H.inv())
 
     @property
+    @_cached_conversion
     def H(self):
         return HMatrix(self.G.inv())
 
     @property
+    @_cached_conversion
     def Y(self):
         return YMatrix(self.Z.inv())
 
     @property
+    @_cached_conversion
     def Z(self):
         return ZMatrix(self.Y.inv())
 
@@ -285,12 +496,16 @@ class AMatrix(TwoPortMatrix):
     A = inv(B)
     """
 
+    _family = 'A'
+    _inverse_family = 'B'
+
     @property
     def A(self):
         # Perhaps we should make a copy?
         return self
 
     @property
+    @_cached_conversion
     def B(self):
 
         # Inverse
@@ -301,6 +516,7 @@ class AMatrix(TwoPortMatrix):
                        -self.A21 / det, self.A11 / det)
 
     @property
+    @_cached_conversion
     def H(self):
 
         if self.A22 == 0:
@@ -309,6 +525,7 @@ class AMatrix(TwoPortMatrix):
                        -1 / self.A22, self.A21 / self.A22)
 
     @property
+    @_cached_conversion
     def Y(self):
 
         # This produces a bogus Y matrix when A12 is zero (say for a
@@ -319,6 +536,7 @@ class AMatrix(TwoPortMatrix):
                        -1 / self.A12, self.A11 / self.A12)
 
     @property
+    @_cached_conversion
     def Z(self):
 
         # This produces a bogus Z matrix when A21 is zero (say for a
@@ -421,7 +639,11 @@ class BMatrix(TwoPortMatrix):
     B = inv(A)
     """
 
+    _family = 'B'
+    _inverse_family = 'A'
+
     @property
+    @_cached_conversion
     def A(self):
         # Inverse
         det = self.det()
@@ -434,24 +656,28 @@ class BMatrix(TwoPortMatrix):
         return self
 
     @property
+    @_cached_conversion
     def G(self):
 
         return GMatrix(-self.B21 / self.B22, -1 / self.B22,
                        self.det() / self.B22, -self.B12 / self.B22)
 
     @property
+    @_cached_conversion
     def H(self):
 
         return HMatrix(-self.B12 / self.B11, 1 / self.B11, -
                        self.det() / self.B11, -self.B21 / self.B11)
 
     @property
+    @_cached_conversion
     def Y(self):
 
         return YMatrix(-self.B11 / self.B12, 1 / self.B12,
                        self.det() / self.B12, -self.B22 / self.B12)
 
     @property
+    @_cached_conversion
     def Z(self):
 
         return ZMatrix(-self.B22 / self.B21, -1 / self.B21, -
@@ -657,13 +883,18 @@ class GMatrix(TwoPortMatrix):
     G = inv(H)
     """
 
+    _family = 'G'
+    _inverse_family = 'H'
+
     @property
+    @_cached_conversion
     def A(self):
         # return self.H.A
         return AMatrix(1 / self.G21, self.G22 / self.G21,
                        self.G11 / self.G21, self.det() / self.G21)
 
     @property
+    @_cached_conversion
     def B(self):
         # return self.H.B
         return BMatrix(-self.det() / self.G12, self.G22 /
@@ -675,14 +906,17 @@ class GMatrix(TwoPortMatrix):
         return self
 
     @property
+    @_cached_conversion
     def H(self):
         return HMatrix(self.inv())
 
     @property
+    @_cached_conversion
     def Y(self):
         return self.H.Y
 
     @property
+    @_cached_conversion
     def Z(self):
         return self.H.Z
 
@@ -704,12 +938,17 @@ class HMatrix(TwoPortMatrix):
     H = inv(G)
     """
 
+    _family = 'H'
+    _inverse_family = 'G'
+
     @property
+    @_cached_conversion
     def A(self):
         return AMatrix(-self.det() / self.H21, -self.H11 /
                        self.H21, -self.H22 / self.H21, -1 / self.H21)
 
     @property
+    @_cached_conversion
     def B(self):
         return BMatrix(1 / self.H12, -self.H11 / self.H12, -
                        self.H22 / self.H12, self.det() / self.H12)
@@ -720,11 +959,13 @@ class HMatrix(TwoPortMatrix):
         return self
 
     @property
+    @_cached_conversion
     def Y(self):
         return YMatrix(1 / self.H11, -self.H12 / self.H11,
                        self.H21 / self.H11, self.det() / self.H11)
 
     @property
+    @_cached_conversion
     def Z(self):
         return ZMatrix(self.det() / self.H22, self.H12 / self.H22,
                        -self.H21 / self.H22, 1 / self.H22)
@@ -747,21 +988,27 @@ class YMatrix(TwoPortMatrix):
     Y = inv(Z)
     """
 
+    _family = 'Y'
+    _inverse_family = 'Z'
+
     @property
     def Ysc(self):
         return YsVector(self.Y11, self.Y22)
 
     @property
+    @_cached_conversion
     def A(self):
         return AMatrix(-self.Y22 / self.Y21, -1 / self.Y21, -
                        self.det() / self.Y21, -self.Y11 / self.Y21)
 
     @property
+    @_cached_conversion
     def B(self):
         return BMatrix(-self.Y11 / self.Y12, 1 / self.Y12,
                        self.det() / self.Y12, -self.Y22 / self.Y12)
 
     @property
+    @_cached_conversion
     def H(self):
         return HMatrix(1 / self.Y11, -self.Y12 / self.Y11,
                        self.Y21 / self.Y11, self.det() / self.Y11)
@@ -772,6 +1019,7 @@ class YMatrix(TwoPortMatrix):
         return self
 
     @property
+    @_cached_conversion
     def Z(self):
         # Inverse
         det = self.det()
@@ -796,26 +1044,33 @@ class ZMatrix(TwoPortMatrix):
     Z = inv(Y)
     """
 
+    _family = 'Z'
+    _inverse_family = 'Y'
+
     @property
     def Zoc(self):
         return ZsVector(self.Z11, self.Z22)
 
     @property
+    @_cached_conversion
     def A(self):
         return AMatrix(self.Z11 / self.Z21, self.det() / self.Z21,
                        1 / self.Z21, self.Z22 / self.Z21)
 
     @property
+    @_cached_conversion
     def B(self):
         return BMatrix(self.Z22 / self.Z12, -self.det() /
                        self.Z12, -1 / self.Z12, self.Z11 / self.Z12)
 
     @property
+    @_cached_conversion
     def H(self):
         return HMatrix(self.det() / self.Z22, self.Z12 / self.Z22,
                        -self.Z21 / self.Z22, 1 / self.Z22)
 
     @property
+    @_cached_conversion
     def Y(self):
         # Inverse
         det = self.det()
@@ -1450,6 +1705,95 @@ class TwoPort(Network):
 
         return Z(Zval) + V(Vval)
 
+    def _Anumeric(self, svector):
+        """Return the A matrix evaluated at each of the points in svector
+        as a complex array of shape (len(svector), 2, 2) and its
+        determinant."""
+
+        B = self.B
+        elements = (B[0, 0].expr, B[0, 1].expr, B[1, 0].expr, B[1, 1].expr)
+        B = _evaluate_elements(elements, svector)
+
+        # A = inv(B)
+        det = B[:, 0] * B[:, 3] - B[:, 1] * B[:, 2]
+        A = np.empty((len(svector), 2, 2), dtype=complex)
+        A[:, 0, 0] = B[:, 3] / det
+        A[:, 0, 1] = -B[:, 1] / det
+        A[:, 1, 0] = -B[:, 2] / det
+        A[:, 1, 1] = B[:, 0] / det
+        return A, 1 / det
+
+    def _Aparams(self, fvector):
+
+        fvector = np.atleast_1d(np.asarray(fvector, dtype=float))
+        return self._Anumeric(2j * np.pi * fvector)
+
+    def aparams(self, fvector):
+        """Return A (chain) matrix evaluated numerically at each of the
+        frequencies in fvector as a complex array of shape
+        (len(fvector), 2, 2).  The two-port must not have any symbols
+        apart from s."""
+
+        return self._Aparams(fvector)[0]
+
+    def sparams(self, fvector, Z0=50):
+        """Return scattering parameters evaluated numerically at each of
+        the frequencies in fvector for the real reference impedance
+        Z0.  The result is a complex array of shape (len(fvector), 2, 2).
+
+        This is much faster than evaluating the symbolic matrices at
+        each frequency.  For example,
+
+        >>> f = np.logspace(6, 9, 10000)
+        >>> S = LosslessTxLine(50).chain(Shunt(C(1e-12))).sparams(f)
+        >>> S21 = S[:, 1, 0]
+        """
+
+        A, det = self._Aparams(fvector)
+        return _A_to_S(A, det, Z0)
+
+    def yparams(self, fvector):
+        """Return admittance matrix evaluated numerically at each of the
+        frequencies in fvector as a complex array of shape
+        (len(fvector), 2, 2)."""
+
+        A, det = self._Aparams(fvector)
+        A11, A12, A22 = A[:, 0, 0], A[:, 0, 1], A[:, 1, 1]
+        Y = np.empty(A.shape, dtype=complex)
+        Y[:, 0, 0] = A22 / A12
+        Y[:, 0, 1] = -det / A12
+        Y[:, 1, 0] = -1 / A12
+        Y[:, 1, 1] = A11 / A12
+        return Y
+
+    def zparams(self, fvector):
+        """Return impedance matrix evaluated numerically at each of the
+        frequencies in fvector as a complex array of shape
+        (len(fvector), 2, 2)."""
+
+        A, det = self._Aparams(fvector)
+        A11, A21, A22 = A[:, 0, 0], A[:, 1, 0], A[:, 1, 1]
+        Z = np.empty(A.shape, dtype=complex)
+        Z[:, 0, 0] = A11 / A21
+        Z[:, 0, 1] = det / A21
+        Z[:, 1, 0] = 1 / A21
+        Z[:, 1, 1] = A22 / A21
+        return Z
+
+    def hparams(self, fvector):
+        """Return hybrid matrix evaluated numerically at each of the
+        frequencies in fvector as a complex array of shape
+        (len(fvector), 2, 2)."""
+
+        A, det = self._Aparams(fvector)
+        A12, A21, A22 = A[:, 0, 1], A[:, 1, 0], A[:, 1, 1]
+        H = np.empty(A.shape, dtype=complex)
+        H[:, 0, 0] = A12 / A22
+        H[:, 0, 1] = det / A22
+        H[:, 1, 0] = -1 / A22
+        H[:, 1, 1] = A21 / A22
+        return H
+
     def simplify(self):
 
         if self.B == sym.eye(2):
@@ -1853,20 +2197,28 @@ class Chain(TwoPortBModel):
         self.args = args
         self._check_twoport_args()
 
-        arg1 = args[-1]
-        B = arg1.B
+        super(Chain, self).__init__(*_chain_bparams(args))
 
-        foo = Vector(arg1.V2b, arg1.I2b)
+    def _Anumeric(self, svector):
 
-        for arg in reversed(args[0:-1]):
+        return _chain_anumeric(self.args, svector)
 
-            foo += B * Vector(arg.V2b, arg.I2b)
-            B = B * arg.B
+    def _check_twoport_args(self):
 
-        super(Chain, self).__init__(B, Vs(foo[0, 0]), Is(foo[1, 0]))
+        # Unlike the other combinations, any number of two-ports can
+        # be chained.
+        if len(self.args) < 2:
+            raise ValueError('Need at least two args for %s' %
+                             self.__class__.__name__)
+        for arg1 in self.args:
+            if not isinstance(arg1, TwoPort):
+                raise ValueError('%s not a TwoPort' % arg1)
 
     def simplify(self):
 
+        if len(self.args) != 2:
+            return self
+
         if isinstance(self.args[0], Shunt) and isinstance(self.args[1], Shunt):
             return Shunt(
                 (self.args[0].args[0] | self.args[1].args[0]).simplify())
@@ -2428,16 +2780,23 @@ class Ladder(TwoPortBModel):
         self.args = (OP1, ) + args
         _check_oneport_args(self.args)
 
-        TP = Series(OP1)
+        TPs = [Series(OP1)]
 
         for m, arg in enumerate(args):
 
             if m & 1:
-                TP = TP.chain(Series(arg))
+                TPs.append(Series(arg))
             else:
-                TP = TP.chain(Shunt(arg))
+                TPs.append(Shunt(arg))
+
+        # Chain all the sections at once rather than one after the
+        # other; this is much faster for long ladders.
+        super(Ladder, self).__init__(*_chain_bparams(TPs))
+        self._sections = TPs
+
+    def _Anumeric(self, svector):
 
-        super(Ladder, self).__init__(TP)
+        return _chain_anumeric(self._sections, svector)
 
     def simplify(self):
 
@@ -2469,7 +2828,10 @@ class GeneralTxLine(TwoPortBModel):
         gamma = sExpr(gamma)
         l = cExpr(l)
 
-        H = sym.exp(gamma * l)
+        # Use the sympy expressions so that s is not converted to a
+        # different symbol.
+        H = sym.exp(gamma.expr * l.expr)
+        Z0 = Z0.expr
 
         B11 = 0.5 * (H + 1 / H)
         B12 = 0.5 * (1 / H - H) * Z0
@@ -2510,7 +2872,7 @@ class TxLine(GeneralTxLine):
 
         Z = R + s * L
         Y = G + s * C
-        gamma = sym.sqrt(Z * Y)
-        Z0 = sym.sqrt(Z / Y)
+        gamma = sym.sqrt((Z * Y).expr)
+        Z0 = sym.sqrt((Z / Y).expr)
 
         super(TxLine, self).__init__(Z0, gamma, l)
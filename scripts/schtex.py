@@ -3,12 +3,122 @@
 Copyright (c) 2014 Michael P. Hayes, UC ECE, NZ
 
 Usage: schtex infile.sch [outfile.tex|pdf|png|svg]
+       schtex --jobs N --outdir dir --format png infile1.sch infile2.sch ...
 """
 
 from __future__ import print_function
 from optparse import OptionParser
 import sys
 import os
+import time
+
+
+def circuit(infilename, options):
+
+    from lcapy import Circuit
+
+    cct = Circuit(infilename)
+    if options['k_model']:
+        cct = cct.kill()
+    if options['s_model']:
+        cct = cct.s_model()
+    if options['ac_model']:
+        cct = cct.ac_model()
+    if options['p_model']:
+        cct = cct.pre_initial_model()
+    return cct
+
+
+def schematic(infilename, outfilename, options):
+
+    cct = circuit(infilename, options)
+    cct.draw(label_nodes=options['label_nodes'],
+             draw_nodes=options['draw_nodes'],
+             label_ids=options['label_ids'],
+             label_values=options['label_values'],
+             filename=outfilename, scale=options['scale'],
+             node_spacing=options['node_spacing'],
+             cpt_size=options['cpt_size'],
+             help_lines=options['help_lines'], debug=options['debug'])
+
+
+def batch_schematic(args):
+    """Draw schematic in its own temporary directory, so that the LaTeX
+    files of concurrent workers do not clash, and move the result to
+    the output filename.  Return the elapsed time and an error message
+    or None."""
+
+    from tempfile import mkdtemp
+    from shutil import move, rmtree
+
+    infilename, outfilename, options = args
+
+    start = time.time()
+    tmpdir = mkdtemp(prefix='schtex')
+    try:
+        tmpfilename = os.path.join(tmpdir, os.path.basename(outfilename))
+        schematic(infilename, tmpfilename, options)
+        move(tmpfilename, outfilename)
+        error = None
+    except Exception as e:
+        error = '%s: %s' % (e.__class__.__name__, e)
+    finally:
+        rmtree(tmpdir, ignore_errors=True)
+    return time.time() - start, error
+
+
+def batch(infilenames, options):
+
+    outdir = options['outdir']
+    if outdir is None:
+        outdir = '.'
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+
+    ext = options['format']
+    if not ext.startswith('.'):
+        ext = '.' + ext
+
+    tasks = []
+    for infilename in infilenames:
+        base = os.path.splitext(os.path.basename(infilename))[0]
+        outfilename = os.path.join(outdir, base + ext)
+        tasks.append((infilename, outfilename, options))
+
+    start = time.time()
+    if options['jobs'] > 1:
+        from multiprocessing import Pool
+
+        # Lcapy is loaded before the workers are created so that,
+        # where fork is available, each worker does not import it
+        # again.  Since the lcapy package is imported lazily, this
+        # requires a name to be used; creating a circuit also sets
+        # up the netlist parser.
+        from lcapy import Circuit
+        Circuit()
+
+        pool = Pool(options['jobs'])
+        results = pool.imap(batch_schematic, tasks)
+    else:
+        pool = None
+        results = map(batch_schematic, tasks)
+
+    failures = 0
+    for task, (elapsed, error) in zip(tasks, results):
+        if error is None:
+            print('%s -> %s: %.2f s' % (task[0], task[1], elapsed))
+        else:
+            failures += 1
+            print('%s: failed after %.2f s: %s' % (task[0], elapsed, error),
+                  file=sys.stderr)
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    print('%d schematics, %d failed, %.2f s' % (len(tasks), failures,
+                                                 time.time() - start))
+    return 1 if failures else 0
 
 
 def main (argv=None):
@@ -18,7 +128,9 @@ def main (argv=None):
 
     version = __doc__.split('\n')[0]
 
-    parser = OptionParser(usage='%prog schematic-file [output-file]', version=version, 
+    parser = OptionParser(usage='%prog schematic-file [output-file]\n'
+                          '       %prog [--jobs N] [--outdir dir] [--format ext] schematic-file ...',
+                          version=version, 
                           description=__doc__)
 
     parser.add_option('--debug', action='store_true',
@@ -101,29 +213,24 @@ def main (argv=None):
                       dest='stage', default=0,
                       help='graph analysis stage')
 
+    parser.add_option('--jobs', type='int',
+                      dest='jobs', default=None,
+                      help='number of schematics to draw in parallel; this enables batch mode')
+
+    parser.add_option('--outdir', type='str',
+                      dest='outdir', default=None,
+                      help='directory for schematics drawn in batch mode')
+
+    parser.add_option('--format', type='str',
+                      dest='format', default='png',
+                      help='output format for batch mode, choice: tex, schtex, pdf, png, svg')
+
     (options, args) = parser.parse_args()
 
     if len(args) < 1:
         parser.error('missing argument')
         return 1
 
-    infilename = args[0]
-    outfilename = None
-    if len(args) > 1:
-        outfilename = args[1]
-
-    from lcapy import Circuit
-
-    cct = Circuit(infilename)
-    if options.k_model:
-        cct = cct.kill()
-    if options.s_model:
-        cct = cct.s_model()
-    if options.ac_model:
-        cct = cct.ac_model()
-    if options.p_model:
-        cct = cct.pre_initial_model()
-
     if options.label_nodes not in ('none', 'all', 'alpha', 'pins', 'primary', False, None):
         raise ValueError('Illegal option %s for label_nodes' % options.label_nodes)
 
@@ -131,17 +238,27 @@ def main (argv=None):
                                   False, None):
         raise ValueError('Illegal option %s for draw_nodes' % options.draw_nodes)
 
-    nosave = options.xgraph or options.ygraph
+    batch_mode = (options.jobs is not None or options.outdir is not None
+                  or (len(args) > 1 and
+                      all([arg.endswith('.sch') for arg in args])))
+
+    if batch_mode:
+        if options.xgraph or options.ygraph:
+            parser.error('cannot generate graphs in batch mode')
+        if options.jobs is None:
+            options.jobs = 1
+        return batch(args, vars(options))
+
+    infilename = args[0]
+    outfilename = None
+    if len(args) > 1:
+        outfilename = args[1]
 
     if not options.xgraph and not options.ygraph:
-        cct.draw(label_nodes=options.label_nodes,
-                 draw_nodes=options.draw_nodes,
-                 label_ids=options.label_ids,
-                 label_values=options.label_values, 
-                 filename=outfilename, scale=options.scale,
-                 node_spacing=options.node_spacing, cpt_size=options.cpt_size,
-                 help_lines=options.help_lines, debug=options.debug,
-                 nosave=nosave)
+        schematic(infilename, outfilename, vars(options))
+        return 0
+
+    cct = circuit(infilename, vars(options))
 
     if options.xgraph:
         cct.sch.make_graphs()
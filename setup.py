@@ -10,7 +10,7 @@ setup(name='lcapy',
       author_email='michael.hayes@canterbury.ac.nz',
       url='https://github.com/mph-/lcapy',
       download_url='https://github.com/mph-/lcapy',
-      py_modules=['lcapy.core', 'lcapy.netlist', 'lcapy.oneport', 'lcapy.twoport', 'lcapy.threeport', 'lcapy.schematic', 'lcapy.mna', 'lcapy.plot', 'lcapy.latex', 'lcapy.grammar', 'lcapy.parser', 'lcapy.schemcpts', 'lcapy.schemmisc', 'lcapy.schemgraph', 'lcapy.mnacpts', 'lcapy.sympify', 'lcapy.acdc', 'lcapy.network', 'lcapy.circuit', 'lcapy.netfile', 'lcapy.system', 'lcapy.laplace', 'lcapy.fourier', 'lcapy.ratfun'],
+      py_modules=['lcapy.core', 'lcapy.netlist', 'lcapy.oneport', 'lcapy.twoport', 'lcapy.threeport', 'lcapy.schematic', 'lcapy.mna', 'lcapy.plot', 'lcapy.latex', 'lcapy.grammar', 'lcapy.parser', 'lcapy.schemcpts', 'lcapy.schemmisc', 'lcapy.schemgraph', 'lcapy.mnacpts', 'lcapy.sympify', 'lcapy.acdc', 'lcapy.network', 'lcapy.circuit', 'lcapy.netfile', 'lcapy.system', 'lcapy.laplace', 'lcapy.fourier', 'lcapy.ratfun', 'lcapy.reduction', 'lcapy.rendercache', 'lcapy.schemsvg'],
       scripts=['scripts/schtex.py'],
       license='LGPL'
   )